@@ -26,9 +26,14 @@ def create_app(config_class=Config):
     app.register_blueprint(quiz_bp)
     app.register_blueprint(api_bp, url_prefix='/api')
 
-    # Create tables
-    with app.app_context():
-        db.create_all()
+    # Create tables and bring existing databases up to date, unless a
+    # deployment runs scripts/upgrade_db.py before starting the workers
+    if app.config.get('SCHEMA_UPGRADE_ON_START', True):
+        with app.app_context():
+            from app.migrations import upgrade_database
+            created = upgrade_database()
+            if created:
+                app.logger.info(f"Created indexes: {', '.join(created)}")
 
     return app
 
@@ -11,6 +11,10 @@ class Config:
     DATABASE_PATH = os.environ.get('DATABASE_PATH', 'quiz.db')
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{DATABASE_PATH}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Create tables and upgrade the schema when the app starts. Set to false
+    # where scripts/upgrade_db.py runs before the processes start (see
+    # deploy/quiz.service), so gunicorn workers never migrate concurrently
+    SCHEMA_UPGRADE_ON_START = os.environ.get('SCHEMA_UPGRADE_ON_START', 'true').lower() == 'true'
 
     # Google OAuth
     GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
@@ -24,6 +28,14 @@ class Config:
 
     # External APIs
     ANTHROPIC_API_KEY = os.environ.get('ANTHROPIC_API_KEY')
+    # Connection pool of the shared Anthropic client
+    ANTHROPIC_MAX_CONNECTIONS = int(os.environ.get('ANTHROPIC_MAX_CONNECTIONS', '20'))
+    # Client-side limits for bulk (per-user) generation
+    CLAUDE_REQUESTS_PER_MINUTE = int(os.environ.get('CLAUDE_REQUESTS_PER_MINUTE', '50'))
+    CLAUDE_MAX_ATTEMPTS = int(os.environ.get('CLAUDE_MAX_ATTEMPTS', '3'))
+    PERSONAL_QUIZ_WORKERS = int(os.environ.get('PERSONAL_QUIZ_WORKERS', '8'))
+    # Per-request timeout in seconds (unset: the client library default)
+    CLAUDE_TIMEOUT_SECONDS = float(os.environ['CLAUDE_TIMEOUT_SECONDS']) if os.environ.get('CLAUDE_TIMEOUT_SECONDS') else None
 
     # Gmail SMTP for notifications
     SMTP_EMAIL = os.environ.get('SMTP_EMAIL')
@@ -34,10 +46,71 @@ class Config:
     BASE_URL = os.environ.get('BASE_URL', 'http://localhost:5000')
     QUIZ_TIME_LIMIT_SECONDS = 360  # 6 minutes
 
+    # Analytics source for performance summaries: 'raw' (answer joins) or
+    # 'rollup' (DailyRollup table; run scripts/backfill_analytics.py first)
+    ANALYTICS_SOURCE = os.environ.get('ANALYTICS_SOURCE', 'raw')
+    ANALYTICS_CACHE_SIZE = int(os.environ.get('ANALYTICS_CACHE_SIZE', 256))
+    # Quizzes whose answer keys each worker keeps for saving answers
+    ANSWER_KEY_CACHE_SIZE = int(os.environ.get('ANSWER_KEY_CACHE_SIZE', 512))
+    # Rendered results pages/JSON of completed submissions each worker keeps
+    RESULTS_CACHE_SIZE = int(os.environ.get('RESULTS_CACHE_SIZE', 256))
+    # Submission owner/quiz/completion cache for the quiz API: 'process' (per
+    # worker, entries expire after SUBMISSION_STATE_TTL seconds) or 'sqlite'
+    # (one file at SUBMISSION_STATE_PATH shared by the workers on a host)
+    SUBMISSION_STATE_CACHE = os.environ.get('SUBMISSION_STATE_CACHE', 'process')
+    SUBMISSION_STATE_PATH = os.environ.get('SUBMISSION_STATE_PATH', 'submission_state.db')
+    SUBMISSION_STATE_SIZE = int(os.environ.get('SUBMISSION_STATE_SIZE', 4096))
+    SUBMISSION_STATE_TTL = float(os.environ.get('SUBMISSION_STATE_TTL', 60))
+    # Weak areas in the summary: 'accuracy' (window stats) or 'rating' (skill ratings)
+    WEAK_AREAS_MODE = os.environ.get('WEAK_AREAS_MODE', 'accuracy')
+    # Add NumPy skill signals (7/30/90-day, recent-weighted) to the generation prompt
+    ANALYTICS_SKILL_SIGNALS = os.environ.get('ANALYTICS_SKILL_SIGNALS', 'false').lower() == 'true'
+
     # Quiz generation time (IST, 24-hour format like "07:30" or "07:15")
-    # Note: Update crontab on Lightsail when changing this
-    # Cron runs in UTC, so IST 07:30 = UTC 02:00, IST 07:15 = UTC 01:45
+    # The scheduler daemon (scripts/quiz_scheduler.py) reads this directly.
+    # With cron instead, update the crontab on Lightsail when changing this:
+    # cron runs in UTC, so IST 07:30 = UTC 02:00, IST 07:15 = UTC 01:45
     QUIZ_GENERATION_TIME_IST = os.environ.get('QUIZ_GENERATION_TIME_IST', '07:30')
+    # Scheduler daemon: start this many minutes before the generation time
+    # (the deadline), retry failed runs while time and attempts remain, and
+    # write next/last run timings to the status file
+    SCHEDULER_LEAD_MINUTES = int(os.environ.get('SCHEDULER_LEAD_MINUTES', '15'))
+    SCHEDULER_MAX_ATTEMPTS = int(os.environ.get('SCHEDULER_MAX_ATTEMPTS', '3'))
+    SCHEDULER_RETRY_SECONDS = int(os.environ.get('SCHEDULER_RETRY_SECONDS', '120'))
+    SCHEDULER_STATUS_PATH = os.environ.get('SCHEDULER_STATUS_PATH', 'scheduler_status.json')
+
+    # Stream the Claude response and persist questions as they complete
+    QUIZ_GENERATION_STREAMING = os.environ.get('QUIZ_GENERATION_STREAMING', 'false').lower() == 'true'
+    # Estimated tokens the per-user part of the prompt may use; the least
+    # informative adaptive sections are dropped to fit (0 = no limit)
+    PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', '0'))
+    # Request the passage first and then the questions in this many
+    # concurrent shards, for lower wall-clock latency (1 = one request)
+    QUIZ_GENERATION_SHARDS = int(os.environ.get('QUIZ_GENERATION_SHARDS', '1'))
+    # Follow-up requests that rewrite only a response's invalid or missing
+    # questions before the whole quiz is regenerated
+    QUIZ_REPAIR_ATTEMPTS = int(os.environ.get('QUIZ_REPAIR_ATTEMPTS', '2'))
+    # Disk cache of raw Claude responses, so a rerun with the same prompt
+    # (e.g. after a crash before commit) costs no API call. Unset disables it.
+    GENERATION_CACHE_DIR = os.environ.get('GENERATION_CACHE_DIR', '')
+    GENERATION_CACHE_TTL_HOURS = float(os.environ.get('GENERATION_CACHE_TTL_HOURS', '48'))
+    GENERATION_CACHE_MAX_MB = float(os.environ.get('GENERATION_CACHE_MAX_MB', '50'))
+    # Regenerate a pre-generated quiz's questions from the latest analytics
+    # when it is promoted on its date
+    PREGENERATION_REFRESH_ADAPTIVE = os.environ.get('PREGENERATION_REFRESH_ADAPTIVE', 'false').lower() == 'true'
+
+    # Assemble the daily quiz from past questions when Claude fails
+    QUESTION_BANK_FALLBACK = os.environ.get('QUESTION_BANK_FALLBACK', 'true').lower() == 'true'
+
+    # Near-duplicate topic checks against every stored passage: estimated
+    # word-set similarity that counts as a repeat, regenerations before a
+    # repeat is accepted, and recent quizzes listed as topics to avoid
+    TOPIC_DUPLICATE_THRESHOLD = float(os.environ.get('TOPIC_DUPLICATE_THRESHOLD', '0.25'))
+    TOPIC_DUPLICATE_RETRIES = int(os.environ.get('TOPIC_DUPLICATE_RETRIES', '1'))
+    TOPIC_BLOCKLIST_SIZE = int(os.environ.get('TOPIC_BLOCKLIST_SIZE', '20'))
+
+    # Send the static part of the generation prompt as a cached prefix
+    PROMPT_CACHING = os.environ.get('PROMPT_CACHING', 'true').lower() == 'true'
 
     @staticmethod
     def get_cron_schedule():
@@ -0,0 +1,163 @@
+"""
+Schema upgrades for existing databases.
+
+db.create_all() only creates missing tables, so columns and indexes added
+to a model after its table exists never reach an existing quiz.db.
+upgrade_schema() fills that gap and is safe to run on every start.
+upgrade_database() runs both under a file lock, so processes starting
+together (gunicorn workers, the scheduler) upgrade one at a time; in
+production it runs once from scripts/upgrade_db.py instead.
+"""
+import os
+from contextlib import contextmanager, nullcontext
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app.extensions import db
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+# Columns derived from other rows, filled in when a rebuild adds them
+COLUMN_BACKFILLS = {
+    ('submissions', 'correct_count'):
+        'UPDATE submissions SET correct_count = (SELECT COUNT(*) FROM answers '
+        'WHERE answers.submission_id = submissions.id AND answers.is_correct)',
+    ('submissions', 'answered_count'):
+        'UPDATE submissions SET answered_count = (SELECT COUNT(*) FROM answers '
+        'WHERE answers.submission_id = submissions.id AND answers.selected_answer IS NOT NULL)',
+}
+
+
+def upgrade_database():
+    """Create missing tables and run upgrade_schema(), holding the schema
+    lock. Returns the names of the indexes created."""
+    with schema_lock():
+        db.create_all()
+        return upgrade_schema()
+
+
+def schema_lock():
+    """Exclusive lock across processes for changing the schema of a file
+    database; a no-op for in-memory databases"""
+    path = db.engine.url.database
+    if fcntl is None or not path or path == ':memory:':
+        return nullcontext()
+    return _file_lock(f'{path}.upgrade.lock')
+
+
+@contextmanager
+def _file_lock(path: str):
+    with open(path, 'a') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def upgrade_schema():
+    """Bring existing tables in line with the models.
+
+    Tables missing a column, or still carrying a unique constraint the
+    model no longer has, are rebuilt (SQLite cannot alter constraints in
+    place). Then any missing model indexes are created, and ix_ indexes
+    the model no longer declares are dropped. Columns a rebuild added are
+    filled from COLUMN_BACKFILLS last.
+
+    Returns the names of the indexes created.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    backfills = []
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        if _needs_rebuild(inspector, table):
+            old_columns = {c['name'] for c in inspector.get_columns(table.name)}
+            _rebuild_table(inspector, table)
+            inspector = inspect(db.engine)
+            backfills += [COLUMN_BACKFILLS[(table.name, c.name)] for c in table.columns
+                          if c.name not in old_columns and (table.name, c.name) in COLUMN_BACKFILLS]
+
+        existing_indexes = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                with db.engine.begin() as conn:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+                created.append(index.name)
+
+        # Our own indexes that the model no longer declares were renamed or
+        # redefined; drop them so they cannot enforce stale constraints
+        model_indexes = {index.name for index in table.indexes}
+        for name in existing_indexes - model_indexes:
+            if name.startswith('ix_'):
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+
+    # Backfills read other tables, so run them once every rebuild (and the
+    # dedupe it may do) is done
+    if backfills:
+        with db.engine.begin() as conn:
+            for statement in backfills:
+                conn.execute(text(statement))
+
+    return created
+
+
+def _needs_rebuild(inspector, table) -> bool:
+    columns = {c['name'] for c in inspector.get_columns(table.name)}
+    if any(c.name not in columns for c in table.columns):
+        return True
+
+    existing_unique = {frozenset(uc['column_names']) for uc in inspector.get_unique_constraints(table.name)}
+    return existing_unique != _model_unique(table)
+
+
+def _model_unique(table) -> set:
+    """Column sets the model declares unique (other than the primary key)"""
+    unique = {frozenset([c.name]) for c in table.columns if c.unique}
+    unique |= {
+        frozenset(c.name for c in constraint.columns)
+        for constraint in table.constraints
+        if isinstance(constraint, db.UniqueConstraint)
+    }
+    return unique
+
+
+def _rebuild_table(inspector, table):
+    """Recreate a table from its model definition, keeping its rows.
+
+    Follows SQLite's recommended order: create the new table under a
+    temporary name, copy, drop the old one, then rename. Renaming the new
+    table (rather than the old) keeps foreign keys in other tables
+    pointing at the right name. Indexes are left to the caller.
+    """
+    old_columns = {c['name'] for c in inspector.get_columns(table.name)}
+    shared = ', '.join(f'"{c.name}"' for c in table.columns if c.name in old_columns)
+    # Rows that would violate a newly added unique constraint: keep the
+    # first of each group, the one a select-then-update save kept updating
+    existing_unique = {frozenset(uc['column_names']) for uc in inspector.get_unique_constraints(table.name)}
+    keep = ''.join(
+        f' AND rowid IN (SELECT MIN(rowid) FROM "{table.name}" GROUP BY '
+        + ', '.join(f'"{name}"' for name in sorted(columns)) + ')'
+        for columns in _model_unique(table) - existing_unique
+        if columns <= old_columns
+    )
+    # Copy the other tables too, so foreign keys on the copy still resolve
+    metadata = db.MetaData()
+    for other in db.metadata.sorted_tables:
+        if other is not table:
+            other.to_metadata(metadata)
+    temp = table.to_metadata(metadata, name=f'_{table.name}_rebuild')
+
+    with db.engine.begin() as conn:
+        conn.execute(CreateTable(temp))
+        conn.execute(text(f'INSERT INTO "{temp.name}" ({shared}) SELECT {shared} FROM "{table.name}" '
+                          f'WHERE 1{keep}'))
+        conn.execute(text(f'DROP TABLE "{table.name}"'))
+        conn.execute(text(f'ALTER TABLE "{temp.name}" RENAME TO "{table.name}"'))
@@ -3,5 +3,9 @@ from app.models.quiz import Quiz
 from app.models.question import Question
 from app.models.submission import Submission
 from app.models.answer import Answer
+from app.models.analytics_rollup import DailyRollup
+from app.models.skill_rating import SkillRating
+from app.models.generation_telemetry import GenerationTelemetry
 
-__all__ = ['User', 'Quiz', 'Question', 'Submission', 'Answer']
+__all__ = ['User', 'Quiz', 'Question', 'Submission', 'Answer', 'DailyRollup', 'SkillRating',
+           'GenerationTelemetry']
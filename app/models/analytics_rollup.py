@@ -0,0 +1,28 @@
+from app.extensions import db
+
+
+class DailyRollup(db.Model):
+    """Per-user answer totals for one (quiz date, category, difficulty) cell.
+
+    Maintained incrementally when a submission completes so analytics can
+    read a handful of rows instead of rescanning raw answers.
+    """
+    __tablename__ = 'daily_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'quiz_date', 'category', 'difficulty',
+                            name='uq_daily_rollup_cell'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    quiz_date = db.Column(db.Date, nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    difficulty = db.Column(db.String(10), nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)  # answers
+    correct = db.Column(db.Integer, nullable=False, default=0)
+    timed = db.Column(db.Integer, nullable=False, default=0)  # answers with time_spent_seconds
+    timed_correct = db.Column(db.Integer, nullable=False, default=0)
+    time_spent = db.Column(db.Integer, nullable=False, default=0)  # summed seconds
+
+    def __repr__(self):
+        return f'<DailyRollup {self.user_id} {self.quiz_date} {self.category}/{self.difficulty}>'
@@ -3,6 +3,10 @@ from app.extensions import db
 
 class Answer(db.Model):
     __tablename__ = 'answers'
+    __table_args__ = (
+        # One answer per question per submission; saves upsert on it
+        db.UniqueConstraint('submission_id', 'question_id', name='uq_answers_submission_question'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     submission_id = db.Column(db.Integer, db.ForeignKey('submissions.id'), nullable=False)
@@ -0,0 +1,47 @@
+from datetime import datetime
+from app.extensions import db
+
+
+class GenerationTelemetry(db.Model):
+    """Timings, token usage and outcome of one quiz generation.
+
+    Written by QuizGeneratorService (see GenerationTimer) and read back as
+    p50/p95 series by TelemetryService.
+    """
+    __tablename__ = 'generation_telemetry'
+    __table_args__ = (
+        db.Index('ix_generation_telemetry_created', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # daily, personal, pregenerate
+    model = db.Column(db.String(100))
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    outcome = db.Column(db.String(20), nullable=False)  # ok, fallback, failed
+    error = db.Column(db.Text)
+
+    # Seconds spent in each phase
+    analytics_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    prompt_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    api_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    parse_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    save_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    total_seconds = db.Column(db.Float, nullable=False, default=0.0)
+
+    # API requests and response cache hits; retries counts generations
+    # requested again in full (transient errors, rejected topics)
+    requests = db.Column(db.Integer, nullable=False, default=0)
+    retries = db.Column(db.Integer, nullable=False, default=0)
+    cached_responses = db.Column(db.Integer, nullable=False, default=0)
+    repaired_questions = db.Column(db.Integer, nullable=False, default=0)
+    input_tokens = db.Column(db.Integer, nullable=False, default=0)
+    output_tokens = db.Column(db.Integer, nullable=False, default=0)
+    cache_read_tokens = db.Column(db.Integer, nullable=False, default=0)
+    cache_creation_tokens = db.Column(db.Integer, nullable=False, default=0)
+    # Local estimate of the same requests' input tokens (prompt_budget.estimate_tokens)
+    estimated_input_tokens = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<GenerationTelemetry {self.kind} {self.created_at} {self.outcome}>'
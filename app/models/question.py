@@ -16,6 +16,9 @@ DIFFICULTIES = ['easy', 'medium', 'hard']
 
 class Question(db.Model):
     __tablename__ = 'questions'
+    __table_args__ = (
+        db.Index('ix_questions_quiz_number', 'quiz_id', 'question_number'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), nullable=False)
@@ -29,6 +32,8 @@ class Question(db.Model):
     explanation = db.Column(db.Text)
     category = db.Column(db.String(50), nullable=False)
     difficulty = db.Column(db.String(10), nullable=False)  # easy, medium, hard
+    # Set on copies of question bank questions (review and fallback quizzes)
+    source_question_id = db.Column(db.Integer, db.ForeignKey('questions.id'))
 
     # Relationships
     answers = db.relationship('Answer', backref='question', lazy='dynamic')
@@ -1,16 +1,27 @@
-from datetime import datetime
+from datetime import date, datetime
 from app.extensions import db
 
 
 class Quiz(db.Model):
     __tablename__ = 'quizzes'
+    __table_args__ = (
+        # One personal daily quiz per user per day, and one shared daily quiz
+        # per day; review quizzes are not limited
+        db.Index('ix_quizzes_daily_user', 'quiz_date', 'user_id', unique=True,
+                 sqlite_where=db.text("kind = 'daily'")),
+        db.Index('ix_quizzes_daily_shared', 'quiz_date', unique=True,
+                 sqlite_where=db.text("user_id IS NULL AND kind = 'daily'")),
+        db.Index('ix_quizzes_user_kind', 'user_id', 'kind'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    quiz_date = db.Column(db.Date, unique=True, nullable=False)
+    quiz_date = db.Column(db.Date, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))  # None for the shared quiz
+    kind = db.Column(db.String(20), nullable=False, default='daily', server_default='daily')  # daily, review
     passage = db.Column(db.Text, nullable=False)
     generated_at = db.Column(db.DateTime, default=datetime.utcnow)
     generation_prompt = db.Column(db.Text)
-    status = db.Column(db.String(20), default='active')  # active, archived
+    status = db.Column(db.String(20), default='active')  # pending, active, archived
     notification_sent = db.Column(db.Boolean, default=False)
 
     # Relationships
@@ -21,6 +32,21 @@ class Quiz(db.Model):
     def __repr__(self):
         return f'<Quiz {self.quiz_date}>'
 
+    @classmethod
+    def visible_to(cls, user_id, include_pending: bool = False):
+        """Daily quizzes a user can take: their own and the shared ones,
+        newest first and, within a date, their own before the shared one.
+        Pre-generated quizzes stay hidden until promoted, unless
+        include_pending."""
+        query = cls.query.filter(cls.kind == 'daily', db.or_(cls.user_id == user_id, cls.user_id.is_(None)))
+        if not include_pending:
+            query = query.filter(cls.status != 'pending')
+        return query.order_by(cls.quiz_date.desc(), cls.user_id.is_(None))
+
+    def is_available(self) -> bool:
+        """Whether the quiz can be opened: promoted and due"""
+        return self.status != 'pending' and self.quiz_date <= date.today()
+
     def to_dict(self):
         return {
             'id': self.id,
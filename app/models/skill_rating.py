@@ -0,0 +1,19 @@
+from datetime import datetime
+from app.extensions import db
+
+
+class SkillRating(db.Model):
+    """Elo-style skill rating of a user in one category.
+
+    One row per (user, category), updated incrementally as answers come in.
+    """
+    __tablename__ = 'skill_ratings'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    rating = db.Column(db.Float, nullable=False, default=1500.0)
+    answers = db.Column(db.Integer, nullable=False, default=0)  # answers rated so far
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SkillRating {self.user_id} {self.category} {self.rating:.0f}>'
@@ -1,9 +1,15 @@
 from datetime import datetime
+from sqlalchemy import func, select, update
 from app.extensions import db
+from app.models.answer import Answer
 
 
 class Submission(db.Model):
     __tablename__ = 'submissions'
+    __table_args__ = (
+        db.Index('ix_submissions_user_quiz_completed', 'user_id', 'quiz_id', 'completed'),
+        db.Index('ix_submissions_user_submitted', 'user_id', 'submitted_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -13,6 +19,10 @@ class Submission(db.Model):
     total_time_seconds = db.Column(db.Integer)
     score = db.Column(db.Integer)  # Number of correct answers
     completed = db.Column(db.Boolean, default=False)
+    # Running tally of the answers, moved by tally_update() in the same
+    # transaction as every answer write, so scoring needs no recount
+    correct_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    answered_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     # Relationships
     answers = db.relationship('Answer', backref='submission', lazy='dynamic')
@@ -21,10 +31,37 @@ class Submission(db.Model):
         return f'<Submission {self.user_id}-{self.quiz_id}>'
 
     def calculate_score(self):
-        """Calculate and update the score based on answers"""
-        correct_count = self.answers.filter_by(is_correct=True).count()
-        self.score = correct_count
-        return correct_count
+        """Score the submission from the running tally"""
+        self.score = self.correct_count
+        return self.score
+
+    def recount(self):
+        """(correct, answered) counted from the stored answers; the running
+        tally should always equal it"""
+        correct = self.answers.filter_by(is_correct=True).count()
+        answered = self.answers.filter(Answer.selected_answer.isnot(None)).count()
+        return correct, answered
+
+    @staticmethod
+    def tally_update(submission_id: int, rows: list):
+        """UPDATE moving a submission's tally from its stored answers to the
+        questions in `rows` to the rows' values (dicts with question_id,
+        selected_answer and is_correct). Execute it right before writing
+        the rows, in the same transaction; it matches no row once the
+        submission is completed."""
+        question_ids = [row['question_id'] for row in rows]
+        stored = select(func.count()).where(
+            Answer.submission_id == submission_id, Answer.question_id.in_(question_ids)
+        )
+        old_correct = stored.where(Answer.is_correct.is_(True)).scalar_subquery()
+        old_answered = stored.where(Answer.selected_answer.isnot(None)).scalar_subquery()
+        return update(Submission).where(
+            Submission.id == submission_id, Submission.completed.isnot(True)
+        ).values(
+            correct_count=Submission.correct_count + sum(1 for row in rows if row['is_correct']) - old_correct,
+            answered_count=Submission.answered_count
+            + sum(1 for row in rows if row['selected_answer'] is not None) - old_answered
+        )
 
     def to_dict(self):
         return {
@@ -34,5 +71,7 @@ class Submission(db.Model):
             'submitted_at': self.submitted_at.isoformat() if self.submitted_at else None,
             'total_time_seconds': self.total_time_seconds,
             'score': self.score,
+            'correct_count': self.correct_count,
+            'answered_count': self.answered_count,
             'completed': self.completed
         }
@@ -4,9 +4,17 @@ API routes for quiz submission
 from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from app.extensions import db
-from app.models import Quiz, Question, Submission, Answer
+from app.models import Quiz, Submission, Answer
+from app.services.analytics import get_summary_cache
+from app.services.answer_keys import get_answer_keys
+from app.services.results import build_results, get_results_cache, results_response
+from app.services.rollups import RollupService
+from app.services.skill_ratings import SkillRatingService
+from app.services.submission_state import get_submission_states
+from app.services.telemetry import TelemetryService
 
 api_bp = Blueprint('api', __name__)
 
@@ -16,33 +24,27 @@ api_bp = Blueprint('api', __name__)
 def start_quiz(quiz_id):
     """Start a quiz, create submission record"""
     quiz = Quiz.query.get_or_404(quiz_id)
+    if quiz.user_id not in (None, current_user.id):
+        return jsonify({'error': 'Access denied'}), 403
+    if not quiz.is_available():
+        return jsonify({'error': 'Quiz not found'}), 404
 
-    # Check if already completed
-    existing = Submission.query.filter_by(
-        user_id=current_user.id,
-        quiz_id=quiz_id,
-        completed=True
-    ).first()
+    # Completed or in-progress submission, from the submission state cache
+    states = get_submission_states()
+    existing = states.find(current_user.id, quiz_id, confirm_open=True)
 
-    if existing:
+    if existing and existing.completed:
         return jsonify({'error': 'Quiz already completed', 'submission_id': existing.id}), 400
 
-    # Check for in-progress submission
-    in_progress = Submission.query.filter_by(
-        user_id=current_user.id,
-        quiz_id=quiz_id,
-        completed=False
-    ).first()
-
-    if in_progress:
+    if existing:
         # Return existing in-progress submission
-        elapsed = (datetime.utcnow() - in_progress.started_at).total_seconds()
+        elapsed = (datetime.utcnow() - existing.started_at).total_seconds()
         time_limit = current_app.config['QUIZ_TIME_LIMIT_SECONDS']
         remaining = max(0, time_limit - elapsed)
 
         return jsonify({
-            'submission_id': in_progress.id,
-            'started_at': in_progress.started_at.isoformat(),
+            'submission_id': existing.id,
+            'started_at': existing.started_at.isoformat(),
             'remaining_seconds': int(remaining)
         })
 
@@ -54,6 +56,7 @@ def start_quiz(quiz_id):
     )
     db.session.add(submission)
     db.session.commit()
+    states.remember(submission)
 
     time_limit = current_app.config['QUIZ_TIME_LIMIT_SECONDS']
 
@@ -78,63 +81,186 @@ def save_answer(quiz_id):
     if not all([submission_id, question_id]):
         return jsonify({'error': 'Missing required fields'}), 400
 
-    # Verify submission belongs to user and is not completed
-    submission = Submission.query.get_or_404(submission_id)
-    if submission.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
-    if submission.completed:
-        return jsonify({'error': 'Quiz already submitted'}), 400
+    # Verify submission belongs to user and is not completed (cached state)
+    state, error = _open_submission(submission_id, quiz_id)
+    if error:
+        return error
 
-    # Get question and verify it belongs to this quiz
-    question = Question.query.get_or_404(question_id)
-    if question.quiz_id != quiz_id:
+    # Verify the question belongs to this quiz, from the cached answer key
+    answer_key = get_answer_keys().get(quiz_id)
+    if not _is_question_id(question_id) or question_id not in answer_key:
         return jsonify({'error': 'Question does not belong to this quiz'}), 400
 
-    # Check if answer already exists
-    answer = Answer.query.filter_by(
-        submission_id=submission_id,
-        question_id=question_id
-    ).first()
-
-    is_correct = selected_answer == question.correct_answer if selected_answer else False
-
-    if answer:
-        # Update existing answer
-        answer.selected_answer = selected_answer
-        answer.is_correct = is_correct
-        answer.time_spent_seconds = time_spent
-    else:
-        # Create new answer
-        answer = Answer(
-            submission_id=submission_id,
-            question_id=question_id,
-            selected_answer=selected_answer,
-            is_correct=is_correct,
-            time_spent_seconds=time_spent
-        )
-        db.session.add(answer)
+    answer_ids = _upsert_answers(state.id, answer_key, [{
+        'question_id': question_id,
+        'selected_answer': selected_answer,
+        'time_spent_seconds': time_spent
+    }])
+    if answer_ids is None:
+        return _submitted_elsewhere(state.id)
+    db.session.commit()
+
+    return jsonify({'success': True, 'answer_id': answer_ids[question_id]})
+
+
+@api_bp.route('/quiz/<int:quiz_id>/answers', methods=['POST'])
+@login_required
+def save_answers(quiz_id):
+    """Save a batch of answers in one transaction.
+
+    quiz.js buffers answer changes and sends them here in batches rather
+    than one request (and commit) per click. Later entries for the same
+    question win. Nothing is saved if any entry is invalid.
+    """
+    data = request.get_json(silent=True) or {}
+    submission_id = data.get('submission_id')
+    items = data.get('answers')
+
+    if not submission_id or not isinstance(items, list):
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    state, error = _open_submission(submission_id, quiz_id)
+    if error:
+        return error
+
+    answers, error = _save_answers(state, items)
+    if answers is None and error is None:
+        return _submitted_elsewhere(state.id)
+    if error:
+        db.session.rollback()
+        return jsonify({'error': error}), 400
 
     db.session.commit()
 
-    return jsonify({'success': True, 'answer_id': answer.id})
+    return jsonify({
+        'success': True,
+        'answer_ids': {str(question_id): answer_id for question_id, answer_id in answers.items()}
+    })
+
+
+def _open_submission(submission_id: int, quiz_id: int):
+    """(state, None) for the current user's open submission of the quiz,
+    else (None, error response). Reads the submission state cache, not
+    the submissions table."""
+    state = get_submission_states().get(submission_id)
+    if state is None:
+        return None, (jsonify({'error': 'Submission not found'}), 404)
+    if state.user_id != current_user.id or state.quiz_id != quiz_id:
+        return None, (jsonify({'error': 'Access denied'}), 403)
+    if state.completed:
+        return None, (jsonify({'error': 'Quiz already submitted'}), 400)
+    return state, None
+
+
+def _submitted_elsewhere(submission_id: int):
+    """Error response for a write that found the submission completed
+    after the cached state said it was open; refreshes the cache"""
+    db.session.rollback()
+    get_submission_states().remember(db.session.get(Submission, submission_id))
+    return jsonify({'error': 'Quiz already submitted'}), 400
+
+
+def _save_answers(submission, items: list):
+    """Insert or update a batch of answers of an open submission (a
+    Submission or its SubmissionState), without committing. Returns
+    (answer ids by question id, None), (None, error), or (None, None) if
+    the submission turned out to be completed."""
+    answer_key = get_answer_keys().get(submission.quiz_id)
+
+    latest = {}
+    for item in items:
+        question_id = item.get('question_id') if isinstance(item, dict) else None
+        if not _is_question_id(question_id) or question_id not in answer_key:
+            return None, 'Question does not belong to this quiz'
+        latest[question_id] = item
+
+    return _upsert_answers(submission.id, answer_key, list(latest.values())), None
+
+
+def _is_question_id(value) -> bool:
+    """Whether a request's question_id is an id at all (JSON lists and
+    objects are unhashable, and true would match question 1)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _upsert_answers(submission_id: int, answer_key: dict, items: list):
+    """Write answers with a single INSERT ... ON CONFLICT DO UPDATE on
+    (submission_id, question_id), scored against `answer_key`, after
+    moving the submission's running tally (Submission.tally_update). Items
+    must be for distinct questions of the quiz. Returns answer ids by
+    question, or None without writing if the submission is completed."""
+    rows = []
+    for item in items:
+        selected_answer = item.get('selected_answer')
+        rows.append({
+            'submission_id': submission_id,
+            'question_id': item['question_id'],
+            'selected_answer': selected_answer,
+            'is_correct': selected_answer == answer_key[item['question_id']] if selected_answer else False,
+            'time_spent_seconds': item.get('time_spent_seconds', 0)
+        })
+    if not rows:
+        return {}
+
+    # The tally update only matches an open submission, which also catches
+    # a cached state that missed the submit
+    if db.session.execute(Submission.tally_update(submission_id, rows)).rowcount == 0:
+        return None
+    stmt = sqlite_insert(Answer).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['submission_id', 'question_id'],
+        set_={
+            'selected_answer': stmt.excluded.selected_answer,
+            'is_correct': stmt.excluded.is_correct,
+            'time_spent_seconds': stmt.excluded.time_spent_seconds
+        }
+    ).returning(Answer.question_id, Answer.id)
+    return dict(db.session.execute(stmt).all())
+
+
+@api_bp.route('/quiz/<int:quiz_id>/progress')
+@login_required
+def quiz_progress(quiz_id):
+    """Answered and correct so far, from the submission's running tally"""
+    submission = Submission.query.filter_by(user_id=current_user.id, quiz_id=quiz_id) \
+        .order_by(Submission.id.desc()).first_or_404()
+    return jsonify({
+        'submission_id': submission.id,
+        'answered': submission.answered_count,
+        'correct': submission.correct_count,
+        'completed': submission.completed
+    })
 
 
 @api_bp.route('/quiz/<int:quiz_id>/submit', methods=['POST'])
 @login_required
 def submit_quiz(quiz_id):
-    """Complete quiz submission"""
+    """Complete quiz submission.
+
+    Answers still buffered by quiz.js may be sent along as `answers` (as
+    for save_answers); they are saved in the same transaction.
+    """
     data = request.get_json()
     submission_id = data.get('submission_id')
 
     if not submission_id:
         return jsonify({'error': 'Missing submission_id'}), 400
 
-    submission = Submission.query.get_or_404(submission_id)
-
-    if submission.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    state, error = _open_submission(submission_id, quiz_id)
+    if error:
+        return error
+    submission = db.session.get(Submission, state.id)
     if submission.completed:
-        return jsonify({'error': 'Quiz already submitted'}), 400
+        return _submitted_elsewhere(submission.id)
+
+    if data.get('answers'):
+        if not isinstance(data['answers'], list):
+            return jsonify({'error': 'Invalid answers'}), 400
+        error = _save_answers(submission, data['answers'])[1]
+        if error:
+            db.session.rollback()
+            return jsonify({'error': error}), 400
+        db.session.expire(submission, ['correct_count', 'answered_count'])
 
     # Calculate total time
     now = datetime.utcnow()
@@ -145,8 +271,12 @@ def submit_quiz(quiz_id):
     submission.total_time_seconds = total_seconds
     submission.completed = True
     submission.calculate_score()
+    RollupService().record_submission(submission)
+    SkillRatingService().apply_submission(submission)
 
     db.session.commit()
+    get_submission_states().remember(submission)
+    get_summary_cache().invalidate_user(current_user.id)
 
     return jsonify({
         'success': True,
@@ -157,11 +287,37 @@ def submit_quiz(quiz_id):
     })
 
 
+@api_bp.route('/submission/<int:submission_id>/results')
+@login_required
+def submission_results(submission_id):
+    """Results of a submission with answers, explanations and category
+    breakdown; completed ones are cached and support If-None-Match"""
+    cache = get_results_cache()
+    cached = cache.get(submission_id, 'json')
+    if cached and cached[0] == current_user.id:
+        return results_response(cached[2], cached[1], 'application/json')
+
+    results = build_results(submission_id)
+    if results is None:
+        return jsonify({'error': 'Submission not found'}), 404
+    if results.submission.user_id != current_user.id:
+        return jsonify({'error': 'Access denied'}), 403
+
+    if not results.submission.completed:
+        return jsonify(results.to_dict())
+    body = current_app.json.dumps(results.to_dict())
+    return results_response(body, cache.put(results.submission, 'json', body), 'application/json')
+
+
 @api_bp.route('/quiz/<int:quiz_id>/data')
 @login_required
 def get_quiz_data(quiz_id):
     """Get quiz data as JSON"""
     quiz = Quiz.query.get_or_404(quiz_id)
+    if quiz.user_id not in (None, current_user.id):
+        return jsonify({'error': 'Access denied'}), 403
+    if not quiz.is_available():
+        return jsonify({'error': 'Quiz not found'}), 404
 
     return jsonify({
         'id': quiz.id,
@@ -169,3 +325,29 @@ def get_quiz_data(quiz_id):
         'passage': quiz.passage,
         'questions': [q.to_dict(include_answer=False) for q in quiz.questions]
     })
+
+
+@api_bp.route('/analytics/cache-stats')
+@login_required
+def analytics_cache_stats():
+    """Hit/miss counters of this worker's analytics summary cache"""
+    return jsonify(get_summary_cache().stats())
+
+
+@api_bp.route('/submission-state/stats')
+@login_required
+def submission_state_stats():
+    """Hit/miss counters of this worker's submission state cache"""
+    return jsonify(get_submission_states().stats())
+
+
+@api_bp.route('/generation/telemetry')
+@login_required
+def generation_telemetry():
+    """p50/p95 generation latency and mean token usage per day or week"""
+    days = request.args.get('days', 30, type=int)
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in ('day', 'week'):
+        return jsonify({'error': "bucket must be 'day' or 'week'"}), 400
+    summary = TelemetryService().summary(days=days, bucket=bucket, kind=request.args.get('kind'))
+    return jsonify({'days': days, 'bucket': bucket, 'periods': summary})
@@ -2,11 +2,15 @@
 Quiz display routes
 """
 from datetime import date, datetime
-from flask import Blueprint, render_template, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, current_app, session, abort
 from flask_login import login_required, current_user
 
 from app.extensions import db
 from app.models import Quiz, Submission
+from app.services.analytics import AnalyticsService
+from app.services.question_bank import get_question_bank
+from app.services.results import build_results, get_results_cache, results_response
+from app.services.submission_state import get_submission_states
 
 quiz_bp = Blueprint('quiz', __name__)
 
@@ -17,15 +21,9 @@ def index():
     if not current_user.is_authenticated:
         return render_template('login.html')
 
-    # Get today's quiz
-    today = date.today()
-    quiz = Quiz.query.filter_by(quiz_date=today).first()
-
-    if quiz:
-        return redirect(url_for('quiz.take_quiz', quiz_date=today.isoformat()))
-
-    # Check for most recent quiz if no quiz today
-    quiz = Quiz.query.order_by(Quiz.quiz_date.desc()).first()
+    # Today's quiz, or the most recent one if there is none today
+    # (future ones are pre-generated, not yet due)
+    quiz = Quiz.visible_to(current_user.id).filter(Quiz.quiz_date <= date.today()).first()
     if quiz:
         return redirect(url_for('quiz.take_quiz', quiz_date=quiz.quiz_date.isoformat()))
 
@@ -42,27 +40,18 @@ def take_quiz(quiz_date):
         flash('Invalid date format.', 'error')
         return redirect(url_for('quiz.index'))
 
-    quiz = Quiz.query.filter_by(quiz_date=quiz_date_obj).first()
+    quiz = None
+    if quiz_date_obj <= date.today():
+        quiz = Quiz.visible_to(current_user.id).filter(Quiz.quiz_date == quiz_date_obj).first()
     if not quiz:
         flash('Quiz not found for this date.', 'error')
         return redirect(url_for('quiz.index'))
 
-    # Check if user already completed this quiz
-    existing_submission = Submission.query.filter_by(
-        user_id=current_user.id,
-        quiz_id=quiz.id,
-        completed=True
-    ).first()
-
-    if existing_submission:
-        return redirect(url_for('quiz.results', submission_id=existing_submission.id))
-
-    # Check for in-progress submission
-    in_progress = Submission.query.filter_by(
-        user_id=current_user.id,
-        quiz_id=quiz.id,
-        completed=False
-    ).first()
+    # Check if user already completed this quiz, or has one in progress
+    state = get_submission_states().find(current_user.id, quiz.id, confirm_open=True)
+    if state and state.completed:
+        return redirect(url_for('quiz.results', submission_id=state.id))
+    in_progress = state
 
     time_limit = current_app.config['QUIZ_TIME_LIMIT_SECONDS']
 
@@ -74,39 +63,69 @@ def take_quiz(quiz_date):
     )
 
 
+@quiz_bp.route('/review')
+@login_required
+def review():
+    """Practice quiz assembled from past questions, favouring weak areas
+    and questions the user has not seen"""
+    # Resume the latest review if it has not been submitted yet
+    quiz = Quiz.query.filter_by(user_id=current_user.id, kind='review').order_by(Quiz.id.desc()).first()
+    if quiz:
+        state = get_submission_states().find(current_user.id, quiz.id, confirm_open=True)
+        if state and state.completed:
+            quiz = None
+
+    if not quiz:
+        summary = AnalyticsService(current_user.id).get_performance_summary()
+        weak = [w['category'] for w in summary['weak_areas'][:3]]
+        quiz = get_question_bank().create_quiz(date.today(), user_id=current_user.id, categories=weak)
+        if not quiz:
+            flash('Not enough past questions for a review session yet.', 'error')
+            return redirect(url_for('quiz.index'))
+
+    state = get_submission_states().find(current_user.id, quiz.id, confirm_open=True)
+    in_progress = state if state and not state.completed else None
+
+    return render_template(
+        'quiz.html',
+        quiz=quiz,
+        submission=in_progress,
+        time_limit=current_app.config['QUIZ_TIME_LIMIT_SECONDS']
+    )
+
+
 @quiz_bp.route('/results/<int:submission_id>')
 @login_required
 def results(submission_id):
     """Display quiz results with explanations"""
-    submission = Submission.query.get_or_404(submission_id)
+    # Completed results never change; serve this worker's copy if it has one.
+    # Pending flash messages are part of the page, so skip the cache for them.
+    cache = get_results_cache()
+    flashes = '_flashes' in session
+    cached = None if flashes else cache.get(submission_id, 'html')
+    if cached and cached[0] == current_user.id:
+        return results_response(cached[2], cached[1], 'text/html')
+
+    results = build_results(submission_id)
+    if results is None:
+        abort(404)
 
     # Verify this submission belongs to current user
-    if submission.user_id != current_user.id:
+    if results.submission.user_id != current_user.id:
         flash('Access denied.', 'error')
         return redirect(url_for('quiz.index'))
 
-    quiz = submission.quiz
-    answers = {a.question_id: a for a in submission.answers}
-
-    # Calculate category breakdown
-    category_stats = {}
-    for question in quiz.questions:
-        cat = question.category
-        if cat not in category_stats:
-            category_stats[cat] = {'correct': 0, 'total': 0}
-        category_stats[cat]['total'] += 1
-
-        answer = answers.get(question.id)
-        if answer and answer.is_correct:
-            category_stats[cat]['correct'] += 1
-
-    return render_template(
+    html = render_template(
         'results.html',
-        quiz=quiz,
-        submission=submission,
-        answers=answers,
-        category_stats=category_stats
+        quiz=results.quiz,
+        submission=results.submission,
+        questions=results.questions,
+        answers=results.answers,
+        category_stats=results.category_stats
     )
+    if flashes or not results.submission.completed:
+        return html
+    return results_response(html, cache.put(results.submission, 'html', html), 'text/html')
 
 
 @quiz_bp.route('/history')
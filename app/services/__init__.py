@@ -1,5 +1,6 @@
 from app.services.analytics import AnalyticsService
+from app.services.skill_estimator import SkillEstimator
 from app.services.quiz_generator import QuizGeneratorService
 from app.services.notification import NotificationService
 
-__all__ = ['AnalyticsService', 'QuizGeneratorService', 'NotificationService']
+__all__ = ['AnalyticsService', 'SkillEstimator', 'QuizGeneratorService', 'NotificationService']
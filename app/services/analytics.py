@@ -2,32 +2,214 @@
 Analytics Service
 Calculates performance metrics for adaptive quiz generation
 """
+import copy
+import os
+import threading
+from collections import OrderedDict, defaultdict
 from datetime import date, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, case
+from flask import current_app
 from app.extensions import db
-from app.models import User, Quiz, Question, Submission, Answer
+from app.models import User, Quiz, Question, Submission, Answer, DailyRollup, SkillRating
 from app.models.question import CATEGORIES
 
+# Trend periods used when bucketing answers for the summary
+PERIOD_EARLIER = 0
+PERIOD_RECENT = 1
+
 
 class AnalyticsService:
     """Calculate user performance analytics for adaptive quiz generation"""
 
-    def __init__(self, user_id: int, days: int = 7):
+    def __init__(self, user_id: int, days: int = 7, source: str = None):
         self.user_id = user_id
         self.days = days
         self.start_date = date.today() - timedelta(days=days)
+        # Where get_performance_summary reads answers from: 'rollup' uses the
+        # incrementally maintained DailyRollup table, 'raw' joins the answers
+        self.source = source or current_app.config.get('ANALYTICS_SOURCE', 'raw')
+        # How get_performance_summary finds weak areas: 'accuracy' in the
+        # window, or 'rating' from the incremental skill ratings
+        self.weak_areas_mode = current_app.config.get('WEAK_AREAS_MODE', 'accuracy')
 
-    def get_performance_summary(self) -> dict:
-        """Get complete performance summary for prompt building"""
-        return {
-            'category_performance': self.get_category_performance(),
-            'difficulty_performance': self.get_difficulty_performance(),
-            'weak_areas': self.get_weak_areas(),
-            'time_struggles': self.get_time_struggles(),
-            'recent_trends': self.get_recent_trends(),
-            'overall_stats': self.get_overall_stats()
+    def get_performance_summary(self, use_cache: bool = True) -> dict:
+        """Get complete performance summary for prompt building.
+
+        All sections are computed from one grouped query over the user's
+        answers in the window instead of one query per section, read from
+        the daily rollups or the raw answers depending on self.source.
+
+        Results are cached per (user, window, latest completed submission),
+        so repeated calls are served from memory until the user completes
+        another quiz.
+        """
+        if not use_cache:
+            return self._compute_summary()
+
+        cache = get_summary_cache()
+        key = self._cache_key()
+        summary = cache.get(key)
+        if summary is None:
+            summary = self._compute_summary()
+            cache.put(key, summary)
+        return copy.deepcopy(summary)
+
+    def _cache_key(self) -> tuple:
+        latest_submission_id = db.session.query(func.max(Submission.id)).filter(
+            Submission.user_id == self.user_id,
+            Submission.completed == True
+        ).scalar()
+        # start_date rolls the key over at midnight since the window moves
+        return (self.user_id, self.days, self.source, self.weak_areas_mode,
+                self.start_date, latest_submission_id)
+
+    def _compute_summary(self) -> dict:
+        rows = self._bucket_query().add_columns(*self._overall_columns()).all()
+        if rows:
+            buckets = [AnswerBucket(*row[:8]) for row in rows]
+            summary = summarize_buckets(buckets, tuple(rows[0][8:]))
+        else:
+            # No answers in the window; overall stats may still be non-empty
+            summary = summarize_buckets([], db.session.query(*self._overall_columns()).one())
+
+        if self.weak_areas_mode == 'rating':
+            summary['weak_areas'] = self.get_weak_areas(mode='rating')
+        return summary
+
+    @classmethod
+    def get_all_performance_summaries(cls, days: int = 7, source: str = None,
+                                      user_ids: list = None) -> dict:
+        """Performance summaries for many users at once, keyed by user id.
+
+        Runs one grouped query over answers (or rollups) and one over
+        submissions for the whole cohort, so cost scales with the number of
+        rows rather than users x queries. Without user_ids, every user with
+        activity in the window is included; listed users without activity
+        get an empty summary.
+        """
+        service = cls(None, days, source)
+
+        bucket_query = service._bucket_query(per_user=True)
+        overall_query = service._overall_query(per_user=True)
+        if user_ids is not None:
+            bucket_query = bucket_query.filter(service._user_column().in_(user_ids))
+            overall_query = overall_query.filter(Submission.user_id.in_(user_ids))
+
+        buckets = defaultdict(list)
+        for row in bucket_query:
+            buckets[row[0]].append(AnswerBucket(*row[1:]))
+        overall = {row[0]: tuple(row[1:]) for row in overall_query}
+
+        if user_ids is None:
+            user_ids = set(buckets) | set(overall)
+        summaries = {
+            user_id: summarize_buckets(buckets.get(user_id, []), overall.get(user_id, (0, None, None)))
+            for user_id in user_ids
         }
 
+        # Same weak areas as _compute_summary, from one ratings query for the cohort
+        if service.weak_areas_mode == 'rating':
+            ratings = defaultdict(list)
+            for rating in SkillRating.query.filter(SkillRating.user_id.in_(list(user_ids))):
+                ratings[rating.user_id].append(rating)
+            for user_id, summary in summaries.items():
+                summary['weak_areas'] = weak_areas_from_ratings(ratings.get(user_id, []))
+        return summaries
+
+    def _midpoint(self) -> date:
+        return date.today() - timedelta(days=self.days // 2)
+
+    def _period_column(self, quiz_date_column):
+        """Trend period of a quiz date: PERIOD_EARLIER, PERIOD_RECENT or None"""
+        return case(
+            (quiz_date_column < self._midpoint(), PERIOD_EARLIER),
+            (quiz_date_column <= date.today(), PERIOD_RECENT),
+            else_=None
+        )
+
+    def _overall_query(self, per_user: bool = False):
+        """Completed submissions in the window: count, average score and time"""
+        columns = [
+            func.count(Submission.id),
+            func.avg(Submission.score),
+            func.avg(Submission.total_time_seconds)
+        ]
+        query = db.session.query(Submission.user_id, *columns) if per_user else db.session.query(*columns)
+        query = query.filter(
+            Submission.completed == True,
+            Submission.submitted_at >= self.start_date
+        )
+        if per_user:
+            return query.group_by(Submission.user_id)
+        return query.filter(Submission.user_id == self.user_id)
+
+    def _overall_columns(self):
+        """_overall_query as scalar subqueries, embeddable in another query"""
+        query = self._overall_query()
+        return tuple(
+            query.with_entities(column).scalar_subquery()
+            for column in query.statement.selected_columns
+        )
+
+    def _user_column(self):
+        return DailyRollup.user_id if self.source == 'rollup' else Submission.user_id
+
+    def _bucket_query(self, per_user: bool = False):
+        """Answers in the window grouped by trend period, category and
+        difficulty, read from the rollups or the raw answers.
+
+        Selects the AnswerBucket fields, prefixed by the user id when
+        per_user is set (otherwise restricted to self.user_id).
+        """
+        user_column = self._user_column()
+        leading = [user_column] if per_user else []
+
+        if self.source == 'rollup':
+            period = self._period_column(DailyRollup.quiz_date)
+            category, difficulty = DailyRollup.category, DailyRollup.difficulty
+            query = db.session.query(
+                *leading,
+                period,
+                category,
+                difficulty,
+                func.sum(DailyRollup.total),
+                func.sum(DailyRollup.correct),
+                func.sum(DailyRollup.timed),
+                func.sum(DailyRollup.timed_correct),
+                func.sum(DailyRollup.time_spent)
+            ).filter(
+                DailyRollup.quiz_date >= self.start_date
+            )
+        else:
+            timed = Answer.time_spent_seconds.isnot(None)
+            correct = func.cast(Answer.is_correct, db.Integer)
+            period = self._period_column(Quiz.quiz_date)
+            category, difficulty = Question.category, Question.difficulty
+            query = db.session.query(
+                *leading,
+                period,
+                category,
+                difficulty,
+                func.count(Answer.id),
+                func.sum(correct),
+                func.count(Answer.time_spent_seconds),
+                func.sum(case((timed, correct), else_=0)),
+                func.sum(Answer.time_spent_seconds)
+            ).select_from(Question).join(
+                Answer, Answer.question_id == Question.id
+            ).join(
+                Submission, Submission.id == Answer.submission_id
+            ).join(
+                Quiz, Quiz.id == Question.quiz_id
+            ).filter(
+                Submission.completed == True,
+                Quiz.quiz_date >= self.start_date
+            )
+
+        if not per_user:
+            query = query.filter(user_column == self.user_id)
+        return query.group_by(*leading, period, category, difficulty)
+
     def get_category_performance(self) -> dict:
         """Calculate accuracy per category over the time period"""
         # Join through submission to get user's answers
@@ -94,22 +276,25 @@ class AnalyticsService:
 
         return performance
 
-    def get_weak_areas(self, threshold: float = 60.0) -> list:
-        """Get categories where accuracy is below threshold"""
-        category_perf = self.get_category_performance()
+    def get_weak_areas(self, threshold: float = 60.0, category_perf: dict = None,
+                       mode: str = 'accuracy') -> list:
+        """Get categories where accuracy is below threshold.
 
-        weak = []
-        for category, stats in category_perf.items():
-            if stats['total'] > 0 and stats['accuracy'] < threshold:
-                weak.append({
-                    'category': category,
-                    'accuracy': stats['accuracy'],
-                    'attempts': stats['total']
-                })
+        Pass category_perf to reuse an already computed category breakdown
+        instead of querying it again. With mode='rating', read the
+        incrementally maintained skill ratings instead: a category is weak
+        when the expected accuracy on a medium question is below threshold.
+        That is a primary-key lookup of at most one row per category, no
+        matter how much history the user has.
+        """
+        if mode == 'rating':
+            return self._weak_areas_from_ratings(threshold)
+        if category_perf is None:
+            category_perf = self.get_category_performance()
+        return weak_areas_from(category_perf, threshold)
 
-        # Sort by accuracy (worst first)
-        weak.sort(key=lambda x: x['accuracy'])
-        return weak
+    def _weak_areas_from_ratings(self, threshold: float) -> list:
+        return weak_areas_from_ratings(SkillRating.query.filter_by(user_id=self.user_id), threshold)
 
     def get_time_struggles(self) -> list:
         """Find categories where user is slow AND has low accuracy"""
@@ -210,3 +395,229 @@ class AnalyticsService:
             'average_score': round(avg_score, 1) if avg_score else 0,
             'average_time_seconds': round(avg_time, 0) if avg_time else 0
         }
+
+
+class SummaryCache:
+    """Bounded LRU of performance summaries.
+
+    Keys carry the user's latest completed submission id, so an entry can
+    never be served stale: a new submission changes the key. Explicit
+    invalidation just frees the superseded entries early. Each app (and
+    so each gunicorn worker) holds its own instance; stats() includes the
+    pid so per-worker hit rates can be told apart.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int) -> int:
+        """Drop all cached summaries for a user, returns how many were dropped"""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == user_id]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'pid': os.getpid(),
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+def get_summary_cache() -> SummaryCache:
+    """The current app's summary cache, created on first use"""
+    cache = current_app.extensions.get('analytics_summary_cache')
+    if cache is None:
+        cache = SummaryCache(current_app.config.get('ANALYTICS_CACHE_SIZE', 256))
+        current_app.extensions['analytics_summary_cache'] = cache
+    return cache
+
+
+class AnswerBucket:
+    """Aggregated answers for one (trend period, category, difficulty) cell"""
+
+    __slots__ = ('period', 'category', 'difficulty', 'total', 'correct',
+                 'timed', 'timed_correct', 'time_spent')
+
+    def __init__(self, period, category, difficulty, total, correct,
+                 timed, timed_correct, time_spent):
+        self.period = period
+        self.category = category
+        self.difficulty = difficulty
+        self.total = total or 0
+        self.correct = correct or 0
+        self.timed = timed or 0  # answers with a recorded time
+        self.timed_correct = timed_correct or 0  # correct answers among those
+        self.time_spent = time_spent or 0  # summed seconds over timed answers
+
+
+def _accuracy_stats(total: int, correct: int) -> dict:
+    accuracy = (correct / total * 100) if total > 0 else 0
+    return {'total': total, 'correct': correct, 'accuracy': round(accuracy, 1)}
+
+
+def weak_areas_from(category_perf: dict, threshold: float = 60.0) -> list:
+    """Categories from a category breakdown whose accuracy is below threshold"""
+    weak = []
+    for category, stats in category_perf.items():
+        if stats['total'] > 0 and stats['accuracy'] < threshold:
+            weak.append({
+                'category': category,
+                'accuracy': stats['accuracy'],
+                'attempts': stats['total']
+            })
+
+    # Sort by accuracy (worst first)
+    weak.sort(key=lambda x: x['accuracy'])
+    return weak
+
+
+def weak_areas_from_ratings(ratings, threshold: float = 60.0) -> list:
+    """Weak categories of one user's SkillRating rows: those whose expected
+    accuracy on a medium question is below threshold, weakest first"""
+    from app.services.skill_ratings import expected_score
+
+    weak = []
+    for rating in ratings:
+        accuracy = round(expected_score(rating.rating) * 100, 1)
+        if rating.answers > 0 and accuracy < threshold:
+            weak.append({
+                'category': rating.category,
+                'accuracy': accuracy,
+                'attempts': rating.answers,
+                'rating': round(rating.rating)
+            })
+
+    weak.sort(key=lambda x: x['accuracy'])
+    return weak
+
+
+def summarize_buckets(buckets: list, overall: tuple) -> dict:
+    """Build the performance summary dict from aggregated answer buckets.
+
+    Produces the same shape as calling the individual AnalyticsService
+    methods, in a single pass over already fetched data.
+    """
+    by_category = defaultdict(lambda: [0, 0])
+    by_difficulty = defaultdict(lambda: [0, 0])
+    timed_by_category = defaultdict(lambda: [0, 0, 0])  # timed, correct, seconds
+    by_period = defaultdict(lambda: [0, 0])
+
+    for b in buckets:
+        by_category[b.category][0] += b.total
+        by_category[b.category][1] += b.correct
+        by_difficulty[b.difficulty][0] += b.total
+        by_difficulty[b.difficulty][1] += b.correct
+        by_period[b.period][0] += b.total
+        by_period[b.period][1] += b.correct
+
+        if b.timed:
+            timed = timed_by_category[b.category]
+            timed[0] += b.timed
+            timed[1] += b.timed_correct
+            timed[2] += b.time_spent
+
+    # Category performance, including categories with no attempts
+    category_perf = {
+        category: _accuracy_stats(total, correct)
+        for category, (total, correct) in by_category.items()
+    }
+    for cat in CATEGORIES:
+        if cat not in category_perf:
+            category_perf[cat] = {'total': 0, 'correct': 0, 'accuracy': 0}
+
+    difficulty_perf = {
+        difficulty: _accuracy_stats(total, correct)
+        for difficulty, (total, correct) in by_difficulty.items()
+    }
+
+    # Time struggles: above-average time and below-average accuracy
+    struggles = []
+    if timed_by_category:
+        averages = [
+            (category, seconds / timed, correct / timed)
+            for category, (timed, correct, seconds) in timed_by_category.items()
+        ]
+        avg_time_overall = sum(a[1] for a in averages) / len(averages)
+        avg_accuracy_overall = sum(a[2] for a in averages) / len(averages)
+        for category, avg_time, accuracy in averages:
+            if avg_time > avg_time_overall and accuracy < avg_accuracy_overall:
+                struggles.append({
+                    'category': category,
+                    'avg_time_seconds': round(avg_time, 1),
+                    'accuracy': round(accuracy * 100, 1)
+                })
+
+    # Recent trend: second half of the window against the first
+    def period_accuracy(period):
+        total, correct = by_period.get(period, (0, 0))
+        if total > 0:
+            return round(correct / total * 100, 1)
+        return None
+
+    earlier = period_accuracy(PERIOD_EARLIER)
+    recent = period_accuracy(PERIOD_RECENT)
+    trend = 'stable'
+    if earlier is not None and recent is not None:
+        diff = recent - earlier
+        if diff > 5:
+            trend = 'improving'
+        elif diff < -5:
+            trend = 'declining'
+
+    quizzes, avg_score, avg_time = overall
+    return {
+        'category_performance': category_perf,
+        'difficulty_performance': difficulty_perf,
+        'weak_areas': weak_areas_from(category_perf),
+        'time_struggles': struggles,
+        'recent_trends': {
+            'earlier_accuracy': earlier,
+            'recent_accuracy': recent,
+            'trend': trend
+        },
+        'overall_stats': {
+            'quizzes_taken': quizzes or 0,
+            'average_score': round(avg_score, 1) if avg_score else 0,
+            'average_time_seconds': round(avg_time, 0) if avg_time else 0
+        }
+    }
@@ -0,0 +1,81 @@
+"""
+Answer Keys
+Per-quiz correct answers cached in process, for the answer-save path
+"""
+import os
+import threading
+from collections import OrderedDict
+from flask import current_app
+
+from app.extensions import db
+from app.models import Question
+
+
+class AnswerKeyCache:
+    """Bounded LRU of {question_id: correct_answer} per quiz.
+
+    Saving an answer needs to know the question belongs to the quiz and
+    whether the pick is correct; the key answers both without a query once
+    loaded. A quiz's questions only change when they are regenerated on
+    promotion (QuizGeneratorService.promote_pending), which calls
+    invalidate().
+    Each app (and so each gunicorn worker) holds its own instance.
+    """
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, quiz_id: int) -> dict:
+        """The quiz's answer key, loaded with one query on a miss"""
+        with self._lock:
+            key = self._entries.get(quiz_id)
+            if key is not None:
+                self._entries.move_to_end(quiz_id)
+                self.hits += 1
+                return key
+            self.misses += 1
+
+        key = dict(
+            db.session.query(Question.id, Question.correct_answer).filter(Question.quiz_id == quiz_id)
+        )
+        # A quiz without questions may still be being written; don't cache it
+        if key:
+            with self._lock:
+                self._entries[quiz_id] = key
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return key
+
+    def invalidate(self, quiz_id: int):
+        with self._lock:
+            self._entries.pop(quiz_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'pid': os.getpid(),
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None
+            }
+
+
+def get_answer_keys() -> AnswerKeyCache:
+    """The current app's answer key cache, created on first use"""
+    cache = current_app.extensions.get('answer_key_cache')
+    if cache is None:
+        cache = AnswerKeyCache(current_app.config.get('ANSWER_KEY_CACHE_SIZE', 512))
+        current_app.extensions['answer_key_cache'] = cache
+    return cache
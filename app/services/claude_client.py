@@ -0,0 +1,127 @@
+"""
+Claude Client
+Shared Anthropic client, request rate limiting and retries for generation
+"""
+import random
+import threading
+import time
+import anthropic
+import httpx
+from flask import current_app
+
+
+_client_lock = threading.Lock()
+
+# Errors worth another attempt: throttling, overload and network trouble,
+# plus ValueError for a response that could not be parsed into a quiz
+RETRYABLE_ERRORS = (
+    anthropic.RateLimitError,
+    anthropic.InternalServerError,
+    anthropic.APIConnectionError,
+    ValueError,
+)
+
+
+def get_anthropic_client():
+    """The app's Anthropic client, created on first use.
+
+    Every QuizGeneratorService and worker thread shares it, so they share
+    one pooled set of HTTP connections (ANTHROPIC_MAX_CONNECTIONS) instead
+    of opening a new pool per service. The SDK's own retries are off:
+    call_with_retry is the only retry layer, so every attempt goes
+    through the caller's rate limiter.
+    """
+    client = current_app.extensions.get('anthropic_client')
+    if client is not None:
+        return client
+
+    with _client_lock:
+        client = current_app.extensions.get('anthropic_client')
+        if client is None:
+            api_key = current_app.config['ANTHROPIC_API_KEY']
+            if not api_key:
+                raise ValueError("ANTHROPIC_API_KEY not configured")
+            connections = current_app.config.get('ANTHROPIC_MAX_CONNECTIONS', 20)
+            client = anthropic.Anthropic(
+                api_key=api_key,
+                max_retries=0,
+                http_client=anthropic.DefaultHttpxClient(
+                    limits=httpx.Limits(max_connections=connections,
+                                        max_keepalive_connections=connections)
+                )
+            )
+            current_app.extensions['anthropic_client'] = client
+    return client
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to
+    `capacity`. acquire() blocks until a token is available."""
+
+    def __init__(self, rate: float, capacity: float = None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests: int, **kwargs):
+        """Bucket allowing `requests` per minute, with a burst of a few seconds' worth"""
+        rate = requests / 60.0
+        return cls(rate, capacity=max(1.0, rate * 5), **kwargs)
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Take `tokens`, waiting if needed. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    self.waited += waited
+                    return waited
+                delay = (tokens - self.tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
+
+
+def retry_delay(error, attempt: int, base_delay: float = 1.0, max_delay: float = 30.0) -> float:
+    """Seconds to wait before retry number `attempt` (1-based).
+
+    Honours a retry-after header on rate limit responses, otherwise
+    exponential backoff with full jitter.
+    """
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            return min(max_delay, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def call_with_retry(fn, attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                    sleep=time.sleep, on_retry=None):
+    """Call fn(), retrying RETRYABLE_ERRORS up to `attempts` calls in total.
+
+    on_retry(attempt, error, delay) is called before each wait. The last
+    error is re-raised once attempts run out; other errors propagate
+    immediately.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return fn()
+        except RETRYABLE_ERRORS as e:
+            if attempt == attempts:
+                raise
+            delay = retry_delay(e, attempt, base_delay, max_delay)
+            if on_retry:
+                on_retry(attempt, e, delay)
+            sleep(delay)
@@ -0,0 +1,169 @@
+"""
+Personal Quiz Service
+Generates a quiz adapted to each user, fanning Claude calls out concurrently
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from flask import current_app
+
+from app.extensions import db
+from app.models import Quiz, User
+from app.services.analytics import AnalyticsService
+from app.services.claude_client import TokenBucket, call_with_retry
+from app.services.quiz_generator import QuizGeneratorService
+
+
+class PersonalQuizResult:
+    """Outcome of generating one user's quiz"""
+
+    def __init__(self, user_id: int, quiz_id: int = None, seconds: float = 0.0,
+                 attempts: int = 0, error: str = None, skipped: bool = False,
+                 fallback: bool = False):
+        self.user_id = user_id
+        self.quiz_id = quiz_id
+        self.seconds = seconds
+        self.attempts = attempts
+        self.error = error
+        self.skipped = skipped
+        self.fallback = fallback  # assembled from the question bank
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class PersonalQuizService:
+    """Generate one personal quiz per user for a date.
+
+    Analytics for all users are loaded in one batch and prompts built on
+    the calling thread. The Claude calls run on a bounded thread pool that
+    shares one pooled client and one token bucket (CLAUDE_REQUESTS_PER_MINUTE),
+    with transient failures retried with backoff (CLAUDE_MAX_ATTEMPTS).
+    Quizzes are saved on the calling thread as calls complete; users whose
+    calls still fail get one assembled from the question bank.
+    """
+
+    def __init__(self, max_workers: int = None, generator: QuizGeneratorService = None,
+                 limiter: TokenBucket = None, attempts: int = None, sleep=time.sleep):
+        config = current_app.config
+        self.max_workers = max_workers or config.get('PERSONAL_QUIZ_WORKERS', 8)
+        self.generator = generator or QuizGeneratorService()
+        self.limiter = limiter or TokenBucket.per_minute(config.get('CLAUDE_REQUESTS_PER_MINUTE', 50))
+        self.attempts = attempts or config.get('CLAUDE_MAX_ATTEMPTS', 3)
+        self.sleep = sleep
+
+    def generate(self, quiz_date: date = None, user_ids: list = None, status: str = 'active') -> list:
+        """Generate quizzes for `user_ids` (default: every user) on quiz_date
+        (default today). Users who already have a quiz that day are skipped.
+
+        Returns one PersonalQuizResult per user, in user order.
+        """
+        quiz_date = quiz_date or date.today()
+        if user_ids is None:
+            user_ids = [row.id for row in User.query.with_entities(User.id).order_by(User.id)]
+
+        existing = {
+            row.user_id: row.id
+            for row in Quiz.query.filter(Quiz.kind == 'daily', Quiz.quiz_date == quiz_date,
+                                         Quiz.user_id.in_(user_ids))
+            .with_entities(Quiz.user_id, Quiz.id)
+        }
+        results = {uid: PersonalQuizResult(uid, quiz_id=existing[uid], skipped=True) for uid in existing}
+        todo = [uid for uid in user_ids if uid not in existing]
+
+        if todo:
+            prompts, phases = self._build_prompts(todo, quiz_date)
+            visible = self._visible_quizzes(todo)
+            app = current_app._get_current_object()
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {pool.submit(self._generate, app, prompts[uid], phases[uid], visible[uid]): uid
+                           for uid in todo}
+                for future in as_completed(futures):
+                    user_id = futures[future]
+                    results[user_id] = self._save(user_id, quiz_date, status, *future.result())
+
+        return [results[uid] for uid in user_ids]
+
+    def _build_prompts(self, user_ids: list, quiz_date: date):
+        """Prompts by user, and the seconds each user's prompt spent in the
+        analytics and prompt phases (with an even share of the batched
+        summaries), for their telemetry"""
+        started = time.monotonic()
+        summaries = AnalyticsService.get_all_performance_summaries(user_ids=user_ids)
+        batch_share = (time.monotonic() - started) / len(user_ids)
+        prompts, phases = {}, {}
+        for user_id in user_ids:
+            started = time.monotonic()
+            analytics = self.generator.get_analytics(user_id, summary=summaries[user_id])
+            built = time.monotonic()
+            recent_topics = self.generator.get_recent_topics(user_id)
+            prompts[user_id] = self.generator._build_prompt(analytics, recent_topics, quiz_date=quiz_date)
+            phases[user_id] = {'analytics': batch_share + built - started, 'prompt': time.monotonic() - built}
+        return prompts, phases
+
+    def _visible_quizzes(self, user_ids: list) -> dict:
+        """Ids of the daily quizzes each user can see (the shared ones and
+        their own), whose topics their new quiz should not repeat"""
+        shared = {row.id for row in Quiz.query.filter(Quiz.kind == 'daily', Quiz.user_id.is_(None))
+                  .with_entities(Quiz.id)}
+        visible = {user_id: set(shared) for user_id in user_ids}
+        for row in Quiz.query.filter(Quiz.kind == 'daily', Quiz.user_id.in_(user_ids)) \
+                .with_entities(Quiz.user_id, Quiz.id):
+            visible[row.user_id].add(row.id)
+        return visible
+
+    def _generate(self, app, prompt: str, phases: dict = None, visible: set = None):
+        """Worker: rate-limited Claude call with retries, regenerated if the
+        passage repeats the topic of a quiz in `visible`.
+
+        Returns (quiz_data, prompt, seconds, attempts, error, timer).
+        """
+        started = time.monotonic()
+        attempts = 0
+        with app.app_context():
+            generator = QuizGeneratorService(client=self.generator.client)
+            generator.sync_topics = False
+            timer = generator.start_timer('personal')
+            timer.add_phases(phases or {})
+
+            def call(prompt):
+                nonlocal attempts
+                attempts += 1
+                self.limiter.acquire()
+                return generator._call_claude_validated(prompt)
+
+            def on_retry(attempt, error, delay):
+                timer.retries += 1
+                current_app.logger.warning(f"Personal quiz call failed ({error}), retry {attempt} in {delay:.1f}s")
+
+            def request(prompt):
+                return call_with_retry(lambda: call(prompt), attempts=self.attempts, sleep=self.sleep,
+                                       on_retry=on_retry)
+
+            try:
+                quiz_data, prompt = generator._call_claude_unique(prompt, request=request, among=visible)
+                return quiz_data, prompt, time.monotonic() - started, attempts, None, timer
+            except Exception as e:
+                current_app.logger.error(f"Personal quiz generation failed: {e}")
+                return None, prompt, time.monotonic() - started, attempts, str(e), timer
+
+    def _save(self, user_id, quiz_date, status, quiz_data, prompt, seconds, attempts, error, timer):
+        result = PersonalQuizResult(user_id, seconds=seconds, attempts=attempts, error=error)
+        timer.user_id = user_id
+        if quiz_data is None:
+            quiz = self.generator.fallback_quiz(quiz_date, error=error, user_id=user_id)
+            if quiz is not None:
+                result.quiz_id, result.error, result.fallback = quiz.id, None, True
+                timer.outcome = 'fallback'
+            timer.record(quiz_id=result.quiz_id, error=result.error)
+            return result
+        try:
+            with timer.phase('save'):
+                quiz = self.generator._save_quiz(quiz_date, quiz_data, prompt, status=status, user_id=user_id)
+            result.quiz_id = quiz.id
+        except Exception as e:
+            db.session.rollback()
+            result.error = f"save failed: {e}"
+        timer.record(quiz_id=result.quiz_id, error=result.error)
+        return result
@@ -0,0 +1,143 @@
+"""
+Pregeneration Service
+Generates quizzes for upcoming dates ahead of time, concurrently
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from flask import current_app
+
+from app.extensions import db
+from app.models import Quiz
+from app.services.quiz_generator import QuizGeneratorService
+from app.services.topic_index import DuplicateTopicError
+
+
+class PregenerationResult:
+    """Outcome of generating one date's quiz"""
+
+    def __init__(self, quiz_date: date, quiz_id: int = None, seconds: float = 0.0,
+                 error: str = None, skipped: bool = False):
+        self.quiz_date = quiz_date
+        self.quiz_id = quiz_id
+        self.seconds = seconds
+        self.error = error
+        self.skipped = skipped
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class PregenerationService:
+    """Generate quizzes for the next N dates and store them as pending.
+
+    Prompts are built and quizzes saved on the calling thread; only the
+    Claude calls run on a bounded thread pool, each in its own app context.
+    Passages repeating a stored topic are regenerated, in the workers
+    against the history and before saving against the rest of the batch.
+    """
+
+    def __init__(self, max_workers: int = 3, generator: QuizGeneratorService = None):
+        self.max_workers = max_workers
+        self.generator = generator or QuizGeneratorService()
+
+    def pregenerate(self, days: int = 3, user_id: int = None, start: date = None) -> list:
+        """Generate pending quizzes for `days` dates starting at `start`
+        (default tomorrow). Dates that already have a quiz are skipped.
+
+        Returns one PregenerationResult per date, in date order.
+        """
+        start = start or date.today() + timedelta(days=1)
+        dates = [start + timedelta(days=i) for i in range(days)]
+
+        existing = {
+            row.quiz_date: row.id
+            for row in Quiz.query.filter(Quiz.quiz_date.in_(dates), Quiz.user_id.is_(None), Quiz.kind == 'daily').with_entities(Quiz.quiz_date, Quiz.id)
+        }
+        results = {d: PregenerationResult(d, quiz_id=existing[d], skipped=True) for d in existing}
+        todo = [d for d in dates if d not in existing]
+
+        if todo:
+            # Analytics and topics are shared by the dates; each date's
+            # telemetry gets an even share of them
+            started = time.monotonic()
+            analytics = self.generator.get_analytics(user_id)
+            loaded = time.monotonic()
+            recent_topics = self.generator.get_recent_topics()
+            shared = {'analytics': (loaded - started) / len(todo), 'prompt': (time.monotonic() - loaded) / len(todo)}
+            prompts, phases = {}, {}
+            for d in todo:
+                started = time.monotonic()
+                prompts[d] = self.generator._build_prompt(analytics, recent_topics, quiz_date=d)
+                phases[d] = dict(shared, prompt=shared['prompt'] + time.monotonic() - started)
+
+            app = current_app._get_current_object()
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {d: pool.submit(self._generate, app, prompts[d], phases[d]) for d in todo}
+                for quiz_date, future in futures.items():
+                    quiz_data, prompt, seconds, error, timer = future.result()
+                    result = PregenerationResult(quiz_date, seconds=seconds, error=error)
+                    if quiz_data is not None:
+                        try:
+                            quiz_data, prompt = self._unique_in_batch(quiz_data, prompt, timer)
+                        except Exception as e:
+                            current_app.logger.error(f"Pre-generation call failed: {e}")
+                            quiz_data, result.error = None, str(e)
+                    if quiz_data is not None:
+                        try:
+                            with timer.phase('save'):
+                                quiz = self.generator._save_quiz(quiz_date, quiz_data, prompt, status='pending')
+                            result.quiz_id = quiz.id
+                        except Exception as e:
+                            db.session.rollback()
+                            result.error = f"save failed: {e}"
+                    timer.record(quiz_id=result.quiz_id, error=result.error)
+                    results[quiz_date] = result
+
+        return [results[d] for d in dates]
+
+    def _generate(self, app, prompt: str, phases: dict = None):
+        """Worker: Claude call, regenerated if the passage repeats a stored
+        topic. Returns (quiz_data, prompt, seconds, error, timer)."""
+        started = time.monotonic()
+        with app.app_context():
+            generator = QuizGeneratorService(client=self.generator.client)
+            generator.sync_topics = False
+            timer = generator.start_timer('pregenerate')
+            timer.add_phases(phases or {})
+            try:
+                quiz_data, prompt = generator._call_claude_unique(prompt)
+                return quiz_data, prompt, time.monotonic() - started, None, timer
+            except Exception as e:
+                current_app.logger.error(f"Pre-generation call failed: {e}")
+                return None, prompt, time.monotonic() - started, str(e), timer
+
+    def _unique_in_batch(self, quiz_data: dict, prompt: str, timer):
+        """Check a worker's passage again before saving it, now that the
+        topic index also holds the batch's quizzes saved so far; the dates
+        were generated concurrently and could not see each other. A
+        duplicate is regenerated here. Returns (quiz_data, prompt)."""
+        retries = current_app.config.get('TOPIC_DUPLICATE_RETRIES', 1)
+        try:
+            self.generator._check_topic(quiz_data['passage'], reject=retries > 0)
+            return quiz_data, prompt
+        except DuplicateTopicError as e:
+            current_app.logger.warning(f"Regenerating pre-generated quiz: {e}")
+            timer.retries += 1
+            self.generator.timer = timer
+            try:
+                return self.generator._call_claude_unique(prompt + self.generator._format_duplicate_topic(e))
+            finally:
+                self.generator.timer = None
+
+    def promote_due(self, today: date = None, user_id: int = None) -> list:
+        """Activate pending quizzes whose date has arrived. Returns them."""
+        today = today or date.today()
+        due = Quiz.query.filter(Quiz.status == 'pending', Quiz.quiz_date <= today) \
+            .order_by(Quiz.quiz_date).all()
+        for quiz in due:
+            # Only today's quiz is worth refreshing; past ones are just activated
+            refresh_for = (quiz.user_id or user_id) if quiz.quiz_date == today else None
+            self.generator.promote_pending(quiz, refresh_for)
+        return due
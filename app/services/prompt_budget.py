@@ -0,0 +1,74 @@
+"""
+Prompt Budget
+Local token estimates, and prompts whose optional parts are dropped to fit
+a token budget
+"""
+import math
+
+# Characters per token of English prose, for estimates made without a
+# tokenizer. Telemetry records each estimate next to the actual count.
+CHARS_PER_TOKEN = 4.0
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate input tokens of `text`"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+class PromptParts:
+    """Prompt text built from parts, some of which can be dropped.
+
+    add(text) parts are always kept. add(text, score) parts are optional:
+    under a budget they are kept highest score first while they fit.
+    frame(text, group) parts (headings, closing lines) belong to a group of
+    scored parts and are kept only if at least one of them is.
+    Without a budget, render() returns every part in order.
+    """
+
+    def __init__(self):
+        # (text, score, group, is_frame)
+        self.parts = []
+        self.dropped = 0
+
+    def add(self, text: str, score: float = None, group: str = None):
+        self.parts.append((text, score, group, False))
+
+    def frame(self, text: str, group: str):
+        self.parts.append((text, None, group, True))
+
+    def render(self, budget: int = None) -> str:
+        """The prompt, within `budget` estimated tokens if given. Required
+        parts are kept even if they alone exceed it."""
+        if not budget:
+            self.dropped = 0
+            return ''.join(text for text, *_ in self.parts)
+
+        keep = set()
+        frame_cost = {}
+        used = 0
+        for i, (text, score, group, is_frame) in enumerate(self.parts):
+            if is_frame:
+                frame_cost[group] = frame_cost.get(group, 0) + estimate_tokens(text)
+            elif score is None:
+                keep.add(i)
+                used += estimate_tokens(text)
+
+        opened = set()
+        optional = [i for i, (_, score, _, is_frame) in enumerate(self.parts)
+                    if score is not None and not is_frame]
+        for i in sorted(optional, key=lambda i: -self.parts[i][1]):
+            text, _, group, _ = self.parts[i]
+            cost = estimate_tokens(text)
+            if group is not None and group not in opened:
+                cost += frame_cost.get(group, 0)
+            if used + cost <= budget:
+                keep.add(i)
+                used += cost
+                if group is not None:
+                    opened.add(group)
+
+        self.dropped = len(optional) - len(keep & set(optional))
+        return ''.join(
+            text for i, (text, _, group, is_frame) in enumerate(self.parts)
+            if i in keep or (is_frame and group in opened)
+        )
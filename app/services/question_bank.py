@@ -0,0 +1,319 @@
+"""
+Question Bank
+In-memory index over past questions, for assembling quizzes without Claude
+"""
+import re
+import threading
+from collections import Counter
+import numpy as np
+from flask import current_app
+
+from app.extensions import db
+from app.models import Quiz, Question, Submission
+from app.models.question import CATEGORIES, DIFFICULTIES
+
+
+STOPWORDS = frozenset("""
+    about above after again against also among based because been before being below between
+    both cannot could does doing during each either following from further given have having
+    here however into itself just less more most much must neither only other over same
+    should since some such than that their theirs them then there these they this those
+    through under until upon very were what when where which while whom whose will with
+    within without would your yours passage question statement statements following correct
+    according author best option options true false answer""".split())
+
+# Most frequent passage words kept as topic keywords for its questions
+PASSAGE_KEYWORDS = 12
+
+# Scoring weights used by assemble()
+UNSEEN_WEIGHT = 4.0
+CATEGORY_WEIGHT = 2.0
+KEYWORD_WEIGHT = 1.0
+JITTER = 0.5
+
+_ID_CHUNK = 500
+
+
+def extract_keywords(text: str) -> set:
+    """Lowercase content words of four or more letters"""
+    return {w for w in re.findall(r'[a-z]{4,}', (text or '').lower()) if w not in STOPWORDS}
+
+
+def ranked_keywords(text: str, limit: int) -> list:
+    """The `limit` most frequent content words, most frequent first"""
+    words = [w for w in re.findall(r'[a-z]{4,}', (text or '').lower()) if w not in STOPWORDS]
+    return [w for w, _ in Counter(words).most_common(limit)]
+
+
+def passage_keywords(passage: str, limit: int = PASSAGE_KEYWORDS) -> set:
+    return set(ranked_keywords(passage, limit))
+
+
+def _lookup(values: list, wanted: list):
+    """Boolean table indexed by the position of each value in `values`"""
+    table = np.zeros(len(values), dtype=bool)
+    table[[values.index(v) for v in wanted]] = True
+    return table
+
+
+class QuestionBank:
+    """Index of every generated question by category, difficulty, topic
+    keywords and source passage.
+
+    Rows live in NumPy arrays so a quiz is scored and picked with a few
+    vectorized passes, even at 100k questions. sync() pulls in questions
+    added since the last call (by id), so each process stays current with
+    one cheap query. Copies of bank questions (review and fallback quizzes)
+    are not indexed again; they only count towards who has seen what.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._size = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._slots = np.empty(0, dtype=np.int32)
+        self._categories = np.empty(0, dtype=np.int8)
+        self._difficulties = np.empty(0, dtype=np.int8)
+        self._active = np.empty(0, dtype=bool)
+        self._row_of = {}
+        self._quiz_ids = []       # slot -> source quiz id
+        self._slot_of = {}        # source quiz id -> slot
+        self._slot_rows = []      # slot -> rows
+        self._copies = {}         # quiz id -> ids of bank questions it reused
+        self._postings = {}       # keyword -> rows
+        self._posting_arrays = {}  # keyword -> rows as an array, rebuilt after changes
+        self._max_question_id = 0
+
+    def __len__(self):
+        return int(self._active[:self._size].sum())
+
+    def sync(self) -> int:
+        """Index questions saved since the last sync. Returns how many."""
+        with self._lock:
+            rows = db.session.query(
+                Question.id, Question.quiz_id, Question.category, Question.difficulty,
+                Question.question_text, Question.source_question_id
+            ).filter(Question.id > self._max_question_id).order_by(Question.id).all()
+            if not rows:
+                return 0
+
+            new_quizzes = {r.quiz_id for r in rows if r.source_question_id is None} - set(self._slot_of)
+            topics = self._load_passage_keywords(new_quizzes)
+
+            added = 0
+            for r in rows:
+                self._max_question_id = r.id
+                if r.source_question_id is not None:
+                    self._copies.setdefault(r.quiz_id, []).append(r.source_question_id)
+                    continue
+                if r.category not in CATEGORIES or r.difficulty not in DIFFICULTIES:
+                    continue
+                self._append(r, topics.get(r.quiz_id, set()))
+                added += 1
+            return added
+
+    def _load_passage_keywords(self, quiz_ids) -> dict:
+        quiz_ids = list(quiz_ids)
+        topics = {}
+        for i in range(0, len(quiz_ids), _ID_CHUNK):
+            for quiz_id, passage in db.session.query(Quiz.id, Quiz.passage) \
+                    .filter(Quiz.id.in_(quiz_ids[i:i + _ID_CHUNK])):
+                topics[quiz_id] = passage_keywords(passage)
+        return topics
+
+    def _append(self, r, topic_words: set):
+        if self._size == len(self._ids):
+            self._grow(max(1024, 2 * self._size))
+
+        slot = self._slot_of.get(r.quiz_id)
+        if slot is None:
+            slot = len(self._quiz_ids)
+            self._slot_of[r.quiz_id] = slot
+            self._quiz_ids.append(r.quiz_id)
+            self._slot_rows.append([])
+
+        row = self._size
+        self._ids[row] = r.id
+        self._slots[row] = slot
+        self._categories[row] = CATEGORIES.index(r.category)
+        self._difficulties[row] = DIFFICULTIES.index(r.difficulty)
+        self._active[row] = True
+        self._row_of[r.id] = row
+        self._slot_rows[slot].append(row)
+        for word in topic_words | extract_keywords(r.question_text):
+            self._postings.setdefault(word, []).append(row)
+            self._posting_arrays.pop(word, None)
+        self._size += 1
+
+    def _grow(self, capacity: int):
+        for name in ('_ids', '_slots', '_categories', '_difficulties', '_active'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _posting(self, word: str):
+        rows = self._posting_arrays.get(word)
+        if rows is None and word in self._postings:
+            rows = self._posting_arrays[word] = np.asarray(self._postings[word])
+        return rows
+
+    def _unseen(self, user_id: int, n: int):
+        """Mask of rows the user has not been shown, through any quiz"""
+        seen_slots = np.zeros(len(self._quiz_ids), dtype=bool)
+        copied = []
+        for (quiz_id,) in db.session.query(Submission.quiz_id).filter(Submission.user_id == user_id):
+            slot = self._slot_of.get(quiz_id)
+            if slot is not None:
+                seen_slots[slot] = True
+            copied.extend(self._row_of[qid] for qid in self._copies.get(quiz_id, ()) if qid in self._row_of)
+
+        unseen = ~seen_slots[self._slots[:n]]
+        unseen[copied] = False
+        return unseen
+
+    def assemble(self, user_id: int = None, count: int = 10, categories: list = None,
+                 difficulties: list = None, keywords: str = None, max_passages: int = 3,
+                 prefer_unseen: bool = True, seed: int = None) -> list:
+        """Pick up to `count` question ids, drawn from at most `max_passages`
+        source passages.
+
+        Questions score higher when the user has not seen them, match one
+        of `categories` or share topic keywords with `keywords`; a little
+        random jitter varies the pick between calls. Only `difficulties`,
+        when given, is a hard filter. Ids come back grouped by passage.
+        """
+        self.sync()
+        rng = np.random.default_rng(seed)
+
+        with self._lock:
+            n = self._size
+            if n == 0:
+                return []
+            eligible = self._active[:n].copy()
+            if difficulties:
+                eligible &= _lookup(DIFFICULTIES, difficulties)[self._difficulties[:n]]
+            if not eligible.any():
+                return []
+
+            score = rng.random(n) * JITTER
+            if user_id and prefer_unseen:
+                score += self._unseen(user_id, n) * UNSEEN_WEIGHT
+            if categories:
+                score += _lookup(CATEGORIES, categories)[self._categories[:n]] * CATEGORY_WEIGHT
+            for word in extract_keywords(keywords):
+                rows = self._posting(word)
+                if rows is not None:
+                    score[rows] += KEYWORD_WEIGHT
+
+            # Passages whose questions score best overall, so few are needed
+            slots = self._slots[:n]
+            passage_score = np.bincount(slots[eligible], weights=score[eligible], minlength=len(self._quiz_ids))
+            top = min(max_passages, int((passage_score > 0).sum()))
+            if top == 0:
+                return []
+            best_slots = np.argpartition(-passage_score, top - 1)[:top]
+
+            candidates = np.concatenate([np.asarray(self._slot_rows[s]) for s in best_slots])
+            candidates = candidates[eligible[candidates]]
+            picked = candidates[np.argsort(-score[candidates], kind='stable')[:count]]
+
+            order = {int(s): i for i, s in enumerate(best_slots)}
+            picked = sorted(picked.tolist(), key=lambda row: (order[int(slots[row])], row))
+            return [int(self._ids[row]) for row in picked]
+
+    def deactivate(self, question_ids):
+        """Stop offering questions that no longer exist"""
+        with self._lock:
+            for qid in question_ids:
+                row = self._row_of.get(qid)
+                if row is not None:
+                    self._active[row] = False
+
+    def create_quiz(self, quiz_date, user_id: int = None, kind: str = 'review',
+                    count: int = 10, **kwargs):
+        """Assemble a quiz from the bank and save it, or None if the bank
+        cannot fill `count` questions.
+
+        The questions are copied (with source_question_id set) so answers
+        and results work as for any quiz. With several source passages, the
+        passage shows each one under a heading and questions name theirs.
+        """
+        for _ in range(2):
+            ids = self.assemble(user_id=user_id, count=count, **kwargs)
+            if len(ids) < count:
+                return None
+            questions = {q.id: q for q in Question.query.filter(Question.id.in_(ids))}
+            missing = [qid for qid in ids if qid not in questions]
+            if not missing:
+                break
+            # Deleted since indexing (e.g. refreshed questions); pick again
+            self.deactivate(missing)
+        else:
+            return None
+
+        ordered = [questions[qid] for qid in ids]
+        source_quiz_ids = list(dict.fromkeys(q.quiz_id for q in ordered))
+        passages = dict(db.session.query(Quiz.id, Quiz.passage).filter(Quiz.id.in_(source_quiz_ids)))
+
+        if len(source_quiz_ids) == 1:
+            passage = passages[source_quiz_ids[0]]
+        else:
+            passage = '\n'.join(
+                f"<h3>Passage {i}</h3>\n<p>{passages[quiz_id]}</p>"
+                for i, quiz_id in enumerate(source_quiz_ids, 1)
+            )
+
+        quiz = Quiz(quiz_date=quiz_date, user_id=user_id, kind=kind, passage=passage,
+                    generation_prompt=f"Assembled from question bank: {', '.join(map(str, ids))}")
+        db.session.add(quiz)
+        db.session.flush()
+
+        for number, source in enumerate(ordered, 1):
+            text = source.question_text
+            if len(source_quiz_ids) > 1:
+                text = f"(Passage {source_quiz_ids.index(source.quiz_id) + 1}) {text}"
+            db.session.add(Question(
+                quiz_id=quiz.id,
+                question_number=number,
+                question_text=text,
+                option_a=source.option_a,
+                option_b=source.option_b,
+                option_c=source.option_c,
+                option_d=source.option_d,
+                correct_answer=source.correct_answer,
+                explanation=source.explanation,
+                category=source.category,
+                difficulty=source.difficulty,
+                source_question_id=source.id
+            ))
+
+        db.session.commit()
+        return quiz
+
+    def stats(self) -> dict:
+        return {
+            'questions': len(self),
+            'passages': len(self._quiz_ids),
+            'keywords': len(self._postings),
+            'max_question_id': self._max_question_id
+        }
+
+
+def get_question_bank() -> QuestionBank:
+    """This app's question bank, created (empty) on first use.
+
+    Kept in app.extensions like the analytics summary cache; it loads
+    itself on the first assemble().
+    """
+    bank = current_app.extensions.get('question_bank')
+    if bank is None:
+        bank = current_app.extensions.setdefault('question_bank', QuestionBank())
+    return bank
+
+
+def refresh_question_bank():
+    """Index newly saved questions, if this process has a bank loaded"""
+    bank = current_app.extensions.get('question_bank')
+    if bank is not None:
+        bank.sync()
@@ -0,0 +1,263 @@
+"""
+Quiz Archive
+Streams quizzes, with their questions and optionally submissions, to and
+from JSONL for moving data between instances and seeding test databases
+"""
+import json
+import time
+from datetime import date, datetime
+from sqlalchemy import insert
+
+from app.extensions import db
+from app.models import User, Quiz, Question, Submission, Answer
+
+# Quizzes read or written per batch; memory use is bounded by this, not by
+# the size of the archive
+BATCH_SIZE = 500
+
+USER_FIELDS = ('google_id', 'email', 'name', 'phone_number', 'created_at', 'last_login')
+QUIZ_FIELDS = ('quiz_date', 'kind', 'passage', 'generated_at', 'generation_prompt', 'status',
+               'notification_sent')
+QUESTION_FIELDS = ('question_number', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d',
+                   'correct_answer', 'explanation', 'category', 'difficulty')
+SUBMISSION_FIELDS = ('started_at', 'submitted_at', 'total_time_seconds', 'score', 'completed')
+ANSWER_FIELDS = ('selected_answer', 'is_correct', 'time_spent_seconds')
+
+DATE_FIELDS = {'quiz_date'}
+DATETIME_FIELDS = {'created_at', 'last_login', 'generated_at', 'started_at', 'submitted_at'}
+
+
+def _dump(row, fields) -> dict:
+    data = {}
+    for name in fields:
+        value = getattr(row, name)
+        data[name] = value.isoformat() if isinstance(value, (date, datetime)) else value
+    return data
+
+
+def _load(data: dict, fields) -> dict:
+    row = {}
+    for name in fields:
+        value = data.get(name)
+        if value is not None and name in DATE_FIELDS:
+            value = date.fromisoformat(value)
+        elif value is not None and name in DATETIME_FIELDS:
+            value = datetime.fromisoformat(value)
+        row[name] = value
+    return row
+
+
+class ArchiveStats:
+    """Rows moved by an export or import, and how long it took"""
+
+    def __init__(self):
+        self.counts = {'users': 0, 'quizzes': 0, 'questions': 0, 'submissions': 0, 'answers': 0}
+        self.skipped = 0
+        self.started = time.monotonic()
+        self.seconds = 0.0
+
+    def finish(self):
+        self.seconds = time.monotonic() - self.started
+        return self
+
+    @property
+    def rows(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        counts = ', '.join(f"{n} {name}" for name, n in self.counts.items())
+        skipped = f", skipped {self.skipped} existing quizzes" if self.skipped else ''
+        return f"{counts}{skipped} in {self.seconds:.2f}s ({self.rows_per_second:,.0f} rows/s)"
+
+
+class QuizArchiveService:
+    """Export and import quizzes as JSON lines.
+
+    The file starts with one {"type": "user"} line per user it refers to,
+    then one {"type": "quiz"} line per quiz holding its questions and,
+    with submissions, its submissions and their answers. Users are matched
+    by email on import; questions by number within their quiz. Copies of
+    question bank questions are imported as ordinary questions.
+    """
+
+    def __init__(self, batch_size: int = BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def export(self, out, submissions: bool = False, since: date = None) -> ArchiveStats:
+        """Write quizzes (from `since`, oldest first) to the text stream `out`"""
+        stats = ArchiveStats()
+
+        emails = {}
+        user_ids = db.session.query(Quiz.user_id).filter(Quiz.user_id.isnot(None))
+        if submissions:
+            user_ids = user_ids.union(db.session.query(Submission.user_id))
+        wanted = {row[0] for row in user_ids}
+        for user in User.query.filter(User.id.in_(wanted)).order_by(User.id) if wanted else []:
+            emails[user.id] = user.email
+            out.write(json.dumps({'type': 'user', **_dump(user, USER_FIELDS)}) + '\n')
+            stats.counts['users'] += 1
+
+        last_id = 0
+        while True:
+            query = Quiz.query.filter(Quiz.id > last_id)
+            if since:
+                query = query.filter(Quiz.quiz_date >= since)
+            quizzes = query.order_by(Quiz.id).limit(self.batch_size).all()
+            if not quizzes:
+                break
+            last_id = quizzes[-1].id
+            ids = [q.id for q in quizzes]
+
+            questions = {}
+            numbers = {}
+            for q in Question.query.filter(Question.quiz_id.in_(ids)).order_by(Question.quiz_id, Question.question_number):
+                questions.setdefault(q.quiz_id, []).append(_dump(q, QUESTION_FIELDS))
+                numbers[q.id] = q.question_number
+
+            taken = {}
+            if submissions:
+                subs = Submission.query.filter(Submission.quiz_id.in_(ids)).order_by(Submission.id).all()
+                answers = {}
+                if subs:
+                    for a in Answer.query.filter(Answer.submission_id.in_([s.id for s in subs])).order_by(Answer.id):
+                        answers.setdefault(a.submission_id, []).append(
+                            {'question_number': numbers.get(a.question_id), **_dump(a, ANSWER_FIELDS)}
+                        )
+                for s in subs:
+                    taken.setdefault(s.quiz_id, []).append({
+                        'user_email': emails.get(s.user_id),
+                        **_dump(s, SUBMISSION_FIELDS),
+                        'answers': answers.get(s.id, [])
+                    })
+                    stats.counts['submissions'] += 1
+                    stats.counts['answers'] += len(answers.get(s.id, []))
+
+            for quiz in quizzes:
+                line = {
+                    'type': 'quiz',
+                    'user_email': emails.get(quiz.user_id),
+                    **_dump(quiz, QUIZ_FIELDS),
+                    'questions': questions.get(quiz.id, [])
+                }
+                if submissions:
+                    line['submissions'] = taken.get(quiz.id, [])
+                out.write(json.dumps(line) + '\n')
+                stats.counts['quizzes'] += 1
+                stats.counts['questions'] += len(line['questions'])
+
+            # Objects of finished batches are not needed again
+            db.session.expunge_all()
+
+        return stats.finish()
+
+    def import_(self, lines) -> ArchiveStats:
+        """Read an archive from an iterable of lines (e.g. an open file).
+
+        Rows go in with multi-row INSERTs, one set per batch of quizzes,
+        and each batch is committed. Daily quizzes whose date (and owner)
+        already has a quiz are skipped, so an import can be rerun.
+        """
+        stats = ArchiveStats()
+        user_ids = {email: uid for uid, email in db.session.query(User.id, User.email)}
+        batch = []
+
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get('type') == 'user':
+                if record['email'] not in user_ids:
+                    result = db.session.execute(insert(User).values(**_load(record, USER_FIELDS)))
+                    user_ids[record['email']] = result.inserted_primary_key[0]
+                    stats.counts['users'] += 1
+            elif record.get('type') == 'quiz':
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    self._import_batch(batch, user_ids, stats)
+                    batch = []
+
+        if batch:
+            self._import_batch(batch, user_ids, stats)
+        db.session.commit()
+        return stats.finish()
+
+    def _import_batch(self, records: list, user_ids: dict, stats: ArchiveStats):
+        for record in records:
+            record['user_id'] = user_ids.get(record.get('user_email'))
+
+        # Skip daily quizzes that would collide with an existing one
+        dates = {date.fromisoformat(r['quiz_date']) for r in records}
+        taken = {
+            (quiz_date, user_id)
+            for quiz_date, user_id in db.session.query(Quiz.quiz_date, Quiz.user_id)
+            .filter(Quiz.kind == 'daily', Quiz.quiz_date.in_(dates))
+        }
+        fresh = []
+        for record in records:
+            key = (date.fromisoformat(record['quiz_date']), record['user_id'])
+            if record.get('kind', 'daily') == 'daily':
+                if key in taken:
+                    stats.skipped += 1
+                    continue
+                taken.add(key)
+            fresh.append(record)
+        if not fresh:
+            return
+
+        quiz_ids = db.session.scalars(
+            insert(Quiz).returning(Quiz.id, sort_by_parameter_order=True),
+            [{'user_id': r['user_id'], **_load(r, QUIZ_FIELDS), 'kind': r.get('kind') or 'daily'} for r in fresh]
+        ).all()
+
+        question_rows = [
+            {'quiz_id': quiz_id, **_load(q, QUESTION_FIELDS)}
+            for quiz_id, r in zip(quiz_ids, fresh) for q in r['questions']
+        ]
+        question_ids = {}
+        if question_rows:
+            inserted = db.session.execute(
+                insert(Question).returning(Question.id, sort_by_parameter_order=True), question_rows
+            ).scalars().all()
+            question_ids = {(row['quiz_id'], row['question_number']): qid
+                            for row, qid in zip(question_rows, inserted)}
+
+        submissions = [
+            (quiz_id, s) for quiz_id, r in zip(quiz_ids, fresh)
+            for s in r.get('submissions', []) if s.get('user_email') in user_ids
+        ]
+        answer_rows = []
+        if submissions:
+            submission_ids = db.session.scalars(
+                insert(Submission).returning(Submission.id, sort_by_parameter_order=True),
+                [{'quiz_id': quiz_id, 'user_id': user_ids[s['user_email']], **_load(s, SUBMISSION_FIELDS),
+                  **self._tally(quiz_id, s.get('answers', []), question_ids)}
+                 for quiz_id, s in submissions]
+            ).all()
+            for submission_id, (quiz_id, s) in zip(submission_ids, submissions):
+                for a in s.get('answers', []):
+                    question_id = question_ids.get((quiz_id, a.get('question_number')))
+                    if question_id is not None:
+                        answer_rows.append({'submission_id': submission_id, 'question_id': question_id,
+                                            **_load(a, ANSWER_FIELDS)})
+            if answer_rows:
+                db.session.execute(insert(Answer), answer_rows)
+
+        db.session.commit()
+        stats.counts['quizzes'] += len(fresh)
+        stats.counts['questions'] += len(question_rows)
+        stats.counts['submissions'] += len(submissions)
+        stats.counts['answers'] += len(answer_rows)
+
+    def _tally(self, quiz_id: int, answers: list, question_ids: dict) -> dict:
+        """Running tally columns of an imported submission, from the
+        answers that will be imported with it"""
+        kept = [a for a in answers if (quiz_id, a.get('question_number')) in question_ids]
+        return {
+            'correct_count': sum(1 for a in kept if a.get('is_correct')),
+            'answered_count': sum(1 for a in kept if a.get('selected_answer') is not None)
+        }
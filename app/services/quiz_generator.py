@@ -3,64 +3,39 @@ Quiz Generator Service
 Uses Claude API to generate adaptive quizzes based on performance analytics
 """
 import json
-import anthropic
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import date
 from flask import current_app
 
 from app.extensions import db
-from app.models import Quiz, Question, User
-from app.models.question import CATEGORIES
+from app.models import Quiz, Question, Submission, User
+from app.models.question import CATEGORIES, DIFFICULTIES
 from app.services.analytics import AnalyticsService
+from app.services.answer_keys import get_answer_keys
+from app.services.claude_client import get_anthropic_client
+from app.services.question_bank import get_question_bank, refresh_question_bank
+from app.services.results import get_results_cache
+from app.services.skill_estimator import SkillEstimator
+from app.services.quiz_stream import IncrementalQuizParser, salvage_quiz
+from app.services.quiz_validation import (
+    QUESTION_COUNT, passage_errors, question_errors, validate_questions
+)
+from app.services.topic_index import DuplicateTopicError, get_topic_index, refresh_topic_index
+from app.services.prompt_budget import PromptParts, estimate_tokens
+from app.services.response_cache import get_response_cache
+from app.services.telemetry import GenerationTimer
 
 
-class QuizGeneratorService:
-    """Generate adaptive CLAT quizzes using Claude API"""
-
-    def __init__(self):
-        api_key = current_app.config['ANTHROPIC_API_KEY']
-        if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY not configured")
-        self.client = anthropic.Anthropic(api_key=api_key)
-
-    def generate_daily_quiz(self, user_id: int = None) -> Quiz:
-        """Generate quiz for today based on user's performance"""
-        today = date.today()
-
-        # Check if quiz already exists for today
-        existing = Quiz.query.filter_by(quiz_date=today).first()
-        if existing:
-            return existing
-
-        # Get analytics if user provided
-        analytics = None
-        if user_id:
-            user = User.query.get(user_id)
-            if user:
-                analytics_service = AnalyticsService(user_id)
-                analytics = analytics_service.get_performance_summary()
-
-        # Get recent topics to avoid repetition
-        recent_quizzes = Quiz.query.order_by(Quiz.quiz_date.desc()).limit(7).all()
-        recent_topics = [q.passage[:150] for q in recent_quizzes if q.passage]
-
-        # Build and execute prompt
-        prompt = self._build_prompt(analytics, recent_topics)
-        quiz_data = self._call_claude(prompt)
-
-        # Create quiz and questions
-        quiz = self._save_quiz(today, quiz_data, prompt)
-
-        return quiz
-
-    def _build_prompt(self, analytics: dict = None, recent_topics: list = None) -> str:
-        """Build adaptive prompt based on performance analytics"""
-        today = date.today()
-        day_name = today.strftime('%A')
-
-        # Base prompt
-        prompt = f"""You are a CLAT (Common Law Admission Test) exam preparation expert. Generate a quiz with a single reading comprehension passage followed by 10 multiple-choice questions.
-
-## Today's Date: {today.isoformat()} ({day_name})
+# Prompt text that is identical for every generation. It is sent first and
+# marked for prompt caching, so repeated generations only pay full price for
+# the dynamic part. Keep it free of dates, user data and anything else that
+# varies, or the cache will miss. Caching only applies once the prefix
+# reaches the model's minimum cacheable length, so it must stay above
+# MIN_CACHEABLE_TOKENS.
+MIN_CACHEABLE_TOKENS = 1024
+STATIC_PROMPT = """You are a CLAT (Common Law Admission Test) exam preparation expert. Generate a quiz with a single reading comprehension passage followed by 10 multiple-choice questions.
 
 ## CLAT Exam Context
 CLAT tests:
@@ -83,49 +58,37 @@ CLAT tests:
 9. Each question should have 4 options (A, B, C, D)
 10. Provide detailed explanations for each answer
 
-## Question Distribution
-"""
-
-        if analytics and analytics.get('weak_areas'):
-            weak_areas = analytics['weak_areas']
-            weak_categories = [w['category'] for w in weak_areas[:3]]
-
-            prompt += f"""
-Based on the student's performance data:
-- Weak areas (needs more practice): {', '.join(weak_categories)}
-- Focus 6 questions on weak areas
-- Include 4 questions from other categories for balanced practice
-
-Student Performance Summary:
-"""
-            for category, stats in analytics.get('category_performance', {}).items():
-                if stats['total'] > 0:
-                    prompt += f"- {category}: {stats['accuracy']}% accuracy ({stats['total']} questions)\n"
-
-            if analytics.get('time_struggles'):
-                prompt += "\nTime management issues in: "
-                prompt += ', '.join([t['category'] for t in analytics['time_struggles']])
-                prompt += "\nInclude some straightforward questions in these areas to build confidence.\n"
-
-            if analytics.get('recent_trends', {}).get('trend') == 'declining':
-                prompt += "\nRecent performance is declining - include more medium difficulty questions.\n"
-            elif analytics.get('recent_trends', {}).get('trend') == 'improving':
-                prompt += "\nStudent is improving - can include some challenging questions.\n"
-
-        else:
-            # No analytics - balanced distribution
-            prompt += """
-- Distribute questions evenly across categories
-- Mix of easy (3), medium (5), and hard (2) difficulty
-- This is the first quiz or no performance data available
-"""
-
-        prompt += """
 ## Difficulty Guidelines
 - Easy: Direct comprehension, simple recall
 - Medium: Requires inference, application of concepts
 - Hard: Complex reasoning, multiple steps, nuanced understanding
 
+## Writing Questions by Category
+- Constitutional Law: test the articles, doctrines and landmark judgments the passage discusses; ask how a principle applies to a new situation rather than which article number it is
+- Legal Reasoning: state or draw a legal principle from the passage and give a short fact pattern; the correct option follows from applying the principle alone, even where it conflicts with general knowledge
+- Logical Reasoning: ask for assumptions, conclusions, strengthening or weakening statements, and flaws in the arguments the passage makes
+- English Comprehension: ask about the main idea, the author's tone and purpose, inferences, and the meaning of words or phrases in context
+- Current Affairs & Legal GK: connect the passage to the institutions, reports, treaties and developments it names; avoid facts that change often or cannot be checked
+- Quantitative Techniques: base calculations on figures given in or derived from the passage (percentages, ratios, averages, simple data interpretation); the numbers must work out exactly
+
+## Writing Options
+- All four options should be plausible, similar in length and grammatically consistent with the question
+- Exactly one option is correct; avoid "all of the above" and "none of the above"
+- Wrong options should reflect common mistakes: misreading the passage, applying the wrong rule, or an arithmetic slip
+- Vary the position of the correct answer across the quiz
+
+## Writing Explanations
+- Explain why the correct option is right, citing the part of the passage or the principle it relies on
+- Say briefly why each tempting wrong option fails
+- For calculations, show the working step by step
+
+## Quality Checklist
+Before answering, check that:
+- Every question can be answered from the passage and the principles it states
+- No two questions test the same point
+- The letter in "correct" matches the option the explanation defends
+- The JSON is complete and valid, with no text outside it
+
 ## Output Format
 Return ONLY valid JSON in this exact format:
 ```json
@@ -150,39 +113,512 @@ Return ONLY valid JSON in this exact format:
 }
 ```
 
-"""
-
-        # Add recent topics to avoid
-        if recent_topics:
-            prompt += "\n## Topics to AVOID (used in recent quizzes):\n"
-            for i, topic in enumerate(recent_topics, 1):
-                prompt += f"{i}. {topic}...\n"
-            prompt += "\nChoose a completely different topic from those listed above.\n"
-
-        prompt += """
-Generate the quiz now. Remember:
+## Reminders
 - Passage must be engaging and legally relevant
 - Questions should test understanding, not just memory
 - Explanations should be educational
 - Categories must be from: Constitutional Law, Legal Reasoning, Logical Reasoning, English Comprehension, Current Affairs & Legal GK, Quantitative Techniques
 - Difficulty must be: easy, medium, or hard
+
+The date, question distribution for this student and topics to avoid follow.
 """
 
+# Categories each weekday focuses on, as in STATIC_PROMPT (Saturday: none)
+DAY_FOCUS = {
+    'Monday': ['Legal Reasoning', 'Constitutional Law'],
+    'Tuesday': ['English Comprehension', 'Current Affairs & Legal GK'],
+    'Wednesday': ['Legal Reasoning', 'Constitutional Law'],
+    'Thursday': ['English Comprehension', 'Current Affairs & Legal GK'],
+    'Friday': ['Quantitative Techniques', 'Logical Reasoning'],
+    'Sunday': ['Quantitative Techniques', 'Logical Reasoning'],
+}
+# Questions given to the focus categories (weak areas or the day's focus)
+FOCUS_QUESTIONS = 6
+
+
+class QuizGeneratorService:
+    """Generate adaptive CLAT quizzes using Claude API"""
+
+    MODEL = "claude-sonnet-4-20250514"
+    MAX_TOKENS = 4096
+    # Output budget per question in a repair or shard request
+    REPAIR_TOKENS_PER_QUESTION = 500
+    # Output budget of the passage-only request of sharded generation
+    PASSAGE_MAX_TOKENS = 1024
+
+    def __init__(self, client=None):
+        self.client = client or get_anthropic_client()
+        self.prompt_caching = current_app.config.get('PROMPT_CACHING', True)
+        self.timeout = current_app.config.get('CLAUDE_TIMEOUT_SECONDS')
+        # Token usage of the most recent API call, see _record_usage
+        self.last_usage = None
+        # Most recent question repair, and totals saved versus full retries
+        self.last_repair = None
+        self.repair_totals = {'repairs': 0, 'questions': 0, 'saved_tokens': 0, 'saved_seconds': 0.0}
+        # Telemetry of the generation in progress, if any (see start_timer)
+        self.timer = None
+        # Whether topic checks pull new passages into the index first.
+        # Worker threads turn this off: they must not use the database, and
+        # the calling thread syncs the index before and as it saves.
+        self.sync_topics = True
+
+    def start_timer(self, kind: str, user_id: int = None) -> GenerationTimer:
+        """Collect telemetry for the next generation on this service"""
+        self.timer = GenerationTimer(kind, user_id=user_id, model=self.MODEL)
+        return self.timer
+
+    def record_timer(self, quiz_id: int = None, error: str = None):
+        """Write the collected telemetry and stop collecting"""
+        if self.timer is not None:
+            self.timer.record(quiz_id=quiz_id, error=error)
+            self.timer = None
+
+    def _phase(self, name: str):
+        return self.timer.phase(name) if self.timer is not None else nullcontext()
+
+    def generate_daily_quiz(self, user_id: int = None, stream: bool = None, shards: int = None,
+                            quiz_date: date = None) -> Quiz:
+        """Generate the shared quiz for quiz_date (default: today) based on
+        user's performance.
+
+        With stream (default: QUIZ_GENERATION_STREAMING), the response is
+        parsed while it arrives and each question is persisted as soon as
+        it is complete. With shards > 1 (default: QUIZ_GENERATION_SHARDS),
+        the questions are generated concurrently after the passage instead,
+        see _call_claude_sharded; this takes precedence over streaming.
+        Each generation writes a GenerationTelemetry row.
+        """
+        today = quiz_date or date.today()
+        if stream is None:
+            stream = current_app.config.get('QUIZ_GENERATION_STREAMING', False)
+        if shards is None:
+            shards = current_app.config.get('QUIZ_GENERATION_SHARDS', 1)
+
+        # Check if the shared quiz already exists for today (possibly pre-generated)
+        existing = Quiz.query.filter_by(quiz_date=today, user_id=None, kind='daily').first()
+        if existing:
+            if existing.status == 'pending':
+                self.promote_pending(existing, user_id)
+            return existing
+
+        self.start_timer('daily', user_id)
+        try:
+            quiz = self._generate_daily(today, user_id, stream, shards)
+        except Exception as e:
+            db.session.rollback()
+            self.record_timer(error=str(e))
+            raise
+        self.record_timer(quiz.id)
+        return quiz
+
+    def _generate_daily(self, today: date, user_id: int, stream: bool, shards: int) -> Quiz:
+        with self._phase('analytics'):
+            analytics = self.get_analytics(user_id)
+        with self._phase('prompt'):
+            recent_topics = self.get_recent_topics()
+            prompt = self._build_prompt(analytics, recent_topics, quiz_date=today)
+
+        # Execute the prompt, regenerating passages that repeat a stored
+        # topic up to TOPIC_DUPLICATE_RETRIES times
+        retries = current_app.config.get('TOPIC_DUPLICATE_RETRIES', 1)
+        for attempt in range(retries + 1):
+            check_topic = attempt < retries
+            try:
+                if shards > 1:
+                    quiz_data = self._call_claude_sharded(prompt, analytics, shards,
+                                                          quiz_date=today, check_topic=check_topic)
+                    break
+                if stream:
+                    return self._generate_streaming(today, prompt, check_topic=check_topic)
+                quiz_data = self._call_claude_validated(prompt)
+                self._check_topic(quiz_data.get('passage'), check_topic)
+                break
+            except DuplicateTopicError as e:
+                current_app.logger.warning(f"Regenerating: {e}")
+                prompt += self._format_duplicate_topic(e)
+                if self.timer is not None:
+                    self.timer.retries += 1
+            except Exception as e:
+                quiz = self.fallback_quiz(today, analytics, e)
+                if quiz is None:
+                    raise
+                return quiz
+
+        # Create quiz and questions
+        quiz = self._save_quiz(today, quiz_data, prompt)
+
+        return quiz
+
+    def _check_topic(self, passage: str, reject: bool = True, among=None):
+        """Raise DuplicateTopicError if the passage repeats a stored topic
+        (of the quizzes in `among`, if given). Without reject, a duplicate
+        is only logged."""
+        index = get_topic_index(sync=self.sync_topics)
+        if not reject:
+            match = index.find_duplicate(passage or '', among=among)
+            if match:
+                current_app.logger.warning(f"Keeping passage similar to quiz {match[0]} ({match[1]:.2f})")
+            return
+        index.check(passage or '', among=among)
+
+    def _call_claude_unique(self, prompt: str, request=None, among=None):
+        """Quiz data from request(prompt) (default: _call_claude_validated),
+        regenerating passages that repeat a stored topic up to
+        TOPIC_DUPLICATE_RETRIES times, as generate_daily_quiz does; the
+        last attempt is kept. Returns (quiz_data, the prompt that produced
+        it)."""
+        request = request or self._call_claude_validated
+        retries = current_app.config.get('TOPIC_DUPLICATE_RETRIES', 1)
+        for attempt in range(retries + 1):
+            quiz_data = request(prompt)
+            try:
+                self._check_topic(quiz_data.get('passage'), attempt < retries, among)
+                return quiz_data, prompt
+            except DuplicateTopicError as e:
+                current_app.logger.warning(f"Regenerating: {e}")
+                prompt += self._format_duplicate_topic(e)
+                if self.timer is not None:
+                    self.timer.retries += 1
+
+    def _format_duplicate_topic(self, error: DuplicateTopicError) -> str:
+        return f"""
+## Rejected Topic
+Your previous passage was too close to an earlier quiz about: {error.topic}.
+Write about a clearly different subject.
+"""
+
+    def fallback_quiz(self, quiz_date: date, analytics: dict = None, error: Exception = None,
+                      user_id: int = None) -> Quiz:
+        """Assemble the quiz from the question bank after Claude failed or
+        timed out (QUESTION_BANK_FALLBACK). Returns None if disabled or the
+        bank cannot fill a quiz."""
+        if not current_app.config.get('QUESTION_BANK_FALLBACK', True):
+            return None
+
+        weak = [w['category'] for w in (analytics or {}).get('weak_areas', [])[:3]]
+        quiz = get_question_bank().create_quiz(quiz_date, user_id=user_id, kind='daily',
+                                               categories=weak, max_passages=2)
+        if quiz is not None:
+            current_app.logger.warning(f"Claude generation failed ({error}); assembled quiz {quiz.id} from the question bank")
+            if self.timer is not None:
+                self.timer.outcome = 'fallback'
+        return quiz
+
+    def get_analytics(self, user_id: int = None, summary: dict = None) -> dict:
+        """Performance analytics used to adapt the prompt, or None.
+
+        Pass summary when the user's performance summary is already loaded
+        (e.g. from AnalyticsService.get_all_performance_summaries).
+        """
+        if summary is not None:
+            analytics = dict(summary)
+        elif not user_id or not User.query.get(user_id):
+            return None
+        else:
+            analytics = AnalyticsService(user_id).get_performance_summary()
+        if current_app.config.get('ANALYTICS_SKILL_SIGNALS', False):
+            analytics['skill_signals'] = SkillEstimator(user_id).estimate()
+        return analytics
+
+    def get_recent_topics(self, user_id: int = None) -> list:
+        """Topic words of recent quizzes (TOPIC_BLOCKLIST_SIZE), to steer
+        away from repetition. Older topics are caught by the topic index
+        after generation instead.
+
+        With user_id, the quizzes that user saw (theirs and shared ones);
+        otherwise recent shared quizzes. Pending pre-generated quizzes
+        count too, so upcoming dates do not repeat each other.
+        """
+        limit = current_app.config.get('TOPIC_BLOCKLIST_SIZE', 20)
+        quiz_ids = [row.id for row in Quiz.visible_to(user_id, include_pending=True)
+                    .with_entities(Quiz.id).limit(limit)]
+        return get_topic_index().blocklist(quiz_ids)
+
+    def pick_adaptive_user(self):
+        """User whose performance drives generation: the first authorized
+        email, falling back to the most recently active user"""
+        user = None
+        authorized_emails = current_app.config.get('AUTHORIZED_EMAILS', [])
+        if authorized_emails:
+            user = User.query.filter_by(email=authorized_emails[0]).first()
+        if not user:
+            user = User.query.order_by(User.last_login.desc()).first()
+        return user
+
+    def promote_pending(self, quiz: Quiz, user_id: int = None, refresh: bool = None) -> Quiz:
+        """Activate a pre-generated quiz on its date.
+
+        With refresh (default: PREGENERATION_REFRESH_ADAPTIVE) and a user,
+        the questions are regenerated against the stored passage from the
+        latest analytics first, and committed together with the promotion.
+        If that fails, or the quiz already has submissions, the
+        pre-generated questions are kept.
+        """
+        if refresh is None:
+            refresh = current_app.config.get('PREGENERATION_REFRESH_ADAPTIVE', False)
+
+        refreshed = False
+        if refresh and user_id:
+            try:
+                self.refresh_questions(quiz, self.get_analytics(user_id))
+                refreshed = True
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Adaptive refresh failed for {quiz.quiz_date}, keeping pre-generated questions: {e}")
+
+        quiz.status = 'active'
+        db.session.commit()
+        if refreshed:
+            get_answer_keys().invalidate(quiz.id)
+            get_results_cache().invalidate_quiz(quiz.id)
+        refresh_question_bank()
+        refresh_topic_index()
+        return quiz
+
+    def refresh_questions(self, quiz: Quiz, analytics: dict = None) -> Quiz:
+        """Replace a quiz's questions with new ones for its existing
+        passage. The replacement is flushed, not committed; the caller
+        commits it and then invalidates the answer key and results caches
+        (see promote_pending). Raises ValueError if anyone has started the
+        quiz, whose answers point at the current questions."""
+        self._check_unstarted(quiz)
+        prompt = self._build_prompt(analytics, quiz_date=quiz.quiz_date) + f"""
+## Passage
+Use exactly this passage and return it unchanged in the "passage" field; only write new questions:
+
+{quiz.passage}
+"""
+        quiz_data = self._call_claude(prompt)
+        if validate_questions(quiz_data.get('questions'))[1]:
+            raise ValueError("Refreshed questions failed validation")
+
+        # Checked again: a submission may have started during the call
+        self._check_unstarted(quiz)
+        Question.query.filter_by(quiz_id=quiz.id).delete()
+        for q in quiz_data['questions']:
+            db.session.add(self._build_question(quiz.id, q))
+        quiz.generation_prompt = prompt
+        db.session.flush()
+        return quiz
+
+    def _check_unstarted(self, quiz: Quiz):
+        if db.session.query(Submission.query.filter_by(quiz_id=quiz.id).exists()).scalar():
+            raise ValueError(f"Quiz {quiz.id} already has submissions")
+
+    def _build_prompt(self, analytics: dict = None, recent_topics: list = None,
+                      quiz_date: date = None) -> str:
+        """Build adaptive prompt based on performance analytics"""
+        return STATIC_PROMPT + self._build_dynamic_prompt(analytics, recent_topics, quiz_date)
+
+    def _build_dynamic_prompt(self, analytics: dict = None, recent_topics: list = None,
+                              quiz_date: date = None, budget: int = None) -> str:
+        """The part of the prompt that changes per day and per user.
+
+        Everything else lives in STATIC_PROMPT, which is sent as a cached
+        prefix (see _message_content). With a budget (default:
+        PROMPT_TOKEN_BUDGET), the adaptive sections are compacted to fit
+        that many estimated tokens, dropping the least informative first:
+        skill signals, then stats of categories that are not weak areas
+        (smallest samples first), recent topics (oldest first), the trend
+        and time struggles. The date, weak areas and instructions are
+        always kept.
+        """
+        if budget is None:
+            budget = current_app.config.get('PROMPT_TOKEN_BUDGET', 0)
+        quiz_date = quiz_date or date.today()
+        day_name = quiz_date.strftime('%A')
+
+        parts = PromptParts()
+        parts.add(f"""
+## Today's Date: {quiz_date.isoformat()} ({day_name})
+
+## Question Distribution
+""")
+
+        if analytics and analytics.get('weak_areas'):
+            weak_areas = analytics['weak_areas']
+            weak_categories = [w['category'] for w in weak_areas[:3]]
+
+            parts.add(f"""
+Based on the student's performance data:
+- Weak areas (needs more practice): {', '.join(weak_categories)}
+- Focus 6 questions on weak areas
+- Include 4 questions from other categories for balanced practice
+""")
+            parts.frame("\nStudent Performance Summary:\n", 'performance')
+            for category, stats in analytics.get('category_performance', {}).items():
+                if stats['total'] > 0:
+                    score = 9 if category in weak_categories else 2 + min(stats['total'], 50) / 50
+                    parts.add(f"- {category}: {stats['accuracy']}% accuracy ({stats['total']} questions)\n",
+                              score, 'performance')
+
+            if analytics.get('time_struggles'):
+                parts.add("\nTime management issues in: "
+                          + ', '.join([t['category'] for t in analytics['time_struggles']])
+                          + "\nInclude some straightforward questions in these areas to build confidence.\n", 7)
+
+            if analytics.get('recent_trends', {}).get('trend') == 'declining':
+                parts.add("\nRecent performance is declining - include more medium difficulty questions.\n", 6)
+            elif analytics.get('recent_trends', {}).get('trend') == 'improving':
+                parts.add("\nStudent is improving - can include some challenging questions.\n", 6)
+
+            if analytics.get('skill_signals', {}).get('answers'):
+                parts.add(self._format_skill_signals(analytics['skill_signals']), 1)
+
+        else:
+            # No analytics - balanced distribution
+            parts.add("""
+- Distribute questions evenly across categories
+- Mix of easy (3), medium (5), and hard (2) difficulty
+- This is the first quiz or no performance data available
+""")
+
+        # Add recent topics to avoid, most recent first
+        if recent_topics:
+            parts.frame("\n## Topics to AVOID (key terms of recent quizzes):\n", 'topics')
+            for i, topic in enumerate(recent_topics):
+                parts.add(f"- {topic}\n", 5 - i / len(recent_topics), 'topics')
+            parts.frame("\nChoose a completely different topic from those listed above.\n", 'topics')
+
+        parts.add("\nGenerate the quiz now.\n")
+
+        prompt = parts.render(budget)
+        if parts.dropped:
+            current_app.logger.info(
+                f"Compacted prompt to ~{estimate_tokens(prompt)} tokens (budget {budget}), "
+                f"dropping {parts.dropped} sections"
+            )
         return prompt
 
+    def _format_skill_signals(self, skill: dict) -> str:
+        """Render SkillEstimator signals as a compact prompt section"""
+        def pct(value):
+            return '-' if value is None else f"{value}%"
+
+        text = "\nSkill signals (accuracy over 7d / 30d / 90d, recent-weighted accuracy, avg time):\n"
+        for category in CATEGORIES:
+            recent = skill['ewma_accuracy'].get(category)
+            if recent is None:
+                continue
+            windows = ' / '.join(
+                pct(skill['window_accuracy'].get(f'{days}d', {}).get(category))
+                for days in SkillEstimator.WINDOWS
+            )
+            seconds = skill['ewma_seconds'].get(category)
+            pace = f", ~{seconds:.0f}s per question" if seconds is not None else ''
+            text += f"- {category}: {windows}, recent-weighted {pct(recent)}{pace}\n"
+
+        for difficulty, curve in skill.get('difficulty_curves', {}).items():
+            points = [p for p in curve if p is not None]
+            if len(points) >= 2:
+                text += f"- {difficulty.capitalize()} questions: {points[0]}% earlier -> {points[-1]}% lately\n"
+
+        return text
+
+    def _message_content(self, prompt: str, shared: str = None):
+        """User message content, with STATIC_PROMPT split off as a cached
+        block. `shared` is a longer prefix of the prompt that several
+        requests send (a sharded generation's prompt, see
+        _call_claude_sharded); its rest becomes a second cached block."""
+        if not self.prompt_caching or not prompt.startswith(STATIC_PROMPT):
+            return prompt
+        blocks = [{"type": "text", "text": STATIC_PROMPT, "cache_control": {"type": "ephemeral"}}]
+        start = len(STATIC_PROMPT)
+        if shared and len(shared) > start and prompt.startswith(shared):
+            blocks.append({"type": "text", "text": shared[start:], "cache_control": {"type": "ephemeral"}})
+            start = len(shared)
+        if prompt[start:]:
+            blocks.append({"type": "text", "text": prompt[start:]})
+        return blocks
+
+    def _record_usage(self, usage, prompt: str = None) -> dict:
+        """Keep and log cached versus uncached input tokens of an API call,
+        and the local estimate of the prompt's size (see estimate_tokens)"""
+        self.last_usage = {
+            'input_tokens': getattr(usage, 'input_tokens', 0) or 0,
+            'output_tokens': getattr(usage, 'output_tokens', 0) or 0,
+            'cache_creation_input_tokens': getattr(usage, 'cache_creation_input_tokens', 0) or 0,
+            'cache_read_input_tokens': getattr(usage, 'cache_read_input_tokens', 0) or 0,
+            'estimated_input_tokens': estimate_tokens(prompt) if prompt and usage is not None else 0
+        }
+        current_app.logger.info(
+            f"Claude usage: {self.last_usage['cache_read_input_tokens']} cached input tokens, "
+            f"{self.last_usage['cache_creation_input_tokens']} written to cache, "
+            f"{self.last_usage['input_tokens']} uncached "
+            f"(~{self.last_usage['estimated_input_tokens']} estimated), "
+            f"{self.last_usage['output_tokens']} output"
+        )
+        return self.last_usage
+
     def _call_claude(self, prompt: str) -> dict:
         """Call Claude API and parse response"""
-        response = self.client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=4096,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
+        try:
+            return self._parse_response(self._request(prompt))
+        except ValueError:
+            self._discard_cached(prompt)
+            raise
+
+    def _request(self, prompt: str, max_tokens: int = None, shared: str = None) -> str:
+        """Call Claude API and return the response text.
+
+        With GENERATION_CACHE_DIR set, an identical earlier request is
+        answered from the response cache at no token cost; last_usage is
+        then the usage the response cost when it was made, so comparisons
+        against it (e.g. a repair's savings) still hold. Callers discard
+        responses they cannot use (see _discard_cached).
+        """
+        max_tokens = max_tokens or self.MAX_TOKENS
+        timer = self.timer
+        cache = get_response_cache()
+        key = cache.key(self.MODEL, max_tokens, prompt) if cache else None
+        if cache:
+            entry = cache.get(key)
+            if entry is not None:
+                current_app.logger.info(f"Using cached Claude response {key[:12]}")
+                if entry.get('usage'):
+                    self.last_usage = dict(entry['usage'])
+                else:
+                    self._record_usage(None)
+                if timer is not None:
+                    timer.cached += 1
+                return entry['text']
+
+        if timer is not None:
+            timer.requests += 1
+        options = {'timeout': self.timeout} if self.timeout else {}
+        with self._phase('api'):
+            response = self.client.messages.create(
+                model=self.MODEL,
+                max_tokens=max_tokens,
+                messages=[
+                    {"role": "user", "content": self._message_content(prompt, shared)}
+                ],
+                **options
+            )
+
+        self._record_usage(response.usage, prompt)
+        if timer is not None:
+            timer.add_usage(self.last_usage)
 
         # Extract text content
-        content = response.content[0].text
+        text = response.content[0].text
+        if cache:
+            cache.put(key, text, self.last_usage)
+        return text
+
+    def _discard_cached(self, prompt: str, max_tokens: int = None):
+        """Drop a cached response that turned out unusable, so a retry
+        calls the API again"""
+        cache = get_response_cache()
+        if cache:
+            cache.delete(cache.key(self.MODEL, max_tokens or self.MAX_TOKENS, prompt))
 
+    def _parse_response(self, content: str) -> dict:
+        """Parse the JSON object in a response, with or without a code fence"""
+        with self._phase('parse'):
+            return self._parse_json(content)
+
+    def _parse_json(self, content: str) -> dict:
         # Parse JSON from response (handle markdown code blocks)
         if '```json' in content:
             json_start = content.find('```json') + 7
@@ -200,31 +636,425 @@ Generate the quiz now. Remember:
             current_app.logger.error(f"Response content: {content[:500]}")
             raise ValueError("Failed to parse quiz data from Claude response")
 
-    def _save_quiz(self, quiz_date: date, quiz_data: dict, prompt: str) -> Quiz:
-        """Save quiz and questions to database"""
-        quiz = Quiz(
-            quiz_date=quiz_date,
-            passage=quiz_data['passage'],
-            generation_prompt=prompt
-        )
-        db.session.add(quiz)
-        db.session.flush()  # Get quiz.id
+    def _call_claude_validated(self, prompt: str, count: int = QUESTION_COUNT) -> dict:
+        """Call Claude and return quiz data with exactly `count` valid questions.
 
-        for q in quiz_data['questions']:
-            question = Question(
-                quiz_id=quiz.id,
-                question_number=q['number'],
-                question_text=q['text'],
-                option_a=q['options']['A'],
-                option_b=q['options']['B'],
-                option_c=q['options']['C'],
-                option_d=q['options']['D'],
-                correct_answer=q['correct'],
-                explanation=q['explanation'],
-                category=q['category'],
-                difficulty=q['difficulty']
+        A response that is not valid JSON is salvaged up to its last
+        complete question. Invalid or missing questions are then rewritten
+        with small follow-up requests (QUIZ_REPAIR_ATTEMPTS) instead of a
+        full regeneration. Raises ValueError when the passage is unusable
+        or repair does not succeed, so callers can retry in full.
+        """
+        started = time.monotonic()
+        text = self._request(prompt)
+        full_seconds = time.monotonic() - started
+        full_tokens = self._usage_tokens()
+
+        try:
+            data = self._parse_response(text)
+        except ValueError:
+            # Salvaged responses are used once, never replayed from the cache
+            self._discard_cached(prompt)
+            data = salvage_quiz(text)
+            current_app.logger.warning(
+                f"Salvaged {len(data['questions'])} questions from a malformed response"
+            )
+
+        errors = passage_errors(data)
+        if errors:
+            self._discard_cached(prompt)
+            raise ValueError(f"Generated quiz is unusable: {'; '.join(errors)}")
+
+        valid, invalid = validate_questions(data.get('questions'), count)
+        if invalid:
+            self._discard_cached(prompt)
+            valid = self._repair_questions(data['passage'], valid, invalid, full_tokens, full_seconds)
+        return {'passage': data['passage'], 'questions': [valid[slot] for slot in sorted(valid)]}
+
+    def _repair_questions(self, passage: str, valid: dict, invalid: dict,
+                          full_tokens: int, full_seconds: float) -> dict:
+        """Rewrite the questions in `invalid` (slot -> errors) and return
+        all questions by slot. Records the cost against a full retry of
+        full_tokens and full_seconds in last_repair and repair_totals."""
+        attempts = current_app.config.get('QUIZ_REPAIR_ATTEMPTS', 2)
+        slots = sorted(invalid)
+        repaired = dict(valid)
+        tokens = 0
+        started = time.monotonic()
+
+        for _ in range(attempts):
+            current_app.logger.warning(
+                "Repairing questions " + '; '.join(f"{slot}: {', '.join(invalid[slot])}" for slot in slots)
             )
-            db.session.add(question)
+            repair_prompt = self._build_repair_prompt(passage, repaired, slots)
+            max_tokens = self.REPAIR_TOKENS_PER_QUESTION * len(slots)
+            text = self._request(repair_prompt, max_tokens=max_tokens)
+            tokens += self._usage_tokens()
+            try:
+                replacements = self._parse_response(text).get('questions')
+                usable = True
+            except ValueError:
+                replacements = salvage_quiz(text)['questions']
+                usable = False
+            if not isinstance(replacements, list):
+                replacements = []
+
+            for slot, question in zip(list(slots), replacements):
+                errors = question_errors(question)
+                if errors:
+                    invalid[slot] = errors
+                else:
+                    repaired[slot] = dict(question, number=slot)
+            slots = [slot for slot in slots if slot not in repaired]
+            if not usable or slots:
+                # An unchanged prompt must not replay the same bad answer
+                self._discard_cached(repair_prompt, max_tokens)
+            if not slots:
+                break
+
+        seconds = time.monotonic() - started
+        self.last_repair = {
+            'questions': sorted(invalid),
+            'ok': not slots,
+            'tokens': tokens,
+            'seconds': seconds,
+            'saved_tokens': full_tokens - tokens,
+            'saved_seconds': full_seconds - seconds
+        }
+        if slots:
+            raise ValueError(f"Could not repair questions {', '.join(map(str, slots))}")
+
+        if self.timer is not None:
+            self.timer.repaired += len(invalid)
+        self.repair_totals['repairs'] += 1
+        self.repair_totals['questions'] += len(invalid)
+        self.repair_totals['saved_tokens'] += self.last_repair['saved_tokens']
+        self.repair_totals['saved_seconds'] += self.last_repair['saved_seconds']
+        current_app.logger.info(
+            f"Repaired {len(invalid)} questions with {tokens} tokens in {seconds:.2f}s, "
+            f"saving ~{self.last_repair['saved_tokens']} tokens and "
+            f"{self.last_repair['saved_seconds']:.2f}s against a full retry"
+        )
+        return repaired
+
+    def _build_repair_prompt(self, passage: str, questions: dict, slots: list) -> str:
+        """Follow-up prompt asking only for the questions in `slots`"""
+        kept = '\n'.join(
+            f"{slot}. [{q['category']}, {q['difficulty']}] {q['text']}"
+            for slot, q in sorted(questions.items())
+        ) or '(none)'
+        return f"""You are a CLAT exam preparation expert. A quiz on the passage below needs {len(slots)} replacement multiple-choice question(s), numbered {', '.join(map(str, slots))}.
+
+## Passage
+{passage}
+
+## Questions Already in the Quiz (do not repeat them)
+{kept}
+
+## Requirements
+- Each question has 4 options (A, B, C, D), one correct answer and a detailed explanation
+- Categories must be from: {', '.join(CATEGORIES)}
+- Difficulty must be: {', '.join(DIFFICULTIES)}
+- Keep the quiz's mix of categories and difficulties balanced
+
+Return ONLY valid JSON: {{"questions": [{{"number": {slots[0]}, "text": "...", "options": {{"A": "...", "B": "...", "C": "...", "D": "..."}}, "correct": "A", "explanation": "...", "category": "...", "difficulty": "..."}}]}}
+"""
+
+    def _call_claude_sharded(self, prompt: str, analytics: dict = None, shards: int = 2,
+                             quiz_date: date = None, check_topic: bool = False) -> dict:
+        """Generate quiz data with the passage first and then the questions
+        in `shards` concurrent requests.
+
+        One request writing the passage and all questions is the slowest
+        step of generation; here the questions' output is split across
+        parallel requests, each told its slots' categories (see
+        _plan_questions). The shards are merged by slot, renumbered and
+        validated, and bad or missing questions repaired as in
+        _call_claude_validated. With check_topic, a passage repeating a
+        stored topic raises DuplicateTopicError before any question is
+        requested. Raises ValueError when the passage is unusable or
+        repair does not succeed. The whole prompt is marked for prompt
+        caching, so the shards read what the passage request wrote.
+        """
+        started = time.monotonic()
+        passage_prompt = self._build_passage_prompt(prompt)
+        text = self._request(passage_prompt, max_tokens=self.PASSAGE_MAX_TOKENS, shared=prompt)
+        tokens = self._usage_tokens()
+        try:
+            data = self._parse_response(text)
+        except ValueError:
+            self._discard_cached(passage_prompt, self.PASSAGE_MAX_TOKENS)
+            raise
+        errors = passage_errors(data)
+        if errors:
+            self._discard_cached(passage_prompt, self.PASSAGE_MAX_TOKENS)
+            raise ValueError(f"Generated passage is unusable: {'; '.join(errors)}")
+        passage = data['passage']
+        self._check_topic(passage, check_topic)
+
+        plan = self._plan_questions(analytics, quiz_date)
+        batches = [plan[i::shards] for i in range(shards) if plan[i::shards]]
+        app = current_app._get_current_object()
+        with self._phase('api'), ThreadPoolExecutor(max_workers=len(batches)) as pool:
+            futures = [
+                pool.submit(self._generate_shard, app, self._build_shard_prompt(prompt, passage, batch), batch, prompt)
+                for batch in batches
+            ]
+            results = [future.result() for future in futures]
+
+        questions = {}
+        for found, timer in results:
+            questions.update(found)
+            tokens += timer.api_tokens()
+            if self.timer is not None:
+                self.timer.merge(timer)
+
+        valid, invalid = validate_questions([questions.get(slot) for slot in range(1, len(plan) + 1)],
+                                            len(plan))
+        for slot in invalid:
+            if slot not in questions:
+                invalid[slot] = ['missing question']
+        current_app.logger.info(
+            f"Sharded generation: passage and {len(batches)} question shards in "
+            f"{time.monotonic() - started:.2f}s, {len(invalid)} questions to repair"
+        )
+        if invalid:
+            valid = self._repair_questions(passage, valid, invalid, tokens, time.monotonic() - started)
+        return {'passage': passage, 'questions': [valid[slot] for slot in sorted(valid)]}
+
+    def _generate_shard(self, app, prompt: str, batch: list, shared: str = None):
+        """Worker: request one shard's questions; `shared` is the prompt
+        prefix all shards send (see _message_content).
+
+        Returns (questions keyed by slot, the shard's GenerationTimer).
+        A failed or malformed response yields fewer questions, which the
+        caller repairs.
+        """
+        with app.app_context():
+            generator = QuizGeneratorService(client=self.client)
+            timer = generator.start_timer('shard')
+            try:
+                max_tokens = self.REPAIR_TOKENS_PER_QUESTION * len(batch)
+                text = generator._request(prompt, max_tokens=max_tokens, shared=shared)
+                try:
+                    questions = generator._parse_response(text).get('questions')
+                    usable = True
+                except ValueError:
+                    questions = salvage_quiz(text)['questions']
+                    usable = False
+            except Exception as e:
+                current_app.logger.warning(f"Question shard {[slot for slot, _ in batch]} failed: {e}")
+                return {}, timer
+            if not isinstance(questions, list):
+                questions = []
+            found = {slot: dict(q, number=slot)
+                     for (slot, _), q in zip(batch, questions) if isinstance(q, dict)}
+            if not usable or len(found) < len(batch) or any(question_errors(q) for q in found.values()):
+                generator._discard_cached(prompt, max_tokens)
+            return found, timer
+
+    def _plan_questions(self, analytics: dict = None, quiz_date: date = None) -> list:
+        """(slot, category) for each question of a sharded generation.
+
+        FOCUS_QUESTIONS slots go to the student's weak areas or, without
+        analytics, to the day's focus (DAY_FOCUS); the rest are spread over
+        the other categories. Saturdays without analytics are balanced.
+        """
+        quiz_date = quiz_date or date.today()
+        if analytics and analytics.get('weak_areas'):
+            focus = [w['category'] for w in analytics['weak_areas'][:3]]
+        else:
+            focus = DAY_FOCUS.get(quiz_date.strftime('%A'), [])
+        others = [c for c in CATEGORIES if c not in focus]
+
+        if focus:
+            categories = [focus[i % len(focus)] for i in range(FOCUS_QUESTIONS)]
+            categories += [others[i % len(others)] for i in range(QUESTION_COUNT - FOCUS_QUESTIONS)]
+        else:
+            categories = [CATEGORIES[i % len(CATEGORIES)] for i in range(QUESTION_COUNT)]
+        return list(enumerate(categories, start=1))
+
+    def _build_passage_prompt(self, prompt: str) -> str:
+        """Generation prompt narrowed to the passage alone"""
+        return prompt + """
+## This Request
+Write ONLY the passage now; its questions are requested separately.
+Return ONLY valid JSON: {"passage": "The comprehension passage text here..."}
+"""
+
+    def _build_shard_prompt(self, prompt: str, passage: str, batch: list) -> str:
+        """Generation prompt narrowed to the questions in `batch` on a
+        finished passage"""
+        numbers = ', '.join(str(slot) for slot, _ in batch)
+        plan = '\n'.join(f"- Question {slot}: {category}" for slot, category in batch)
+        return prompt + f"""
+## Passage
+The passage is final; the quiz's questions are written in separate batches:
+
+{passage}
+
+## This Request
+Write ONLY questions {numbers} ({len(batch)} of {QUESTION_COUNT}), in these categories:
+{plan}
+
+Return ONLY valid JSON: {{"questions": [...]}} with the question objects in the format above, numbered {numbers}.
+"""
+
+    def _usage_tokens(self) -> int:
+        """All input and output tokens of the most recent API call"""
+        usage = self.last_usage or {}
+        return sum(usage.get(key, 0) for key in (
+            'input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens'
+        ))
+
+    def _stream_claude(self, prompt: str, on_passage=None, on_question=None) -> dict:
+        """Call Claude with a streamed response, parsing it incrementally.
+
+        on_passage(passage) and on_question(question) are called as soon as
+        each part of the JSON completes, questions numbered by slot;
+        questions failing validation are logged and skipped. Returns the
+        parsed quiz data with the valid questions.
+        """
+        parser = IncrementalQuizParser()
+        started = time.monotonic()
+        first_question_at = None
+        rejected = 0
+        slot = 0
+        if self.timer is not None:
+            self.timer.requests += 1
+
+        options = {'timeout': self.timeout} if self.timeout else {}
+        with self._phase('api'), self.client.messages.stream(
+            model=self.MODEL,
+            max_tokens=self.MAX_TOKENS,
+            messages=[
+                {"role": "user", "content": self._message_content(prompt)}
+            ],
+            **options
+        ) as stream:
+            for text in stream.text_stream:
+                for kind, value in parser.feed(text):
+                    if kind == 'passage':
+                        if on_passage:
+                            on_passage(value)
+                        continue
+
+                    # Questions take their slot from their position, as in
+                    # validate_questions; extras past QUESTION_COUNT are ignored
+                    slot += 1
+                    if slot > QUESTION_COUNT:
+                        continue
+                    errors = question_errors(value)
+                    if errors:
+                        rejected += 1
+                        current_app.logger.warning(
+                            f"Skipping invalid streamed question {slot}: {'; '.join(errors)}"
+                        )
+                        continue
+                    if first_question_at is None:
+                        first_question_at = time.monotonic()
+                    if on_question:
+                        on_question(dict(value, number=slot))
+
+            self._record_usage(stream.get_final_message().usage, prompt)
+            if self.timer is not None:
+                self.timer.add_usage(self.last_usage)
+
+        total = time.monotonic() - started
+        ttfq = f"{first_question_at - started:.2f}s" if first_question_at else 'n/a'
+        current_app.logger.info(
+            f"Streamed quiz: time to first question {ttfq}, total {total:.2f}s, "
+            f"{len(parser.questions) - rejected} questions, {rejected} rejected"
+        )
+
+        if not parser.complete or parser.passage is None:
+            current_app.logger.error(f"Incomplete streamed response: {parser.text[:500]}")
+            raise ValueError("Failed to parse quiz data from Claude response")
+
+        data = parser.result()
+        valid = validate_questions(data['questions'])[0]
+        data['questions'] = [valid[slot] for slot in sorted(valid)]
+        return data
+
+    def _generate_streaming(self, quiz_date: date, prompt: str, check_topic: bool = False) -> Quiz:
+        """Generate and persist a quiz from a streamed response.
+
+        The quiz row is flushed when the passage completes and each question
+        right after it completes. Slots left empty by invalid or missing
+        questions are then filled by _repair_questions, so the quiz always
+        has QUESTION_COUNT questions. Everything is committed together at
+        the end so a broken stream or failed repair leaves nothing behind.
+        With check_topic, a passage repeating a stored topic aborts the
+        stream with DuplicateTopicError.
+        """
+        quiz = None
+        streamed = {}
+
+        def on_passage(passage):
+            nonlocal quiz
+            self._check_topic(passage, check_topic)
+            quiz = Quiz(quiz_date=quiz_date, passage=passage, generation_prompt=prompt)
+            db.session.add(quiz)
+            db.session.flush()
+
+        def on_question(q):
+            db.session.add(self._build_question(quiz.id, q))
+            db.session.flush()
+            streamed[q['number']] = q
+
+        started = time.monotonic()
+        try:
+            self._stream_claude(prompt, on_passage=on_passage, on_question=on_question)
+            invalid = {slot: ['missing or invalid question'] for slot in range(1, QUESTION_COUNT + 1)
+                       if slot not in streamed}
+            if invalid:
+                repaired = self._repair_questions(quiz.passage, dict(streamed), invalid,
+                                                  self._usage_tokens(), time.monotonic() - started)
+                for slot in sorted(set(repaired) - set(streamed)):
+                    db.session.add(self._build_question(quiz.id, repaired[slot]))
+                db.session.flush()
+        except Exception:
+            db.session.rollback()
+            raise
 
         db.session.commit()
+        refresh_question_bank()
+        refresh_topic_index()
         return quiz
+
+    def _build_question(self, quiz_id: int, q: dict) -> Question:
+        return Question(
+            quiz_id=quiz_id,
+            question_number=q['number'],
+            question_text=q['text'],
+            option_a=q['options']['A'],
+            option_b=q['options']['B'],
+            option_c=q['options']['C'],
+            option_d=q['options']['D'],
+            correct_answer=q['correct'],
+            explanation=q['explanation'],
+            category=q['category'],
+            difficulty=q['difficulty']
+        )
+
+    def _save_quiz(self, quiz_date: date, quiz_data: dict, prompt: str,
+                   status: str = 'active', user_id: int = None) -> Quiz:
+        """Save quiz and questions to database (a personal quiz with user_id)"""
+        with self._phase('save'):
+            quiz = Quiz(
+                quiz_date=quiz_date,
+                user_id=user_id,
+                passage=quiz_data['passage'],
+                generation_prompt=prompt,
+                status=status
+            )
+            db.session.add(quiz)
+            db.session.flush()  # Get quiz.id
+
+            for q in quiz_data['questions']:
+                db.session.add(self._build_question(quiz.id, q))
+
+            db.session.commit()
+            refresh_question_bank()
+            refresh_topic_index()
+            return quiz
@@ -0,0 +1,122 @@
+"""
+Quiz Stream Parser
+Incrementally parses the quiz JSON while Claude is still writing it
+"""
+import json
+
+
+class IncrementalQuizParser:
+    """Scan streamed text and emit the passage and each question as soon as
+    their JSON is complete.
+
+    Expects the output format requested by QuizGeneratorService: an object
+    with a "passage" string and a "questions" array of objects. Any text
+    before the first '{' (prose, a ```json fence) is skipped. Scanning is
+    linear in the total text; each character is looked at once.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.passage = None
+        self.questions = []
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._key = None
+        self._awaiting_value = False
+        self._value_start = None
+        self._in_questions = False
+        self._question_start = None
+        self.complete = False
+
+    def feed(self, chunk: str) -> list:
+        """Consume a chunk of text, return newly completed items as
+        ('passage', str) or ('question', dict) tuples."""
+        self.text += chunk
+        events = []
+        text = self.text
+
+        while self._pos < len(text) and not self.complete:
+            ch = text[self._pos]
+
+            if not self._started:
+                if ch == '{':
+                    self._started = True
+                    self._depth = 1
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._end_string(events)
+                self._pos += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif ch in '{[':
+                self._depth += 1
+                if self._depth == 2 and ch == '[' and self._awaiting_value and self._key == 'questions':
+                    self._in_questions = True
+                elif self._depth == 3 and ch == '{' and self._in_questions:
+                    self._question_start = self._pos
+                self._awaiting_value = False
+            elif ch in '}]':
+                if self._depth == 3 and ch == '}' and self._question_start is not None:
+                    question = json.loads(text[self._question_start:self._pos + 1])
+                    self.questions.append(question)
+                    events.append(('question', question))
+                    self._question_start = None
+                elif self._depth == 2 and ch == ']':
+                    self._in_questions = False
+                self._depth -= 1
+                if self._depth == 0:
+                    self.complete = True
+            elif ch == ':' and self._depth == 1:
+                self._key = self._last_string
+                self._awaiting_value = True
+            elif ch == ',' and self._depth == 1:
+                self._awaiting_value = False
+
+            self._pos += 1
+
+        return events
+
+    def _end_string(self, events):
+        """Handle a string that just closed at self._pos"""
+        if self._depth != 1:
+            return
+        value = json.loads(self.text[self._string_start:self._pos + 1])
+        if self._awaiting_value:
+            self._awaiting_value = False
+            if self._key == 'passage':
+                self.passage = value
+                events.append(('passage', value))
+        else:
+            self._last_string = value
+
+    def result(self) -> dict:
+        """The quiz data seen so far, in the same shape as _call_claude returns"""
+        return {'passage': self.passage, 'questions': list(self.questions)}
+
+
+def salvage_quiz(text: str) -> dict:
+    """The passage and complete questions of a response that is not valid
+    JSON, e.g. one cut off at max_tokens or broken inside a later question"""
+    parser = IncrementalQuizParser()
+    try:
+        parser.feed(text)
+    except ValueError:
+        # A question object that does not parse; keep what came before it
+        pass
+    return parser.result()
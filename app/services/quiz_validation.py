@@ -0,0 +1,70 @@
+"""
+Quiz Validation
+Checks generated quiz data against the shape _save_quiz expects
+"""
+from app.models.question import CATEGORIES, DIFFICULTIES
+
+OPTION_KEYS = ('A', 'B', 'C', 'D')
+QUESTION_COUNT = 10
+
+
+def question_errors(question) -> list:
+    """Return a list of problems with one generated question (empty if valid)"""
+    if not isinstance(question, dict):
+        return ['question is not an object']
+
+    errors = []
+    for key in ('text', 'explanation'):
+        if not isinstance(question.get(key), str) or not question[key].strip():
+            errors.append(f'missing {key}')
+
+    if not isinstance(question.get('number'), int):
+        errors.append('missing number')
+
+    options = question.get('options')
+    if not isinstance(options, dict) or set(options) != set(OPTION_KEYS):
+        errors.append('options must be exactly A, B, C, D')
+    elif not all(isinstance(v, str) and v.strip() for v in options.values()):
+        errors.append('empty option text')
+
+    if question.get('correct') not in OPTION_KEYS:
+        errors.append('correct must be one of A, B, C, D')
+    if question.get('category') not in CATEGORIES:
+        errors.append(f"unknown category {question.get('category')!r}")
+    if question.get('difficulty') not in DIFFICULTIES:
+        errors.append(f"unknown difficulty {question.get('difficulty')!r}")
+
+    return errors
+
+
+def validate_questions(questions, count: int = QUESTION_COUNT):
+    """Check generated questions slot by slot (1..count, by position).
+
+    Returns (valid, errors): the valid questions keyed by slot, and the
+    problems with every other slot, including missing ones. Questions
+    past `count` are ignored.
+    """
+    if not isinstance(questions, list):
+        questions = []
+
+    valid, errors = {}, {}
+    for slot in range(1, count + 1):
+        if slot > len(questions):
+            errors[slot] = ['missing question']
+            continue
+        problems = question_errors(questions[slot - 1])
+        if problems:
+            errors[slot] = problems
+        else:
+            valid[slot] = dict(questions[slot - 1], number=slot)
+    return valid, errors
+
+
+def passage_errors(data) -> list:
+    """Problems with a generated quiz's passage (empty if usable)"""
+    if not isinstance(data, dict):
+        return ['response is not an object']
+    passage = data.get('passage')
+    if not isinstance(passage, str) or not passage.strip():
+        return ['missing passage']
+    return []
@@ -0,0 +1,141 @@
+"""
+Response Cache
+Disk-backed cache of raw Claude responses, keyed by a hash of the request
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from flask import current_app
+
+
+class ResponseCache:
+    """Raw response texts stored as one JSON file per request.
+
+    The key is a SHA-256 of the model, max_tokens and prompt, so a rerun
+    that builds the same prompt (a crashed or repeated cron run, a test
+    replay) gets the earlier response without an API call. Entries older
+    than `ttl` seconds are ignored and removed; once the directory grows
+    past `max_bytes`, the oldest entries are evicted.
+    """
+
+    SUFFIX = '.json'
+
+    def __init__(self, directory: str, ttl: float = 48 * 3600, max_bytes: int = 50 * 1024 * 1024,
+                 clock=time.time):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(model: str, max_tokens: int, prompt: str) -> str:
+        request = json.dumps([model, max_tokens, prompt], ensure_ascii=False)
+        return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key: str):
+        """The cached entry ({'text', 'usage', 'created'}) or None"""
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if self.clock() - entry.get('created', 0) > self.ttl:
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, text: str, usage: dict = None):
+        """Store a response, written atomically so concurrent readers never
+        see a partial file, then evict if over max_bytes"""
+        entry = {'created': self.clock(), 'text': text, 'usage': usage or {}}
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(temp, self._path(key))
+            # Eviction ages entries by mtime, so keep it on this cache's clock
+            os.utime(self._path(key), (entry['created'], entry['created']))
+        except OSError:
+            self._remove(temp)
+            raise
+        self.evict()
+
+    def delete(self, key: str):
+        self._remove(self._path(key))
+
+    def evict(self) -> int:
+        """Remove expired entries, then the oldest ones until the cache
+        fits max_bytes. Returns how many were removed."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        removed = 0
+        now = self.clock()
+        total = 0
+        kept = []
+        for mtime, size, path in entries:
+            # Entries are written once, so mtime is their creation time
+            if now - mtime > self.ttl:
+                removed += self._remove(path)
+            else:
+                kept.append((mtime, size, path))
+                total += size
+
+        for mtime, size, path in sorted(kept):
+            if total <= self.max_bytes:
+                break
+            removed += self._remove(path)
+            total -= size
+        return removed
+
+    def _remove(self, path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def stats(self) -> dict:
+        sizes = [
+            os.path.getsize(os.path.join(self.directory, name))
+            for name in os.listdir(self.directory) if name.endswith(self.SUFFIX)
+        ]
+        return {'entries': len(sizes), 'bytes': sum(sizes), 'hits': self.hits, 'misses': self.misses}
+
+
+def get_response_cache():
+    """This app's response cache, or None when GENERATION_CACHE_DIR is unset"""
+    directory = current_app.config.get('GENERATION_CACHE_DIR')
+    if not directory:
+        return None
+    cache = current_app.extensions.get('response_cache')
+    if cache is None or cache.directory != directory:
+        cache = ResponseCache(
+            directory,
+            ttl=current_app.config.get('GENERATION_CACHE_TTL_HOURS', 48) * 3600,
+            max_bytes=current_app.config.get('GENERATION_CACHE_MAX_MB', 50) * 1024 * 1024
+        )
+        current_app.extensions['response_cache'] = cache
+    return cache
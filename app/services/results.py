@@ -0,0 +1,147 @@
+"""
+Quiz Results
+A submission's results loaded in one query, and a cache of the finished
+results pages and JSON of completed submissions
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from flask import current_app, request
+
+from app.extensions import db
+from app.models import Quiz, Question, Submission, Answer
+
+
+class QuizResults:
+    """A submission with its quiz, the quiz's questions in order, its
+    answers by question id and per-category correct/total counts"""
+
+    def __init__(self, submission: Submission, quiz: Quiz, questions: list, answers: dict):
+        self.submission = submission
+        self.quiz = quiz
+        self.questions = questions
+        self.answers = answers
+        self.category_stats = {}
+        for question in questions:
+            stats = self.category_stats.setdefault(question.category, {'correct': 0, 'total': 0})
+            stats['total'] += 1
+            answer = answers.get(question.id)
+            if answer and answer.is_correct:
+                stats['correct'] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            'submission': self.submission.to_dict(),
+            'quiz': {
+                'id': self.quiz.id,
+                'date': self.quiz.quiz_date.isoformat(),
+                'passage': self.quiz.passage
+            },
+            'questions': [
+                dict(question.to_dict(include_answer=True),
+                     answer=self.answers[question.id].to_dict() if question.id in self.answers else None)
+                for question in self.questions
+            ],
+            'category_stats': self.category_stats
+        }
+
+
+def build_results(submission_id: int):
+    """The submission's QuizResults from a single joined query, or None if
+    there is no such submission"""
+    rows = db.session.query(Submission, Quiz, Question, Answer) \
+        .join(Quiz, Quiz.id == Submission.quiz_id) \
+        .outerjoin(Question, Question.quiz_id == Quiz.id) \
+        .outerjoin(Answer, (Answer.submission_id == Submission.id) & (Answer.question_id == Question.id)) \
+        .filter(Submission.id == submission_id) \
+        .order_by(Question.question_number) \
+        .all()
+    if not rows:
+        return None
+
+    submission, quiz = rows[0][0], rows[0][1]
+    questions = [question for _, _, question, _ in rows if question is not None]
+    answers = {answer.question_id: answer for *_, answer in rows if answer is not None}
+    return QuizResults(submission, quiz, questions, answers)
+
+
+class ResultsCache:
+    """Bounded LRU of rendered results (an HTML page or JSON text) of
+    completed submissions, with an ETag for each.
+
+    A completed submission's answers never change; its quiz's questions
+    only change when they are regenerated on promotion (promote_pending),
+    which calls invalidate_quiz(). Each app (and so each gunicorn worker) holds its
+    own instance.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        # (submission_id, format) -> (user_id, quiz_id, etag, body)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, submission_id: int, fmt: str):
+        """(user_id, etag, body) of a cached rendering, or None"""
+        with self._lock:
+            entry = self._entries.get((submission_id, fmt))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((submission_id, fmt))
+            self.hits += 1
+            user_id, _, etag, body = entry
+            return user_id, etag, body
+
+    def put(self, submission: Submission, fmt: str, body: str) -> str:
+        """Store a rendering of a completed submission; returns its ETag"""
+        etag = hashlib.sha1(body.encode()).hexdigest()
+        with self._lock:
+            self._entries[(submission.id, fmt)] = (submission.user_id, submission.quiz_id, etag, body)
+            self._entries.move_to_end((submission.id, fmt))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return etag
+
+    def invalidate_quiz(self, quiz_id: int):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[1] == quiz_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'pid': os.getpid(),
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None
+            }
+
+
+def results_response(body: str, etag: str, mimetype: str):
+    """Response for a cached rendering: 304 if the client has it,
+    otherwise the body. Clients revalidate every time, which is cheap."""
+    response = current_app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+def get_results_cache() -> ResultsCache:
+    """The current app's results cache, created on first use"""
+    cache = current_app.extensions.get('results_cache')
+    if cache is None:
+        cache = ResultsCache(current_app.config.get('RESULTS_CACHE_SIZE', 256))
+        current_app.extensions['results_cache'] = cache
+    return cache
@@ -0,0 +1,98 @@
+"""
+Rollup Service
+Maintains the per-user daily analytics rollups (DailyRollup)
+"""
+from sqlalchemy import func, case, insert, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.extensions import db
+from app.models import Quiz, Question, Submission, Answer, DailyRollup
+
+ROLLUP_KEY = ('user_id', 'quiz_date', 'category', 'difficulty')
+ROLLUP_COUNTERS = ('total', 'correct', 'timed', 'timed_correct', 'time_spent')
+
+
+class RollupService:
+    """Keep DailyRollup in step with completed submissions"""
+
+    def _raw_cells(self):
+        """Completed answers grouped into rollup cells, straight from the raw tables"""
+        timed = Answer.time_spent_seconds.isnot(None)
+        correct = func.cast(Answer.is_correct, db.Integer)
+
+        return db.session.query(
+            Submission.user_id,
+            Quiz.quiz_date,
+            Question.category,
+            Question.difficulty,
+            func.count(Answer.id),
+            func.coalesce(func.sum(correct), 0),
+            func.count(Answer.time_spent_seconds),
+            func.coalesce(func.sum(case((timed, correct), else_=0)), 0),
+            func.coalesce(func.sum(Answer.time_spent_seconds), 0)
+        ).join(
+            Answer, Answer.question_id == Question.id
+        ).join(
+            Submission, Submission.id == Answer.submission_id
+        ).join(
+            Quiz, Quiz.id == Question.quiz_id
+        ).filter(
+            Submission.completed == True
+        ).group_by(
+            Submission.user_id, Quiz.quiz_date, Question.category, Question.difficulty
+        )
+
+    def record_submission(self, submission: Submission) -> int:
+        """Add a just-completed submission's answers to the rollups.
+
+        Runs inside the caller's transaction; the caller commits. Returns
+        the number of rollup cells touched.
+        """
+        cells = self._raw_cells().filter(Submission.id == submission.id).all()
+
+        for cell in cells:
+            values = dict(zip(ROLLUP_KEY + ROLLUP_COUNTERS, cell))
+            stmt = sqlite_insert(DailyRollup).values(**values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(ROLLUP_KEY),
+                set_={
+                    name: getattr(DailyRollup, name) + getattr(stmt.excluded, name)
+                    for name in ROLLUP_COUNTERS
+                }
+            )
+            db.session.execute(stmt)
+
+        return len(cells)
+
+    def rebuild(self, user_id: int = None) -> int:
+        """Recompute rollups from raw answers, for one user or everyone.
+
+        Returns the number of rollup rows written.
+        """
+        cells = self._raw_cells()
+        clear = delete(DailyRollup)
+        if user_id is not None:
+            cells = cells.filter(Submission.user_id == user_id)
+            clear = clear.where(DailyRollup.user_id == user_id)
+
+        db.session.execute(clear)
+        columns = [getattr(DailyRollup, name) for name in ROLLUP_KEY + ROLLUP_COUNTERS]
+        result = db.session.execute(insert(DailyRollup).from_select(columns, cells.subquery().select()))
+        db.session.commit()
+        return result.rowcount
+
+    def check_consistency(self, user_id: int, days: int = 7) -> list:
+        """Compare the rollup-backed summary with the raw-join summary.
+
+        Returns the names of the summary sections that differ (empty when
+        the rollups are consistent).
+        """
+        from app.services.analytics import AnalyticsService
+
+        from_rollups = AnalyticsService(user_id, days, source='rollup').get_performance_summary(use_cache=False)
+        from_raw = AnalyticsService(user_id, days, source='raw').get_performance_summary(use_cache=False)
+
+        return [
+            section for section in from_raw
+            if from_raw[section] != from_rollups.get(section)
+        ]
@@ -0,0 +1,222 @@
+"""
+Quiz Scheduler
+Long-lived daemon that generates the daily quiz at QUIZ_GENERATION_TIME_IST
+"""
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from flask import current_app
+
+from app.extensions import db
+from app.models import Quiz
+
+IST = timezone(timedelta(hours=5, minutes=30), 'IST')
+
+
+def parse_ist_time(value: str, default: str = '07:30'):
+    """(hour, minute) of an "HH:MM" IST time, or of `default` if invalid"""
+    try:
+        hour, minute = map(int, value.split(':'))
+        if 0 <= hour < 24 and 0 <= minute < 60:
+            return hour, minute
+    except (AttributeError, ValueError):
+        pass
+    return parse_ist_time(default)
+
+
+def run_daily_job(quiz_date: date = None, generator=None) -> Quiz:
+    """Generate (or promote) the day's shared quiz and send its
+    notification if it has not gone out yet. Returns the quiz."""
+    from app.services.quiz_generator import QuizGeneratorService
+    from app.services.notification import NotificationService
+
+    logger = current_app.logger
+    quiz_date = quiz_date or date.today()
+    existing = Quiz.query.filter_by(quiz_date=quiz_date, user_id=None, kind='daily').first()
+
+    if existing and existing.status != 'pending':
+        logger.info(f"Quiz already exists for {quiz_date}")
+        quiz = existing
+    else:
+        # Get user for adaptive quiz generation
+        generator = generator or QuizGeneratorService()
+        user = generator.pick_adaptive_user()
+        quiz = generator.generate_daily_quiz(user_id=user.id if user else None, quiz_date=quiz_date)
+        logger.info(f"Generated quiz for {quiz_date}: {quiz.id}")
+
+    # Send notification if not already sent
+    if not quiz.notification_sent:
+        notification_email = current_app.config.get('NOTIFICATION_EMAIL')
+        base_url = current_app.config.get('BASE_URL')
+
+        if notification_email and base_url:
+            try:
+                quiz_url = f"{base_url}/quiz/{quiz_date.isoformat()}"
+                if NotificationService().send_quiz_notification(notification_email, quiz_url):
+                    quiz.notification_sent = True
+                    db.session.commit()
+                    logger.info("Email notification sent successfully")
+                else:
+                    logger.error("Failed to send email notification")
+            except Exception as e:
+                logger.error(f"Notification error: {e}")
+        else:
+            logger.warning("Notification email or base URL not configured")
+
+    return quiz
+
+
+class QuizScheduler:
+    """Run the daily job once a day in a warm process.
+
+    The app, its database engine and the Anthropic client are created
+    once and reused, so a run pays no interpreter or import start-up. Each
+    day's run starts SCHEDULER_LEAD_MINUTES before QUIZ_GENERATION_TIME_IST,
+    which is the deadline; failures are retried every
+    SCHEDULER_RETRY_SECONDS while attempts and time before the deadline
+    remain. A run missed while the daemon was down is caught up on start.
+    Timings are kept in status() and written to SCHEDULER_STATUS_PATH.
+    """
+
+    def __init__(self, app, job=run_daily_job, clock=None, sleep=None):
+        self.app = app
+        self.job = job
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self._stop = threading.Event()
+        self.sleep = sleep or self._stop.wait
+
+        config = app.config
+        self.hour, self.minute = parse_ist_time(config.get('QUIZ_GENERATION_TIME_IST', '07:30'))
+        self.lead = timedelta(minutes=config.get('SCHEDULER_LEAD_MINUTES', 15))
+        self.max_attempts = config.get('SCHEDULER_MAX_ATTEMPTS', 3)
+        self.retry_seconds = config.get('SCHEDULER_RETRY_SECONDS', 120)
+        self.status_path = config.get('SCHEDULER_STATUS_PATH')
+        self.last_run = None
+
+    def deadline(self, quiz_date: date) -> datetime:
+        """When `quiz_date`'s quiz should be ready, in UTC"""
+        local = datetime(quiz_date.year, quiz_date.month, quiz_date.day, self.hour, self.minute, tzinfo=IST)
+        return local.astimezone(timezone.utc)
+
+    def today(self) -> date:
+        """The current date in IST"""
+        return self.clock().astimezone(IST).date()
+
+    def next_run(self):
+        """(quiz_date, start time in UTC) of the next scheduled run"""
+        quiz_date = self.today()
+        ran = self.last_run and self.last_run['quiz_date'] == quiz_date.isoformat()
+        if ran or self._done(quiz_date):
+            quiz_date += timedelta(days=1)
+        # A start time already passed means today's run was missed: run now
+        return quiz_date, self.deadline(quiz_date) - self.lead
+
+    def _done(self, quiz_date: date) -> bool:
+        """Whether the day's shared quiz is already active"""
+        with self.app.app_context():
+            return db.session.query(Quiz.id).filter(
+                Quiz.quiz_date == quiz_date, Quiz.user_id.is_(None), Quiz.kind == 'daily',
+                Quiz.status == 'active'
+            ).first() is not None
+
+    def warm_up(self):
+        """Create the Anthropic client ahead of the first run"""
+        from app.services.claude_client import get_anthropic_client
+        with self.app.app_context():
+            try:
+                get_anthropic_client()
+            except Exception as e:
+                self.app.logger.warning(f"Scheduler could not create the Anthropic client yet: {e}")
+
+    def run(self, quiz_date: date) -> dict:
+        """Run the job for `quiz_date` with retries until it succeeds, runs
+        out of attempts or passes the deadline. Returns the run record."""
+        deadline = self.deadline(quiz_date)
+        started = self.clock()
+        record = {'quiz_date': quiz_date.isoformat(), 'started': started.isoformat(), 'attempts': 0,
+                  'ok': False, 'error': None, 'quiz_id': None}
+
+        while True:
+            record['attempts'] += 1
+            attempt_started = time.monotonic()
+            with self.app.app_context():
+                try:
+                    quiz = self.job(quiz_date)
+                    record.update(ok=True, error=None, quiz_id=quiz.id)
+                except Exception as e:
+                    db.session.rollback()
+                    record['error'] = str(e)
+                    self.app.logger.error(f"Scheduled generation for {quiz_date} failed "
+                                          f"(attempt {record['attempts']}): {e}")
+            record['last_attempt_seconds'] = round(time.monotonic() - attempt_started, 3)
+
+            if record['ok'] or record['attempts'] >= self.max_attempts:
+                break
+            retry_at = self.clock() + timedelta(seconds=self.retry_seconds)
+            if retry_at > deadline:
+                break
+            self.sleep(self.retry_seconds)
+            if self._stop.is_set():
+                break
+
+        finished = self.clock()
+        record.update(
+            finished=finished.isoformat(),
+            seconds=round((finished - started).total_seconds(), 3),
+            deadline=deadline.isoformat(),
+            met_deadline=record['ok'] and finished <= deadline
+        )
+        self.last_run = record
+        log = self.app.logger.info if record['met_deadline'] else self.app.logger.warning
+        log(f"Scheduled run for {quiz_date}: {'ok' if record['ok'] else 'failed'} after "
+            f"{record['attempts']} attempt(s), {record['seconds']:.1f}s"
+            f"{'' if record['met_deadline'] else ', missed the deadline'}")
+        self.write_status()
+        return record
+
+    def run_forever(self):
+        """Sleep until each scheduled run and execute it, until stop()"""
+        self.warm_up()
+        while not self._stop.is_set():
+            quiz_date, start = self.next_run()
+            self.write_status()
+            wait = (start - self.clock()).total_seconds()
+            if wait > 0:
+                self.app.logger.info(f"Next quiz generation for {quiz_date} at {start.isoformat()}")
+                self.sleep(wait)
+                if self._stop.is_set():
+                    break
+                continue
+            # A failed run is not repeated for the same date until a restart
+            self.run(quiz_date)
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> dict:
+        quiz_date, start = self.next_run()
+        return {
+            'generation_time_ist': f"{self.hour:02d}:{self.minute:02d}",
+            'next_run': {'quiz_date': quiz_date.isoformat(), 'start': start.isoformat(),
+                         'deadline': self.deadline(quiz_date).isoformat()},
+            'last_run': self.last_run
+        }
+
+    def write_status(self):
+        if not self.status_path:
+            return
+        temp = f"{self.status_path}.tmp"
+        with open(temp, 'w') as f:
+            json.dump(self.status(), f, indent=2)
+        os.replace(temp, self.status_path)
+
+
+def read_status(path: str):
+    """The status a running scheduler last wrote to `path`, or None"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,165 @@
+"""
+Skill Estimator
+Vectorized multi-window skill signals computed with NumPy from one history load
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import func
+
+from app.extensions import db
+from app.models import Quiz, Question, Submission, Answer
+from app.models.question import CATEGORIES, DIFFICULTIES
+
+
+class SkillEstimator:
+    """Estimate per-category and per-difficulty skill from a user's answer history.
+
+    The history is loaded into NumPy arrays with a single query; every
+    signal is then computed in a batch over those arrays:
+
+    - accuracy per category over 7/30/90-day windows
+    - exponentially weighted moving accuracy and seconds per question per
+      category (recent answers weigh more)
+    - weekly accuracy curves per difficulty
+    """
+
+    WINDOWS = (7, 30, 90)
+
+    def __init__(self, user_id: int, history_days: int = None, half_life: int = 10,
+                 curve_bucket_days: int = 7):
+        self.user_id = user_id
+        self.history_days = history_days or max(self.WINDOWS)
+        # Number of newer answers in a category after which an answer's weight halves
+        self.alpha = 1 - 0.5 ** (1 / half_life)
+        self.curve_bucket_days = curve_bucket_days
+
+    def load_history(self) -> dict:
+        """Fetch the answer history as parallel arrays, oldest first"""
+        start_date = date.today() - timedelta(days=self.history_days)
+        age = func.julianday(date.today().isoformat()) - func.julianday(Quiz.quiz_date)
+
+        rows = db.session.query(
+            age,
+            Question.category,
+            Question.difficulty,
+            Answer.is_correct,
+            Answer.time_spent_seconds
+        ).join(
+            Answer, Answer.question_id == Question.id
+        ).join(
+            Submission, Submission.id == Answer.submission_id
+        ).join(
+            Quiz, Quiz.id == Question.quiz_id
+        ).filter(
+            Submission.user_id == self.user_id,
+            Submission.completed == True,
+            Quiz.quiz_date >= start_date,
+            Quiz.quiz_date <= date.today()
+        ).order_by(Quiz.quiz_date, Answer.id).all()
+
+        category_index = {c: i for i, c in enumerate(CATEGORIES)}
+        difficulty_index = {d: i for i, d in enumerate(DIFFICULTIES)}
+        rows = [r for r in rows if r[1] in category_index and r[2] in difficulty_index]
+        n = len(rows)
+
+        return {
+            'age_days': np.fromiter((r[0] for r in rows), dtype=np.float64, count=n),
+            'category': np.fromiter((category_index[r[1]] for r in rows), dtype=np.intp, count=n),
+            'difficulty': np.fromiter((difficulty_index[r[2]] for r in rows), dtype=np.intp, count=n),
+            'correct': np.fromiter((bool(r[3]) for r in rows), dtype=np.float64, count=n),
+            'seconds': np.fromiter(
+                (np.nan if r[4] is None else r[4] for r in rows), dtype=np.float64, count=n
+            )
+        }
+
+    def estimate(self, history: dict = None) -> dict:
+        """Compute all skill signals from the history arrays"""
+        if history is None:
+            history = self.load_history()
+
+        n = len(history['category'])
+        signals = {
+            'answers': n,
+            'window_accuracy': {},
+            'ewma_accuracy': {},
+            'ewma_seconds': {},
+            'difficulty_curves': {}
+        }
+        if n == 0:
+            return signals
+
+        category = history['category']
+        correct = history['correct']
+        seconds = history['seconds']
+        n_categories = len(CATEGORIES)
+
+        # Window accuracy: (windows x answers) mask times (answers x categories) one-hot
+        onehot = np.zeros((n, n_categories))
+        onehot[np.arange(n), category] = 1.0
+        windows = np.array(self.WINDOWS, dtype=np.float64)
+        in_window = (history['age_days'][None, :] <= windows[:, None]).astype(np.float64)
+        totals = in_window @ onehot
+        hits = in_window @ (onehot * correct[:, None])
+        accuracy = _ratio(hits, totals) * 100
+
+        for w, days in enumerate(self.WINDOWS):
+            signals['window_accuracy'][f'{days}d'] = {
+                CATEGORIES[c]: round(float(accuracy[w, c]), 1)
+                for c in range(n_categories) if totals[w, c] > 0
+            }
+
+        # EWMA: weight (1 - alpha) ** (newer answers in the same category)
+        newer = _newer_in_group(onehot)
+        weights = (1 - self.alpha) ** newer
+        ewma_accuracy = _ratio(
+            np.bincount(category, weights=weights * correct, minlength=n_categories),
+            np.bincount(category, weights=weights, minlength=n_categories)
+        ) * 100
+
+        timed = ~np.isnan(seconds)
+        timed_onehot = onehot * timed[:, None]
+        timed_weights = (1 - self.alpha) ** _newer_in_group(timed_onehot)
+        timed_weights = np.where(timed, timed_weights, 0.0)
+        ewma_seconds = _ratio(
+            np.bincount(category, weights=timed_weights * np.nan_to_num(seconds), minlength=n_categories),
+            np.bincount(category, weights=timed_weights, minlength=n_categories)
+        )
+
+        counts = onehot.sum(axis=0)
+        timed_counts = timed_onehot.sum(axis=0)
+        for c in range(n_categories):
+            if counts[c] > 0:
+                signals['ewma_accuracy'][CATEGORIES[c]] = round(float(ewma_accuracy[c]), 1)
+            if timed_counts[c] > 0:
+                signals['ewma_seconds'][CATEGORIES[c]] = round(float(ewma_seconds[c]), 1)
+
+        # Difficulty curves: accuracy per (difficulty, age bucket), oldest bucket first
+        n_buckets = -(-self.history_days // self.curve_bucket_days) + 1
+        bucket = n_buckets - 1 - (history['age_days'] // self.curve_bucket_days).astype(np.intp)
+        bucket = np.clip(bucket, 0, n_buckets - 1)
+        cell = history['difficulty'] * n_buckets + bucket
+        size = len(DIFFICULTIES) * n_buckets
+        curve = _ratio(
+            np.bincount(cell, weights=correct, minlength=size),
+            np.bincount(cell, minlength=size).astype(np.float64)
+        ).reshape(len(DIFFICULTIES), n_buckets) * 100
+
+        for d, difficulty in enumerate(DIFFICULTIES):
+            points = [None if np.isnan(v) else round(float(v), 1) for v in curve[d]]
+            if any(p is not None for p in points):
+                signals['difficulty_curves'][difficulty] = points
+
+        return signals
+
+
+def _ratio(numerator, denominator):
+    """Elementwise numerator / denominator, NaN where the denominator is 0"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), np.nan)
+
+
+def _newer_in_group(onehot):
+    """For each row, how many later rows share its group (one-hot columns)"""
+    at_or_after = np.cumsum(onehot[::-1], axis=0)[::-1]
+    return (at_or_after * onehot).sum(axis=1) - 1
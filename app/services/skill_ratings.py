@@ -0,0 +1,106 @@
+"""
+Skill Rating Service
+Incremental per-category Elo ratings, updated as submissions complete
+"""
+from datetime import datetime
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.extensions import db
+from app.models import Question, Submission, Answer, SkillRating
+
+INITIAL_RATING = 1500.0
+K_FACTOR = 32.0
+
+# Questions are treated as opponents whose rating depends on difficulty
+DIFFICULTY_RATINGS = {
+    'easy': 1300.0,
+    'medium': 1500.0,
+    'hard': 1700.0
+}
+
+
+def expected_score(rating: float, difficulty: str = 'medium') -> float:
+    """Probability of answering a question of this difficulty correctly"""
+    opponent = DIFFICULTY_RATINGS.get(difficulty, INITIAL_RATING)
+    return 1 / (1 + 10 ** ((opponent - rating) / 400))
+
+
+class SkillRatingService:
+    """Maintain SkillRating rows from completed submissions"""
+
+    def apply_submission(self, submission: Submission) -> int:
+        """Update the user's ratings with a submission's answers.
+
+        Each answer costs O(1): one Elo step on its category's rating.
+        Runs inside the caller's transaction; the caller commits. Returns
+        the number of answers applied.
+        """
+        answers = db.session.query(
+            Question.category,
+            Question.difficulty,
+            Answer.is_correct
+        ).join(
+            Question, Question.id == Answer.question_id
+        ).filter(
+            Answer.submission_id == submission.id
+        ).order_by(Answer.id).all()
+
+        if not answers:
+            return 0
+
+        # Ratings as read, then each category's Elo steps from there
+        base = dict(db.session.query(SkillRating.category, SkillRating.rating).filter(
+            SkillRating.user_id == submission.user_id,
+            SkillRating.category.in_({a.category for a in answers})
+        ))
+        ratings, counts = {}, {}
+        for category, difficulty, is_correct in answers:
+            rating = ratings.get(category, base.get(category, INITIAL_RATING))
+            expected = expected_score(rating, difficulty)
+            ratings[category] = rating + K_FACTOR * ((1.0 if is_correct else 0.0) - expected)
+            counts[category] = counts.get(category, 0) + 1
+
+        self._upsert(submission.user_id, base, ratings, counts)
+        return len(answers)
+
+    def _upsert(self, user_id: int, base: dict, ratings: dict, counts: dict):
+        """Write each category's change from `base` to `ratings` as an
+        INSERT ... ON CONFLICT DO UPDATE adding the change, so a row
+        another submission of the user inserted meanwhile is added to
+        instead of failing on the primary key"""
+        now = datetime.utcnow()
+        for category, rating in ratings.items():
+            delta = rating - base.get(category, INITIAL_RATING)
+            stmt = sqlite_insert(SkillRating).values(
+                user_id=user_id, category=category, rating=INITIAL_RATING + delta,
+                answers=counts[category], updated_at=now
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['user_id', 'category'],
+                set_={
+                    'rating': SkillRating.rating + delta,
+                    'answers': SkillRating.answers + stmt.excluded.answers,
+                    'updated_at': stmt.excluded.updated_at
+                }
+            )
+            db.session.execute(stmt)
+
+    def rebuild(self, user_id: int = None) -> int:
+        """Recompute ratings by replaying completed submissions in order.
+
+        Returns the number of submissions replayed.
+        """
+        clear = SkillRating.query
+        submissions = Submission.query.filter_by(completed=True)
+        if user_id is not None:
+            clear = clear.filter_by(user_id=user_id)
+            submissions = submissions.filter_by(user_id=user_id)
+
+        clear.delete()
+        count = 0
+        for submission in submissions.order_by(Submission.submitted_at, Submission.id):
+            self.apply_submission(submission)
+            count += 1
+        db.session.commit()
+        return count
@@ -0,0 +1,253 @@
+"""
+Submission State Cache
+Owner, quiz, start time and completion of submissions, so the quiz API can
+validate requests without reading the submissions table
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+
+from app.models import Submission
+
+
+class SubmissionState:
+    """The fields of a Submission the quiz endpoints check"""
+
+    __slots__ = ('id', 'user_id', 'quiz_id', 'started_at', 'completed')
+
+    def __init__(self, id: int, user_id: int, quiz_id: int, started_at: datetime, completed: bool):
+        self.id = id
+        self.user_id = user_id
+        self.quiz_id = quiz_id
+        self.started_at = started_at
+        self.completed = bool(completed)
+
+    @classmethod
+    def of(cls, submission: Submission) -> 'SubmissionState':
+        return cls(submission.id, submission.user_id, submission.quiz_id,
+                   submission.started_at, submission.completed)
+
+
+class ProcessStateStore:
+    """Bounded LRU of states in this process.
+
+    Other workers' changes are not seen, so entries expire after `ttl`
+    seconds; writes guard against a stale "in progress" themselves (see
+    Submission.tally_update). A completed state is never replaced by an
+    in-progress one.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._states = OrderedDict()
+        self._by_user_quiz = {}
+        self._lock = threading.Lock()
+
+    def get(self, submission_id: int):
+        with self._lock:
+            entry = self._states.get(submission_id)
+            if entry is None:
+                return None
+            state, stored = entry
+            if self.clock() - stored > self.ttl:
+                self._drop(submission_id)
+                return None
+            self._states.move_to_end(submission_id)
+            return state
+
+    def find(self, user_id: int, quiz_id: int):
+        with self._lock:
+            submission_id = self._by_user_quiz.get((user_id, quiz_id))
+        return self.get(submission_id) if submission_id is not None else None
+
+    def put(self, state: SubmissionState):
+        with self._lock:
+            current = self._states.get(state.id)
+            if current is not None and current[0].completed and not state.completed:
+                return
+            self._states[state.id] = (state, self.clock())
+            self._states.move_to_end(state.id)
+            self._by_user_quiz[(state.user_id, state.quiz_id)] = state.id
+            while len(self._states) > self.maxsize:
+                self._drop(next(iter(self._states)))
+
+    def _drop(self, submission_id: int):
+        state, _ = self._states.pop(submission_id)
+        key = (state.user_id, state.quiz_id)
+        if self._by_user_quiz.get(key) == submission_id:
+            del self._by_user_quiz[key]
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+            self._by_user_quiz.clear()
+
+    def __len__(self):
+        return len(self._states)
+
+
+class SqliteStateStore:
+    """States in a small SQLite file shared by every worker on the host.
+
+    Every state change is written through by the worker making it, so
+    entries never go stale and need no expiry. A completed state is never
+    replaced by an in-progress one, such as a worker remembering a row it
+    read just before the submit. The oldest entries past `maxsize` are
+    pruned now and then.
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, path: str, maxsize: int = 4096):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._puts = 0
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS submission_state (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, '
+                'quiz_id INTEGER NOT NULL, started_at TEXT, completed INTEGER NOT NULL, updated REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_submission_state_user_quiz '
+                         'ON submission_state (user_id, quiz_id, id)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def _state(self, row):
+        if row is None:
+            return None
+        id, user_id, quiz_id, started_at, completed = row
+        return SubmissionState(id, user_id, quiz_id,
+                               datetime.fromisoformat(started_at) if started_at else None, completed)
+
+    def get(self, submission_id: int):
+        row = self._connect().execute(
+            'SELECT id, user_id, quiz_id, started_at, completed FROM submission_state WHERE id = ?',
+            (submission_id,)
+        ).fetchone()
+        return self._state(row)
+
+    def find(self, user_id: int, quiz_id: int):
+        row = self._connect().execute(
+            'SELECT id, user_id, quiz_id, started_at, completed FROM submission_state '
+            'WHERE user_id = ? AND quiz_id = ? ORDER BY id DESC LIMIT 1',
+            (user_id, quiz_id)
+        ).fetchone()
+        return self._state(row)
+
+    def put(self, state: SubmissionState):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO submission_state (id, user_id, quiz_id, started_at, completed, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET user_id = excluded.user_id, '
+                'quiz_id = excluded.quiz_id, started_at = excluded.started_at, '
+                'completed = excluded.completed, updated = excluded.updated '
+                'WHERE submission_state.completed = 0',
+                (state.id, state.user_id, state.quiz_id,
+                 state.started_at.isoformat() if state.started_at else None, int(state.completed), time.time())
+            )
+            self._puts += 1
+            if self._puts % self.PRUNE_EVERY == 0:
+                conn.execute(
+                    'DELETE FROM submission_state WHERE id NOT IN '
+                    '(SELECT id FROM submission_state ORDER BY updated DESC LIMIT ?)', (self.maxsize,)
+                )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM submission_state')
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM submission_state').fetchone()[0]
+
+
+class SubmissionStates:
+    """Submission states from the store, falling back to the database.
+
+    Lookups that miss read the Submission row once and store its state.
+    Callers write each state change through with remember() after
+    committing it. A user and quiz with no submission is not cached, so
+    a new one started on another worker is always found.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, submission_id: int):
+        """The submission's state, or None if it does not exist"""
+        state = self.store.get(submission_id)
+        if state is not None:
+            self.hits += 1
+            return state
+        self.misses += 1
+        submission = Submission.query.get(submission_id)
+        return self.remember(submission) if submission else None
+
+    def find(self, user_id: int, quiz_id: int, confirm_open: bool = False):
+        """State of the user's submission for the quiz (a completed one
+        if any, else the latest in progress), or None.
+
+        With confirm_open, a cached in-progress state is checked against
+        the database first, since another worker may have completed it;
+        use it before offering the quiz to take. Completed states are final
+        and always trusted.
+        """
+        state = self.store.find(user_id, quiz_id)
+        if state is not None and (state.completed or not confirm_open):
+            self.hits += 1
+            return state
+        self.misses += 1
+        submission = Submission.query.filter_by(user_id=user_id, quiz_id=quiz_id) \
+            .order_by(Submission.completed.desc(), Submission.id.desc()).first()
+        return self.remember(submission) if submission else None
+
+    def remember(self, submission: Submission) -> SubmissionState:
+        """Write a submission's current state through to the store"""
+        state = SubmissionState.of(submission)
+        self.store.put(state)
+        return state
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'pid': os.getpid(),
+            'store': type(self.store).__name__,
+            'size': len(self.store),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None
+        }
+
+
+def get_submission_states() -> SubmissionStates:
+    """The current app's submission state cache, created on first use.
+
+    SUBMISSION_STATE_CACHE picks the store: 'process' (per worker, entries
+    expire after SUBMISSION_STATE_TTL seconds) or 'sqlite' (shared by the
+    workers through the file at SUBMISSION_STATE_PATH).
+    """
+    states = current_app.extensions.get('submission_states')
+    if states is None:
+        config = current_app.config
+        size = config.get('SUBMISSION_STATE_SIZE', 4096)
+        if config.get('SUBMISSION_STATE_CACHE', 'process') == 'sqlite':
+            store = SqliteStateStore(config.get('SUBMISSION_STATE_PATH', 'submission_state.db'), size)
+        else:
+            store = ProcessStateStore(size, config.get('SUBMISSION_STATE_TTL', 60))
+        states = SubmissionStates(store)
+        current_app.extensions['submission_states'] = states
+    return states
@@ -0,0 +1,173 @@
+"""
+Generation Telemetry
+Per-generation timings and token usage, and p50/p95 summaries over time
+"""
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+
+from app.extensions import db
+from app.models import GenerationTelemetry
+
+PHASES = ('analytics', 'prompt', 'api', 'parse', 'save')
+USAGE_COLUMNS = {
+    'input_tokens': 'input_tokens',
+    'output_tokens': 'output_tokens',
+    'cache_read_input_tokens': 'cache_read_tokens',
+    'cache_creation_input_tokens': 'cache_creation_tokens',
+    'estimated_input_tokens': 'estimated_input_tokens',
+}
+# Series reported by TelemetryService.summary
+TIMING_SERIES = ('total',) + PHASES
+
+
+class GenerationTimer:
+    """Collects one generation's phase timings and API usage.
+
+    QuizGeneratorService fills it in as it goes (see its `timer`);
+    record() then writes a GenerationTelemetry row.
+    """
+
+    def __init__(self, kind: str, user_id: int = None, model: str = None):
+        self.kind = kind
+        self.user_id = user_id
+        self.model = model
+        self.outcome = 'ok'
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.tokens = dict.fromkeys(USAGE_COLUMNS.values(), 0)
+        self.requests = 0
+        self.cached = 0
+        # Requests made again in full: transient-error retries and topic
+        # regenerations, not repairs or question shards
+        self.retries = 0
+        self.repaired = 0
+        self.started = time.monotonic()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.monotonic() - started
+
+    def add_phases(self, seconds: dict):
+        """Add phase time spent before this timer started, e.g. a prompt
+        built on the calling thread for a worker's generation; it counts
+        towards the total as well"""
+        for name, value in seconds.items():
+            self.seconds[name] += value
+            self.started -= value
+
+    def add_usage(self, usage: dict):
+        for key, column in USAGE_COLUMNS.items():
+            self.tokens[column] += (usage or {}).get(key, 0)
+
+    def api_tokens(self) -> int:
+        """Input and output tokens reported by the API"""
+        return sum(value for column, value in self.tokens.items() if column != 'estimated_input_tokens')
+
+    def merge(self, other: 'GenerationTimer'):
+        """Add the requests and usage of a sub-generation (e.g. a question
+        shard run on another thread); its wall-clock time is not added"""
+        self.requests += other.requests
+        self.cached += other.cached
+        self.retries += other.retries
+        self.repaired += other.repaired
+        for column, value in other.tokens.items():
+            self.tokens[column] += value
+
+    def record(self, quiz_id: int = None, error: str = None):
+        """Write the telemetry row and commit. Failures are logged, never
+        raised, so telemetry cannot break generation."""
+        try:
+            db.session.add(GenerationTelemetry(
+                kind=self.kind,
+                model=self.model,
+                quiz_id=quiz_id,
+                user_id=self.user_id,
+                outcome='failed' if error else self.outcome,
+                error=error,
+                total_seconds=time.monotonic() - self.started,
+                requests=self.requests + self.cached,
+                retries=self.retries,
+                cached_responses=self.cached,
+                repaired_questions=self.repaired,
+                **{f'{name}_seconds': value for name, value in self.seconds.items()},
+                **self.tokens
+            ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Could not record generation telemetry: {e}")
+
+
+def _period_start(created_at: datetime, bucket: str):
+    day = created_at.date()
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+class TelemetryService:
+    """Read generation telemetry back as per-day or per-week summaries"""
+
+    def summary(self, days: int = 30, bucket: str = 'day', kind: str = None) -> list:
+        """One summary per period with runs in the last `days` days, oldest
+        first: run and outcome counts, p50/p95 seconds per phase, mean
+        tokens and retries."""
+        if bucket not in ('day', 'week'):
+            raise ValueError("bucket must be 'day' or 'week'")
+
+        query = GenerationTelemetry.query.filter(
+            GenerationTelemetry.created_at >= datetime.utcnow() - timedelta(days=days)
+        )
+        if kind:
+            query = query.filter(GenerationTelemetry.kind == kind)
+        rows = query.order_by(GenerationTelemetry.created_at).all()
+
+        periods = {}
+        for row in rows:
+            periods.setdefault(_period_start(row.created_at, bucket), []).append(row)
+        return [self._summarize(start, group) for start, group in periods.items()]
+
+    def _estimate_ratio(self, rows: list):
+        """Estimated over actual input tokens (uncached, cached and cache
+        writes) of runs with an estimate, or None"""
+        rows = [row for row in rows if row.estimated_input_tokens]
+        actual = sum((row.input_tokens or 0) + (row.cache_read_tokens or 0) + (row.cache_creation_tokens or 0)
+                     for row in rows)
+        if not actual:
+            return None
+        return round(sum(row.estimated_input_tokens for row in rows) / actual, 3)
+
+    def _summarize(self, start, rows: list) -> dict:
+        def column(name):
+            return np.array([getattr(row, name) or 0 for row in rows], dtype=float)
+
+        timings = {}
+        for name in TIMING_SERIES:
+            values = column(f'{name}_seconds')
+            p50, p95 = np.percentile(values, [50, 95])
+            timings[name] = {'p50': round(float(p50), 3), 'p95': round(float(p95), 3)}
+
+        outcomes = {}
+        for row in rows:
+            outcomes[row.outcome] = outcomes.get(row.outcome, 0) + 1
+
+        return {
+            'period': start.isoformat(),
+            'runs': len(rows),
+            'outcomes': outcomes,
+            'seconds': timings,
+            'mean_input_tokens': round(float(column('input_tokens').mean()), 1),
+            'mean_output_tokens': round(float(column('output_tokens').mean()), 1),
+            'mean_cache_read_tokens': round(float(column('cache_read_tokens').mean()), 1),
+            'mean_estimated_input_tokens': round(float(column('estimated_input_tokens').mean()), 1),
+            'estimate_ratio': self._estimate_ratio(rows),
+            'mean_retries': round(float(column('retries').mean()), 2),
+            'cached_responses': int(column('cached_responses').sum()),
+            'repaired_questions': int(column('repaired_questions').sum()),
+        }
@@ -0,0 +1,173 @@
+"""
+Topic Index
+MinHash signatures of every stored passage, for near-duplicate topic checks
+"""
+import threading
+import zlib
+import numpy as np
+from flask import current_app
+
+from app.extensions import db
+from app.models import Quiz
+from app.services.question_bank import extract_keywords, ranked_keywords
+
+
+# Hash functions per signature; the similarity estimate is within about
+# +-0.06 of the true Jaccard similarity of the passages' content words
+NUM_HASHES = 64
+
+# Content words naming a passage's topic in the prompt blocklist
+TOPIC_WORDS = 5
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(7919)
+_A = _rng.integers(1, _PRIME, NUM_HASHES, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_HASHES, dtype=np.uint64)
+
+
+def minhash(text: str):
+    """MinHash signature of the content words of `text`, or None if it has none.
+
+    Words are hashed with crc32, so signatures are stable across processes.
+    """
+    words = extract_keywords(text)
+    if not words:
+        return None
+    x = np.fromiter((zlib.crc32(w.encode()) % _PRIME for w in words), dtype=np.uint64, count=len(words))
+    return ((np.outer(x, _A) + _B) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+class DuplicateTopicError(Exception):
+    """A generated passage repeats the topic of a stored one"""
+
+    def __init__(self, quiz_id: int, similarity: float, topic: str):
+        super().__init__(f"passage repeats the topic of quiz {quiz_id} ({topic}), similarity {similarity:.2f}")
+        self.quiz_id = quiz_id
+        self.similarity = similarity
+        self.topic = topic
+
+
+class TopicIndex:
+    """MinHash signatures and topic words of every daily quiz passage.
+
+    Signatures live in one NumPy matrix with a row per hash function, so a
+    new passage is compared with the whole history in a single vectorized
+    pass over contiguous rows. Like the question bank,
+    sync() pulls in quizzes added since the last call (by id). Review
+    quizzes reuse stored passages and are not indexed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._size = 0
+        self._signatures = np.empty((NUM_HASHES, 0), dtype=np.uint32)
+        self._quiz_ids = np.empty(0, dtype=np.int64)
+        self._topics = {}         # quiz id -> topic words
+        self._max_quiz_id = 0
+
+    def __len__(self):
+        return self._size
+
+    def sync(self) -> int:
+        """Index passages saved since the last sync. Returns how many."""
+        with self._lock:
+            rows = db.session.query(Quiz.id, Quiz.passage) \
+                .filter(Quiz.id > self._max_quiz_id, Quiz.kind == 'daily').order_by(Quiz.id).all()
+            added = 0
+            for quiz_id, passage in rows:
+                self._max_quiz_id = quiz_id
+                if self._append(quiz_id, passage):
+                    added += 1
+            return added
+
+    def _append(self, quiz_id: int, passage: str) -> bool:
+        signature = minhash(passage)
+        if signature is None:
+            return False
+        if self._size == len(self._quiz_ids):
+            self._grow(max(256, 2 * self._size))
+        self._signatures[:, self._size] = signature
+        self._quiz_ids[self._size] = quiz_id
+        self._topics[quiz_id] = ', '.join(ranked_keywords(passage, TOPIC_WORDS))
+        self._size += 1
+        return True
+
+    def _grow(self, capacity: int):
+        signatures = np.zeros((NUM_HASHES, capacity), dtype=np.uint32)
+        signatures[:, :self._size] = self._signatures[:, :self._size]
+        quiz_ids = np.zeros(capacity, dtype=np.int64)
+        quiz_ids[:self._size] = self._quiz_ids[:self._size]
+        self._signatures, self._quiz_ids = signatures, quiz_ids
+
+    def similarities(self, passage: str, among=None):
+        """(quiz ids, estimated similarity of `passage` to each), of the
+        quizzes in `among` only if given"""
+        signature = minhash(passage)
+        with self._lock:
+            n = self._size
+            if signature is None or n == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0)
+            matches = (self._signatures[:, :n] == signature[:, None]).sum(axis=0, dtype=np.uint8)
+            quiz_ids = self._quiz_ids[:n].copy()
+        scores = matches / NUM_HASHES
+        if among is not None:
+            keep = np.isin(quiz_ids, np.fromiter(among, dtype=np.int64))
+            quiz_ids, scores = quiz_ids[keep], scores[keep]
+        return quiz_ids, scores
+
+    def find_duplicate(self, passage: str, threshold: float = None, among=None):
+        """The most similar stored quiz (of those in `among`, if given) as
+        (quiz_id, similarity) if it reaches `threshold` (default:
+        TOPIC_DUPLICATE_THRESHOLD), else None"""
+        if threshold is None:
+            threshold = current_app.config.get('TOPIC_DUPLICATE_THRESHOLD', 0.25)
+        quiz_ids, scores = self.similarities(passage, among)
+        if len(scores) == 0:
+            return None
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        return int(quiz_ids[best]), float(scores[best])
+
+    def check(self, passage: str, threshold: float = None, among=None):
+        """Raise DuplicateTopicError if `passage` repeats a stored topic"""
+        match = self.find_duplicate(passage, threshold, among)
+        if match is not None:
+            quiz_id, similarity = match
+            raise DuplicateTopicError(quiz_id, similarity, self.topic(quiz_id))
+
+    def topic(self, quiz_id: int) -> str:
+        return self._topics.get(quiz_id, '')
+
+    def blocklist(self, quiz_ids) -> list:
+        """Distinct topic words of the given quizzes, in the given order"""
+        topics = (self._topics.get(quiz_id) for quiz_id in quiz_ids)
+        return list(dict.fromkeys(t for t in topics if t))
+
+    def stats(self) -> dict:
+        return {
+            'passages': self._size,
+            'max_quiz_id': self._max_quiz_id
+        }
+
+
+def get_topic_index(sync: bool = True) -> TopicIndex:
+    """This app's topic index, synced on every call unless sync is False
+    (from threads that must not use the database).
+
+    Kept in app.extensions like the question bank; the first call loads
+    the whole passage history, later ones only what was saved since.
+    """
+    index = current_app.extensions.get('topic_index')
+    if index is None:
+        index = current_app.extensions.setdefault('topic_index', TopicIndex())
+    if sync:
+        index.sync()
+    return index
+
+
+def refresh_topic_index():
+    """Index newly saved passages, if this process has an index loaded"""
+    index = current_app.extensions.get('topic_index')
+    if index is not None:
+        index.sync()
@@ -2,6 +2,12 @@
  * Quiz Timer and Answer Tracking
  */
 
+// Answer changes are buffered and saved in batches: FLUSH_DELAY_MS after
+// the last change, every FLUSH_INTERVAL_MS, when the page is hidden and on
+// submit (which carries the rest of the buffer)
+const FLUSH_DELAY_MS = 2000;
+const FLUSH_INTERVAL_MS = 15000;
+
 class QuizManager {
     constructor(quizId, timeLimit) {
         this.quizId = quizId;
@@ -13,6 +19,11 @@ class QuizManager {
         this.currentQuestion = null;
         this.timerInterval = null;
         this.answers = {};
+        this.pendingAnswers = {};
+        this.flushTimeout = null;
+        this.flushInterval = null;
+        this.flushing = null;
+        this.submitted = false;
 
         this.init();
     }
@@ -82,6 +93,15 @@ class QuizManager {
             e.preventDefault();
             this.submitQuiz();
         });
+
+        // Save buffered answers periodically and before the page goes away
+        this.flushInterval = setInterval(() => this.flushAnswers(), FLUSH_INTERVAL_MS);
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'hidden') {
+                this.beaconAnswers();
+            }
+        });
+        window.addEventListener('pagehide', () => this.beaconAnswers());
     }
 
     trackQuestionFocus(questionNumber) {
@@ -116,7 +136,7 @@ class QuizManager {
         this.answers[questionId].timeSpent += additionalTime;
     }
 
-    async handleAnswerSelect(event) {
+    handleAnswerSelect(event) {
         const input = event.target;
         const questionCard = input.closest('.question-card');
         const questionId = questionCard.dataset.questionId;
@@ -137,26 +157,89 @@ class QuizManager {
         // Reset start time for this question
         this.questionStartTimes[questionNum] = Date.now();
 
-        // Save to server
-        try {
-            await fetch(`/api/quiz/${this.quizId}/answer`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    submission_id: this.submissionId,
-                    question_id: parseInt(questionId),
-                    selected_answer: selectedAnswer,
-                    time_spent_seconds: this.answers[questionId].timeSpent
-                })
-            });
-        } catch (error) {
-            console.error('Error saving answer:', error);
-        }
+        // Buffer for the next batch save
+        this.queueAnswer(questionId);
 
         // Update answered count
         this.updateAnsweredCount();
     }
 
+    queueAnswer(questionId) {
+        this.pendingAnswers[questionId] = {
+            question_id: parseInt(questionId),
+            selected_answer: this.answers[questionId].selected,
+            time_spent_seconds: this.answers[questionId].timeSpent
+        };
+
+        // Debounce: save once answering pauses
+        clearTimeout(this.flushTimeout);
+        this.flushTimeout = setTimeout(() => this.flushAnswers(), FLUSH_DELAY_MS);
+    }
+
+    takePendingAnswers() {
+        const answers = Object.values(this.pendingAnswers);
+        this.pendingAnswers = {};
+        clearTimeout(this.flushTimeout);
+        return answers;
+    }
+
+    requeueAnswers(answers) {
+        // Keep failed answers unless the question was answered again since
+        answers.forEach(answer => {
+            if (!this.pendingAnswers[answer.question_id]) {
+                this.pendingAnswers[answer.question_id] = answer;
+            }
+        });
+    }
+
+    async flushAnswers() {
+        if (this.flushing) {
+            await this.flushing;
+        }
+        if (this.submitted || !this.submissionId) return;
+
+        const answers = this.takePendingAnswers();
+        if (answers.length === 0) return;
+
+        this.flushing = (async () => {
+            try {
+                const response = await fetch(`/api/quiz/${this.quizId}/answers`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({
+                        submission_id: this.submissionId,
+                        answers: answers
+                    })
+                });
+                if (!response.ok && response.status >= 500) {
+                    this.requeueAnswers(answers);
+                }
+            } catch (error) {
+                console.error('Error saving answers:', error);
+                this.requeueAnswers(answers);
+            } finally {
+                this.flushing = null;
+            }
+        })();
+        await this.flushing;
+    }
+
+    beaconAnswers() {
+        // The page may be closing: hand the buffer to the browser to send
+        if (this.submitted || !this.submissionId || !navigator.sendBeacon) return;
+
+        const answers = Object.values(this.pendingAnswers);
+        if (answers.length === 0) return;
+
+        const body = new Blob([JSON.stringify({
+            submission_id: this.submissionId,
+            answers: answers
+        })], { type: 'application/json' });
+        if (navigator.sendBeacon(`/api/quiz/${this.quizId}/answers`, body)) {
+            this.takePendingAnswers();
+        }
+    }
+
     updateAnsweredCount() {
         const answered = document.querySelectorAll('.option input[type="radio"]:checked').length;
         document.getElementById('answered-count').textContent = answered;
@@ -211,6 +294,12 @@ class QuizManager {
             }
         }
 
+        // Wait for a batch in flight; the rest of the buffer goes with the submit
+        if (this.flushing) {
+            await this.flushing;
+        }
+        const answers = this.takePendingAnswers();
+
         // Disable submit button
         const submitBtn = document.getElementById('submit-btn');
         submitBtn.disabled = true;
@@ -221,21 +310,26 @@ class QuizManager {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
-                    submission_id: this.submissionId
+                    submission_id: this.submissionId,
+                    answers: answers
                 })
             });
 
             const data = await response.json();
 
             if (response.ok && data.redirect_url) {
+                this.submitted = true;
+                clearInterval(this.flushInterval);
                 window.location.href = data.redirect_url;
             } else {
+                this.requeueAnswers(answers);
                 console.error('Submit failed:', data.error);
                 alert('Failed to submit quiz. Please try again.');
                 submitBtn.disabled = false;
                 submitBtn.textContent = 'Submit Quiz';
             }
         } catch (error) {
+            this.requeueAnswers(answers);
             console.error('Error submitting quiz:', error);
             alert('Failed to submit quiz. Please try again.');
             submitBtn.disabled = false;
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Rebuild the analytics rollups and skill ratings from existing answers.
+
+Run once after upgrading, or any time the rollups are suspected to be
+out of date. With --check, compare rollup-backed summaries with the raw
+answer joins for every user instead of rebuilding.
+
+Usage:
+    python scripts/backfill_analytics.py [--user-id ID]
+    python scripts/backfill_analytics.py --check [--days 30]
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.models import User
+from app.services.rollups import RollupService
+from app.services.skill_ratings import SkillRatingService
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild or verify analytics rollups and ratings')
+    parser.add_argument('--user-id', type=int, help='only this user (default: everyone)')
+    parser.add_argument('--check', action='store_true', help='verify instead of rebuilding')
+    parser.add_argument('--days', type=int, default=7, help='window used by --check')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        service = RollupService()
+
+        if not args.check:
+            rows = service.rebuild(user_id=args.user_id)
+            print(f"Rebuilt {rows} rollup rows")
+            replayed = SkillRatingService().rebuild(user_id=args.user_id)
+            print(f"Rebuilt skill ratings from {replayed} submissions")
+            return
+
+        users = User.query.order_by(User.id)
+        if args.user_id:
+            users = users.filter_by(id=args.user_id)
+
+        mismatched = 0
+        for user in users:
+            sections = service.check_consistency(user.id, days=args.days)
+            if sections:
+                mismatched += 1
+                print(f"{user.email}: mismatch in {', '.join(sections)}")
+
+        if mismatched:
+            print(f"{mismatched} user(s) inconsistent; run without --check to rebuild")
+            sys.exit(1)
+        print("Rollups consistent with raw answers")
+
+
+if __name__ == '__main__':
+    main()
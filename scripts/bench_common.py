@@ -0,0 +1,161 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Builds an in-memory app seeded with synthetic quiz history and counts
+the SQL statements issued while a block runs.
+"""
+import math
+import os
+import sys
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert
+
+from app import create_app
+from app.extensions import db
+from app.models import User, Quiz, Question, Submission, Answer
+from app.models.question import CATEGORIES, DIFFICULTIES
+
+
+class BenchConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SECRET_KEY = 'bench-secret'
+    ANTHROPIC_API_KEY = 'bench-key'
+    QUIZ_TIME_LIMIT_SECONDS = 360
+
+
+def make_app(config_class=BenchConfig):
+    """Create an app bound to a fresh in-memory database"""
+    return create_app(config_class)
+
+
+def seed_history(users: int = 1, days: int = 365, questions_per_quiz: int = 10,
+                 completion_rate: float = 0.9, seed: int = 0) -> list:
+    """Seed one quiz per day for the past `days` days and submissions for
+    `users` users. Must be called inside an app context.
+
+    Returns the list of created user ids.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+
+    user_ids = []
+    for i in range(users):
+        user = User(google_id=f'bench-{i}', email=f'bench{i}@example.com', name=f'Bench {i}')
+        db.session.add(user)
+        db.session.flush()
+        user_ids.append(user.id)
+
+    quiz_rows = [
+        {'quiz_date': today - timedelta(days=d), 'passage': f'Synthetic passage {d}',
+         'status': 'active', 'notification_sent': True}
+        for d in range(days)
+    ]
+    db.session.execute(insert(Quiz), quiz_rows)
+    quizzes = db.session.query(Quiz.id, Quiz.quiz_date).all()
+
+    question_rows = []
+    for quiz_id, _ in quizzes:
+        for n in range(1, questions_per_quiz + 1):
+            question_rows.append({
+                'quiz_id': quiz_id,
+                'question_number': n,
+                'question_text': f'Question {n}?',
+                'option_a': 'A', 'option_b': 'B', 'option_c': 'C', 'option_d': 'D',
+                'correct_answer': rng.choice('ABCD'),
+                'explanation': 'Synthetic',
+                'category': rng.choice(CATEGORIES),
+                'difficulty': rng.choice(DIFFICULTIES)
+            })
+    db.session.execute(insert(Question), question_rows)
+
+    questions_by_quiz = {}
+    for qid, quiz_id, correct in db.session.query(
+            Question.id, Question.quiz_id, Question.correct_answer):
+        questions_by_quiz.setdefault(quiz_id, []).append((qid, correct))
+
+    submission_rows = []
+    for user_id in user_ids:
+        for quiz_id, quiz_date in quizzes:
+            if rng.random() > completion_rate:
+                continue
+            started = datetime.combine(quiz_date, datetime.min.time()) + timedelta(hours=8)
+            submission_rows.append({
+                'user_id': user_id,
+                'quiz_id': quiz_id,
+                'started_at': started,
+                'submitted_at': started + timedelta(minutes=5),
+                'total_time_seconds': rng.randint(120, 360),
+                'score': 0,
+                'completed': True
+            })
+    db.session.execute(insert(Submission), submission_rows)
+
+    answer_rows = []
+    scores = {}
+    for sub_id, quiz_id in db.session.query(Submission.id, Submission.quiz_id):
+        for qid, correct in questions_by_quiz[quiz_id]:
+            selected = correct if rng.random() < 0.6 else rng.choice('ABCD')
+            is_correct = selected == correct
+            scores[sub_id] = scores.get(sub_id, 0) + int(is_correct)
+            answer_rows.append({
+                'submission_id': sub_id,
+                'question_id': qid,
+                'selected_answer': selected,
+                'is_correct': is_correct,
+                'time_spent_seconds': rng.randint(5, 90)
+            })
+    db.session.execute(insert(Answer), answer_rows)
+    db.session.execute(
+        Submission.__table__.update()
+        .where(Submission.__table__.c.id == db.bindparam('sid'))
+        .values(score=db.bindparam('new_score'), correct_count=db.bindparam('new_score'),
+                answered_count=questions_per_quiz),
+        [{'sid': sid, 'new_score': score} for sid, score in scores.items()]
+    )
+    db.session.commit()
+
+    return user_ids
+
+
+@contextmanager
+def count_queries():
+    """Count SQL statements executed on db.engine inside the block.
+
+    Yields a list that is filled with the executed statements.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def timed(fn, repeat: int = 5):
+    """Run fn `repeat` times, return (best seconds, last result)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank percentile: the smallest sample with at least pct
+    percent of the samples at or below it"""
+    ordered = sorted(samples)
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Benchmark AnalyticsService.get_performance_summary() against the
+per-section queries it replaced.
+
+With --users N, also compares a per-user summary loop with the cohort
+batch API for N users.
+
+Usage:
+    python scripts/benchmark_analytics.py --days 3000 --window 3650
+    python scripts/benchmark_analytics.py --days 90 --window 30 --users 200
+"""
+import argparse
+
+from bench_common import make_app, seed_history, count_queries, timed
+
+from app.services.analytics import AnalyticsService
+
+
+def per_section_summary(service):
+    """The previous implementation: one query per section"""
+    return {
+        'category_performance': service.get_category_performance(),
+        'difficulty_performance': service.get_difficulty_performance(),
+        'weak_areas': service.get_weak_areas(),
+        'time_struggles': service.get_time_struggles(),
+        'recent_trends': service.get_recent_trends(),
+        'overall_stats': service.get_overall_stats()
+    }
+
+
+def benchmark_cohort(user_ids, args):
+    def per_user():
+        return {
+            user_id: AnalyticsService(user_id, days=args.window).get_performance_summary(use_cache=False)
+            for user_id in user_ids
+        }
+
+    def batch():
+        return AnalyticsService.get_all_performance_summaries(days=args.window)
+
+    for name, fn in [('per-user', per_user), ('batch', batch)]:
+        with count_queries() as statements:
+            fn()
+        seconds, _ = timed(fn, args.repeat)
+        print(f"{name:<12} users={len(user_ids)} queries={len(statements):<4} best={seconds * 1000:.1f} ms")
+
+    print(f"results match: {per_user() == batch()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, default=3000, help='days of synthetic history')
+    parser.add_argument('--window', type=int, default=3650, help='analytics window in days')
+    parser.add_argument('--users', type=int, default=1, help='cohort size')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        user_ids = seed_history(users=args.users, days=args.days)
+        if args.users > 1:
+            benchmark_cohort(user_ids, args)
+            return
+
+        service = AnalyticsService(user_ids[0], days=args.window)
+
+        for name, fn in [
+            ('per-section', lambda: per_section_summary(service)),
+            ('fused', lambda: service.get_performance_summary(use_cache=False)),
+            ('cached', service.get_performance_summary),
+        ]:
+            with count_queries() as statements:
+                fn()
+            seconds, _ = timed(fn, args.repeat)
+            print(f"{name:<12} queries={len(statements):<3} best={seconds * 1000:.1f} ms")
+
+        same = per_section_summary(service) == service.get_performance_summary(use_cache=False)
+        print(f"results match: {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Benchmark per-user quiz generation with a stand-in Claude client that
+sleeps for a fixed latency (and fails a share of calls), comparing one
+worker against a thread pool.
+
+Usage:
+    python scripts/benchmark_personal_generation.py --users 200 --latency 0.5 --workers 16
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import date
+from types import SimpleNamespace
+
+from bench_common import make_app, seed_history
+
+from app.extensions import db
+from app.models import Quiz
+from app.services.claude_client import TokenBucket
+from app.services.personal_quizzes import PersonalQuizService
+from app.services.quiz_generator import QuizGeneratorService
+
+
+def _quiz_text():
+    return json.dumps({
+        'passage': 'Synthetic passage',
+        'questions': [
+            {'number': i, 'text': f'Question {i}?',
+             'options': {'A': 'One', 'B': 'Two', 'C': 'Three', 'D': 'Four'},
+             'correct': 'A', 'explanation': 'Synthetic',
+             'category': 'Legal Reasoning', 'difficulty': 'medium'}
+            for i in range(1, 11)
+        ]
+    })
+
+
+class SlowClient:
+    """Sleeps `latency` seconds per call; fails `failure_rate` of calls"""
+
+    def __init__(self, latency, failure_rate, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.text = _quiz_text()
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.messages = self
+
+    def create(self, **kwargs):
+        time.sleep(self.latency)
+        with self.lock:
+            self.calls += 1
+            fail = self.rng.random() < self.failure_rate
+        if fail:
+            raise ValueError('synthetic malformed response')
+        usage = SimpleNamespace(input_tokens=0, output_tokens=0,
+                                cache_creation_input_tokens=0, cache_read_input_tokens=0)
+        return SimpleNamespace(content=[SimpleNamespace(text=self.text)], usage=usage)
+
+
+def run(args, workers):
+    client = SlowClient(args.latency, args.failure_rate)
+    service = PersonalQuizService(
+        max_workers=workers,
+        generator=QuizGeneratorService(client=client),
+        limiter=TokenBucket.per_minute(args.rpm),
+        sleep=lambda seconds: None
+    )
+    started = time.perf_counter()
+    results = service.generate(date.today())
+    elapsed = time.perf_counter() - started
+
+    Quiz.query.filter(Quiz.user_id.isnot(None)).delete()
+    db.session.commit()
+    return elapsed, results, client.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent per-user generation')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds per fake Claude call')
+    parser.add_argument('--failure-rate', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--rpm', type=int, default=100000, help='rate limit, requests per minute')
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        seed_history(users=args.users, days=14)
+
+        for workers in (1, args.workers):
+            elapsed, results, calls = run(args, workers)
+            ok = sum(1 for r in results if r.ok)
+            print(f"{workers:3d} worker(s): {elapsed:7.2f}s for {len(results)} users "
+                  f"({ok} ok, {calls} calls, {len(results) / elapsed * 60:.0f} quizzes/min)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+Benchmark question bank assembly against picking questions with SQL.
+
+Seeds --questions synthetic questions (10 per passage), then measures
+the one-off index load, incremental sync after a new quiz, and quiz
+assembly latency with a user's history, preferred categories and topic
+keywords.
+
+Usage:
+    python scripts/benchmark_question_bank.py --questions 100000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert, func
+
+from bench_common import make_app, percentile
+
+from app.extensions import db
+from app.models import User, Quiz, Question, Submission
+from app.models.question import CATEGORIES, DIFFICULTIES
+from app.services.question_bank import QuestionBank
+
+TOPICS = ['contract', 'tort', 'constitution', 'environment', 'trademark', 'copyright', 'criminal',
+          'evidence', 'arbitration', 'taxation', 'election', 'privacy', 'labour', 'property']
+
+
+def seed(questions: int, rng):
+    quizzes = questions // 10
+    today = date.today()
+    db.session.execute(insert(Quiz), [
+        {'quiz_date': today - timedelta(days=i), 'passage': ' '.join(rng.choices(TOPICS, k=60)),
+         'status': 'active', 'kind': 'daily'}
+        for i in range(quizzes)
+    ])
+    quiz_ids = [row[0] for row in db.session.query(Quiz.id)]
+    db.session.execute(insert(Question), [
+        {'quiz_id': quiz_id, 'question_number': n, 'question_text': f'Which {rng.choice(TOPICS)} rule applies?',
+         'option_a': 'A', 'option_b': 'B', 'option_c': 'C', 'option_d': 'D', 'correct_answer': 'A',
+         'explanation': 'Synthetic', 'category': rng.choice(CATEGORIES), 'difficulty': rng.choice(DIFFICULTIES)}
+        for quiz_id in quiz_ids for n in range(1, 11)
+    ])
+    user = User(google_id='bench', email='bench@example.com', name='Bench')
+    db.session.add(user)
+    db.session.flush()
+    db.session.execute(insert(Submission), [
+        {'user_id': user.id, 'quiz_id': quiz_id, 'completed': True}
+        for quiz_id in rng.sample(quiz_ids, min(len(quiz_ids), 365))
+    ])
+    db.session.commit()
+    return user.id, quiz_ids
+
+
+def sql_pick(user_id, categories, count=10):
+    """Unseen questions in the preferred categories, picked at random by SQL"""
+    seen = db.session.query(Submission.quiz_id).filter(Submission.user_id == user_id)
+    return [row[0] for row in db.session.query(Question.id).filter(
+        Question.category.in_(categories), Question.source_question_id.is_(None),
+        ~Question.quiz_id.in_(seen)
+    ).order_by(func.random()).limit(count)]
+
+
+def percentiles(samples):
+    return statistics.median(samples), percentile(samples, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark question bank assembly')
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    app = make_app()
+    with app.app_context():
+        user_id, quiz_ids = seed(args.questions, rng)
+
+        bank = QuestionBank()
+        started = time.perf_counter()
+        bank.sync()
+        load = time.perf_counter() - started
+        print(f"Indexed {bank.stats()['questions']} questions, {bank.stats()['keywords']} keywords "
+              f"in {load:.2f}s")
+
+        bank_times, sql_times = [], []
+        for i in range(args.repeat):
+            categories = rng.sample(CATEGORIES, 2)
+            keywords = ' '.join(rng.sample(TOPICS, 2))
+
+            started = time.perf_counter()
+            ids = bank.assemble(user_id=user_id, categories=categories, keywords=keywords, seed=i)
+            bank_times.append(time.perf_counter() - started)
+            assert len(ids) == 10
+
+            started = time.perf_counter()
+            sql_pick(user_id, categories)
+            sql_times.append(time.perf_counter() - started)
+
+        for label, samples in (('question bank', bank_times), ('SQL ORDER BY random()', sql_times)):
+            p50, p95 = percentiles(samples)
+            print(f"{label:22s} p50 {p50 * 1000:7.2f} ms   p95 {p95 * 1000:7.2f} ms")
+
+        db.session.execute(insert(Question), [
+            {'quiz_id': quiz_ids[0], 'question_number': 11, 'question_text': 'Incremental question?',
+             'option_a': 'A', 'option_b': 'B', 'option_c': 'C', 'option_d': 'D', 'correct_answer': 'A',
+             'explanation': 'Synthetic', 'category': CATEGORIES[0], 'difficulty': DIFFICULTIES[0]}
+        ])
+        db.session.commit()
+        started = time.perf_counter()
+        added = bank.sync()
+        print(f"Incremental sync of {added} new question: {(time.perf_counter() - started) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Benchmark sharded quiz generation against the single-request path with a
+stand-in Claude client whose latency grows with the output it writes.
+
+Each fake call sleeps --first-token seconds plus --per-token seconds for
+every output token (estimated at 4 characters per token), so a request
+writing the passage and all ten questions takes as long as its output.
+
+Usage:
+    python scripts/benchmark_sharded_generation.py --first-token 0.5 --per-token 0.005
+"""
+import argparse
+import json
+import re
+import statistics
+import threading
+import time
+from types import SimpleNamespace
+
+from bench_common import make_app
+
+from app.extensions import db
+from app.models import Quiz, Question
+from app.services.quiz_generator import QuizGeneratorService
+
+PASSAGE = ' '.join(['The doctrine of promissory estoppel restrains a promisor from resiling.'] * 40)
+EXPLANATION = ' '.join(['The passage states the rule and the facts satisfy each element.'] * 6)
+
+
+def _question(number):
+    return {'number': number, 'text': f'Which conclusion follows from the passage in case {number}?',
+            'options': {'A': 'The promise binds', 'B': 'The promise fails', 'C': 'Neither', 'D': 'Both'},
+            'correct': 'A', 'explanation': EXPLANATION, 'category': 'Legal Reasoning', 'difficulty': 'medium'}
+
+
+class DelayedClient:
+    """Answers single, passage-only and shard prompts after a delay
+    proportional to the response length"""
+
+    def __init__(self, first_token, per_token):
+        self.first_token = first_token
+        self.per_token = per_token
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.messages = self
+
+    def create(self, **kwargs):
+        content = kwargs['messages'][0]['content']
+        prompt = content if isinstance(content, str) else ''.join(block['text'] for block in content)
+        if 'Write ONLY the passage' in prompt:
+            data = {'passage': PASSAGE}
+        else:
+            match = re.search(r'Write ONLY questions ([\d, ]+)', prompt)
+            slots = [int(n) for n in match.group(1).split(', ')] if match else range(1, 11)
+            data = {'questions': [_question(n) for n in slots]}
+            if not match:
+                data['passage'] = PASSAGE
+        text = json.dumps(data)
+        output_tokens = len(text) // 4
+        time.sleep(self.first_token + self.per_token * output_tokens)
+        with self.lock:
+            self.calls += 1
+        usage = SimpleNamespace(input_tokens=2000, output_tokens=output_tokens,
+                                cache_creation_input_tokens=0, cache_read_input_tokens=0)
+        return SimpleNamespace(content=[SimpleNamespace(text=text)], usage=usage)
+
+
+def run(client, shards, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        QuizGeneratorService(client=client).generate_daily_quiz(stream=False, shards=shards)
+        samples.append(time.perf_counter() - started)
+        Question.query.delete()
+        Quiz.query.delete()
+        db.session.commit()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sharded versus single-request generation')
+    parser.add_argument('--first-token', type=float, default=0.5, help='seconds before output starts')
+    parser.add_argument('--per-token', type=float, default=0.005, help='seconds per output token')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    app = make_app()
+    # Every run writes the same passage; do not regenerate it as a repeat
+    app.config['TOPIC_DUPLICATE_RETRIES'] = 0
+    with app.app_context():
+        db.create_all()
+        for shards in (1, 2, 3):
+            client = DelayedClient(args.first_token, args.per_token)
+            samples = run(client, shards, args.repeat)
+            label = 'single request' if shards == 1 else f'{shards} shards'
+            print(f"{label:<15} median {statistics.median(samples):6.2f}s, "
+                  f"max {max(samples):6.2f}s ({client.calls // args.repeat} calls per quiz)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Benchmark SkillEstimator (one query + NumPy) against computing the same
+window and difficulty-curve signals with per-window SQL aggregates.
+
+Usage:
+    python scripts/benchmark_skill_estimator.py --days 365
+"""
+import argparse
+from datetime import date, timedelta
+
+from sqlalchemy import func
+
+from bench_common import make_app, seed_history, count_queries, timed
+
+from app.extensions import db
+from app.models import Quiz, Question, Submission, Answer
+from app.services.analytics import AnalyticsService
+from app.services.skill_estimator import SkillEstimator
+
+
+def sql_signals(user_id, bucket_days=7):
+    """Window accuracy and weekly difficulty curves through the SQL path"""
+    signals = {
+        f'{days}d': AnalyticsService(user_id, days, source='raw').get_category_performance()
+        for days in SkillEstimator.WINDOWS
+    }
+
+    today = date.today()
+    horizon = max(SkillEstimator.WINDOWS)
+    curves = []
+    for end_age in range(0, horizon + 1, bucket_days):
+        end = today - timedelta(days=end_age)
+        start = end - timedelta(days=bucket_days)
+        curves.append(db.session.query(
+            Question.difficulty,
+            func.count(Answer.id),
+            func.sum(func.cast(Answer.is_correct, db.Integer))
+        ).join(
+            Answer, Answer.question_id == Question.id
+        ).join(
+            Submission, Submission.id == Answer.submission_id
+        ).join(
+            Quiz, Quiz.id == Question.quiz_id
+        ).filter(
+            Submission.user_id == user_id,
+            Submission.completed == True,
+            Quiz.quiz_date > start,
+            Quiz.quiz_date <= end
+        ).group_by(Question.difficulty).all())
+    signals['curves'] = curves
+    return signals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark vectorized skill estimation')
+    parser.add_argument('--days', type=int, default=365, help='days of synthetic history')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        [user_id] = seed_history(users=1, days=args.days)
+        estimator = SkillEstimator(user_id)
+
+        for name, fn in [
+            ('sql', lambda: sql_signals(user_id)),
+            ('numpy', estimator.estimate),
+        ]:
+            with count_queries() as statements:
+                fn()
+            seconds, _ = timed(fn, args.repeat)
+            print(f"{name:<6} queries={len(statements):<3} best={seconds * 1000:.1f} ms")
+
+        history = estimator.load_history()
+        seconds, _ = timed(lambda: estimator.estimate(history), args.repeat)
+        print(f"numpy compute only ({len(history['category'])} answers): {seconds * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
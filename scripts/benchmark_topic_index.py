@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Benchmark near-duplicate checks of a new passage against the history.
+
+Seeds --passages synthetic passages, then measures the one-off index
+load and the latency of checking a new passage against all of them.
+
+Usage:
+    python scripts/benchmark_topic_index.py --passages 10000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+from bench_common import make_app, percentile
+
+from app.extensions import db
+from app.models import Quiz
+from app.services.topic_index import TopicIndex
+
+WORDS = ['contract', 'tort', 'constitution', 'environment', 'trademark', 'copyright', 'criminal',
+         'evidence', 'arbitration', 'taxation', 'election', 'privacy', 'labour', 'property',
+         'negligence', 'consideration', 'federalism', 'judicial', 'review', 'parliament', 'amendment',
+         'liability', 'damages', 'injunction', 'statute', 'precedent', 'tribunal', 'sovereignty']
+
+
+def passage(rng):
+    return ' '.join(rng.choices(WORDS, k=8)) + ' ' + ' '.join(
+        f'term{rng.randrange(5000)}' for _ in range(150))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark topic index duplicate checks')
+    parser.add_argument('--passages', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    app = make_app()
+    with app.app_context():
+        today = date.today()
+        db.session.execute(insert(Quiz), [
+            {'quiz_date': today - timedelta(days=i), 'passage': passage(rng), 'status': 'active', 'kind': 'daily'}
+            for i in range(args.passages)
+        ])
+        db.session.commit()
+
+        index = TopicIndex()
+        started = time.perf_counter()
+        index.sync()
+        print(f"Indexed {len(index)} passages in {time.perf_counter() - started:.2f}s")
+
+        samples = []
+        for _ in range(args.repeat):
+            text = passage(rng)
+            started = time.perf_counter()
+            index.find_duplicate(text, threshold=0.25)
+            samples.append(time.perf_counter() - started)
+
+        p50, p95 = statistics.median(samples), percentile(samples, 95)
+        print(f"find_duplicate p50 {p50 * 1000:.3f} ms   p95 {p95 * 1000:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Generate a personal, adaptive quiz for every user.
+
+Claude calls run concurrently (--workers) under a shared client-side rate
+limit (CLAUDE_REQUESTS_PER_MINUTE), retrying transient failures. Users
+who already have a quiz for the date are skipped, so a failed run can
+simply be repeated.
+
+Usage:
+    python scripts/generate_personal_quizzes.py [--date YYYY-MM-DD] [--workers 8] [--user-id ID ...]
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.services.personal_quizzes import PersonalQuizService
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate per-user quizzes')
+    parser.add_argument('--date', type=date.fromisoformat, help='quiz date (default: today)')
+    parser.add_argument('--workers', type=int, help='concurrent Claude calls (default: PERSONAL_QUIZ_WORKERS)')
+    parser.add_argument('--user-id', type=int, nargs='+', help='only these users (default: everyone)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        quiz_date = args.date or date.today()
+        service = PersonalQuizService(max_workers=args.workers)
+
+        started = time.monotonic()
+        status = 'pending' if quiz_date > date.today() else 'active'
+        results = service.generate(quiz_date, user_ids=args.user_id, status=status)
+        elapsed = time.monotonic() - started
+
+        for result in results:
+            if not result.ok:
+                print(f"user {result.user_id}: FAILED after {result.attempts} attempt(s): {result.error}")
+
+        generated = [r for r in results if r.ok and not r.skipped]
+        failed = [r for r in results if not r.ok]
+        skipped = [r for r in results if r.skipped]
+        retries = sum(max(0, r.attempts - 1) for r in results)
+        rate = len(generated) / elapsed * 60 if elapsed else 0
+        print(f"{quiz_date}: {len(generated)} generated, {len(skipped)} already had a quiz, "
+              f"{len(failed)} failed, {retries} retries")
+        print(f"{elapsed:.1f}s total, {rate:.1f} quizzes/min, "
+              f"{service.limiter.waited:.1f}s spent waiting on the rate limit")
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
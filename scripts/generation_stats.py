@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Generation Telemetry Report
+Prints p50/p95 generation latency per phase and mean token usage per day
+or week, from the generation_telemetry table.
+
+Usage:
+    python scripts/generation_stats.py                  # last 30 days, per day
+    python scripts/generation_stats.py --bucket week --days 90
+    python scripts/generation_stats.py --kind personal --json
+"""
+import os
+import sys
+import argparse
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize quiz generation telemetry')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--bucket', choices=['day', 'week'], default='day')
+    parser.add_argument('--kind', choices=['daily', 'personal', 'pregenerate'])
+    parser.add_argument('--json', action='store_true', help='print the raw summary as JSON')
+    args = parser.parse_args()
+
+    from app import create_app
+    from app.services.telemetry import TelemetryService
+
+    app = create_app()
+    with app.app_context():
+        periods = TelemetryService().summary(days=args.days, bucket=args.bucket, kind=args.kind)
+
+    if args.json:
+        print(json.dumps(periods, indent=2))
+        return
+    if not periods:
+        print("No generation telemetry recorded")
+        return
+
+    print(f"{'Period':<12} {'Runs':>5} {'Failed':>6} {'Total p50/p95':>15} {'API p50/p95':>15} "
+          f"{'In tok':>8} {'Out tok':>8} {'Retries':>8} {'Est/act':>8}")
+    print("-" * 94)
+    for period in periods:
+        total, api = period['seconds']['total'], period['seconds']['api']
+        print(f"{period['period']:<12} {period['runs']:>5} {period['outcomes'].get('failed', 0):>6} "
+              f"{total['p50']:>6.1f}s/{total['p95']:>6.1f}s {api['p50']:>6.1f}s/{api['p95']:>6.1f}s "
+              f"{period['mean_input_tokens']:>8.0f} {period['mean_output_tokens']:>8.0f} "
+              f"{period['mean_retries']:>8.2f} {period['estimate_ratio'] or 0:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Generate quizzes for the next few days ahead of time.
+
+Quizzes are stored as pending and activated on their date by
+generate_quiz.py (or the first request for that day's quiz), so the
+morning run no longer waits on the Claude API. Run it from cron a few
+times a week, e.g. in the evening:
+
+    0 15 * * * cd /path/to/daily-quiz-agent && /path/to/venv/bin/python scripts/pregenerate_quizzes.py
+
+Usage:
+    python scripts/pregenerate_quizzes.py [--days 3] [--workers 3] [--user-id ID]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.services.pregeneration import PregenerationService
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-generate quizzes for upcoming dates')
+    parser.add_argument('--days', type=int, default=3, help='number of dates, starting tomorrow')
+    parser.add_argument('--workers', type=int, default=3, help='concurrent Claude calls')
+    parser.add_argument('--user-id', type=int, help='adapt to this user (default: the adaptive user)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        service = PregenerationService(max_workers=args.workers)
+        user_id = args.user_id
+        if user_id is None:
+            user = service.generator.pick_adaptive_user()
+            user_id = user.id if user else None
+
+        started = time.monotonic()
+        results = service.pregenerate(days=args.days, user_id=user_id)
+        elapsed = time.monotonic() - started
+
+        for result in results:
+            if result.skipped:
+                status = f"exists (quiz {result.quiz_id})"
+            elif result.ok:
+                status = f"pending quiz {result.quiz_id}"
+            else:
+                status = f"FAILED: {result.error}"
+            print(f"{result.quiz_date}  {result.seconds:6.1f}s  {status}")
+
+        generated = [r for r in results if r.ok and not r.skipped]
+        failed = [r for r in results if not r.ok]
+        sequential = sum(r.seconds for r in results if not r.skipped)
+        print(f"{len(generated)} generated, {len(failed)} failed in {elapsed:.1f}s "
+              f"(sum of call times {sequential:.1f}s)")
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Export quizzes to, or import them from, a JSONL archive.
+
+Files ending in .gz are compressed. Export streams the database in
+batches and import writes with multi-row INSERTs, so archives of any size
+move in constant memory. Run scripts/backfill_analytics.py after
+importing submissions.
+
+Usage:
+    python scripts/quiz_archive.py export quizzes.jsonl.gz [--submissions] [--since 2024-01-01]
+    python scripts/quiz_archive.py import quizzes.jsonl.gz
+"""
+import os
+import sys
+import argparse
+import gzip
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app
+from app.services.quiz_archive import BATCH_SIZE, QuizArchiveService
+
+
+def open_archive(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export or import quizzes as JSONL')
+    parser.add_argument('action', choices=['export', 'import'])
+    parser.add_argument('path', help='archive file (.jsonl or .jsonl.gz)')
+    parser.add_argument('--submissions', action='store_true', help='export submissions and answers too')
+    parser.add_argument('--since', type=date.fromisoformat, help='export quizzes from this date on')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        service = QuizArchiveService(batch_size=args.batch_size)
+        if args.action == 'export':
+            with open_archive(args.path, 'w') as out:
+                stats = service.export(out, submissions=args.submissions, since=args.since)
+            print(f"Exported {stats.summary()}")
+        else:
+            with open_archive(args.path, 'r') as lines:
+                stats = service.import_(lines)
+            print(f"Imported {stats.summary()}")
+            if stats.counts['submissions']:
+                print("Run scripts/backfill_analytics.py to rebuild rollups and skill ratings")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Quiz Scheduler Daemon
+Generates the daily quiz at QUIZ_GENERATION_TIME_IST from a long-lived
+process, replacing the cron job. Run it under systemd
+(deploy/quiz-scheduler.service).
+
+Usage:
+    python scripts/quiz_scheduler.py            # run until stopped
+    python scripts/quiz_scheduler.py --status   # next and last run timings
+    python scripts/quiz_scheduler.py --run-now  # one run for today, with retries
+"""
+import os
+import sys
+import argparse
+import json
+import logging
+import signal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the daily quiz scheduler')
+    parser.add_argument('--status', action='store_true', help='print the running scheduler\'s status')
+    parser.add_argument('--run-now', action='store_true', help='run today\'s job once and exit')
+    args = parser.parse_args()
+
+    from app.config import Config
+    from app.services.scheduler import QuizScheduler, read_status
+
+    if args.status:
+        status = read_status(Config.SCHEDULER_STATUS_PATH)
+        if status is None:
+            print(f"No scheduler status at {Config.SCHEDULER_STATUS_PATH}")
+            sys.exit(1)
+        print(json.dumps(status, indent=2))
+        return
+
+    from app import create_app
+
+    app = create_app()
+    scheduler = QuizScheduler(app)
+
+    if args.run_now:
+        record = scheduler.run(scheduler.today())
+        sys.exit(0 if record['ok'] else 1)
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: scheduler.stop())
+    scheduler.run_forever()
+
+
+if __name__ == '__main__':
+    main()
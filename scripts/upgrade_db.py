@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""
+Create missing tables and upgrade the schema of an existing database.
+
+Run once before starting the app's processes (deploy/quiz.service does so
+with ExecStartPre), which then start with SCHEMA_UPGRADE_ON_START=false.
+
+Usage:
+    python scripts/upgrade_db.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Upgrade explicitly below, to report what was done
+os.environ['SCHEMA_UPGRADE_ON_START'] = 'false'
+
+from app import create_app
+from app.migrations import upgrade_database
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        created = upgrade_database()
+    if created:
+        print(f"Created indexes: {', '.join(created)}")
+    print("Schema is up to date")
+
+
+if __name__ == '__main__':
+    main()
@@ -131,3 +131,86 @@ def test_get_overall_stats(app, sample_data):
         stats = service.get_overall_stats()
 
         assert stats['quizzes_taken'] == 1
+
+
+def test_performance_summary_matches_individual_methods(app, sample_data):
+    """Test fused summary agrees with the per-section queries"""
+    with app.app_context():
+        user = User.query.first()
+        service = AnalyticsService(user.id)
+        summary = service.get_performance_summary()
+
+        assert summary['category_performance'] == service.get_category_performance()
+        assert summary['difficulty_performance'] == service.get_difficulty_performance()
+        assert summary['weak_areas'] == service.get_weak_areas()
+        assert summary['time_struggles'] == service.get_time_struggles()
+        assert summary['recent_trends'] == service.get_recent_trends()
+        assert summary['overall_stats'] == service.get_overall_stats()
+
+
+def test_performance_summary_single_query(app, sample_data):
+    """Test fused summary issues one query"""
+    from sqlalchemy import event
+
+    with app.app_context():
+        user = User.query.first()
+        service = AnalyticsService(user.id)
+
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            service.get_performance_summary(use_cache=False)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        assert len(statements) == 1
+
+
+def test_skill_estimator_from_history(app, sample_data):
+    """Test skill signals computed from the stored answers"""
+    from app.services.skill_estimator import SkillEstimator
+
+    with app.app_context():
+        user = User.query.first()
+        signals = SkillEstimator(user.id).estimate()
+
+        assert signals['answers'] == 3
+        assert signals['window_accuracy']['7d']['Constitutional Law'] == 100.0
+        assert signals['window_accuracy']['90d']['Logical Reasoning'] == 0.0
+        assert signals['ewma_seconds']['Legal Reasoning'] == 30.0
+        assert signals['difficulty_curves']['medium'][-1] == 66.7
+
+
+def test_skill_estimator_matches_naive_loop(app):
+    """Test vectorized windows and EWMA against a plain Python computation"""
+    import random
+    import numpy as np
+    from app.models.question import CATEGORIES
+    from app.services.skill_estimator import SkillEstimator
+
+    rng = random.Random(7)
+    n = 400
+    history = {
+        'age_days': np.array(sorted((rng.randint(0, 90) for _ in range(n)), reverse=True), dtype=float),
+        'category': np.array([rng.randrange(len(CATEGORIES)) for _ in range(n)]),
+        'difficulty': np.array([rng.randrange(3) for _ in range(n)]),
+        'correct': np.array([float(rng.random() < 0.6) for _ in range(n)]),
+        'seconds': np.array([rng.choice([np.nan, rng.randint(5, 90)]) for _ in range(n)])
+    }
+    estimator = SkillEstimator(1)
+    signals = estimator.estimate(history)
+
+    for c, category in enumerate(CATEGORIES):
+        rows = [i for i in range(n) if history['category'][i] == c]
+
+        in_window = [i for i in rows if history['age_days'][i] <= 30]
+        expected = sum(history['correct'][i] for i in in_window) / len(in_window) * 100
+        assert signals['window_accuracy']['30d'][category] == round(expected, 1)
+
+        weights = [(1 - estimator.alpha) ** (len(rows) - 1 - k) for k in range(len(rows))]
+        expected = sum(w * history['correct'][i] for w, i in zip(weights, rows)) / sum(weights) * 100
+        assert signals['ewma_accuracy'][category] == round(expected, 1)
@@ -0,0 +1,288 @@
+"""
+Tests for batched answer saves
+"""
+import random
+import pytest
+from datetime import date
+from sqlalchemy import event
+from app import create_app
+from app.extensions import db
+from app.models import User, Quiz, Question, Submission, Answer
+from app.migrations import upgrade_schema
+from app.services.answer_keys import get_answer_keys
+from app.services.submission_state import get_submission_states
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SECRET_KEY = 'test-secret'
+    GOOGLE_CLIENT_ID = 'test'
+    GOOGLE_CLIENT_SECRET = 'test'
+    QUIZ_TIME_LIMIT_SECONDS = 360
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def user(app):
+    user = User(google_id='test123', email='test@example.com', name='Test User')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user.id)
+    return client
+
+
+def _make_quiz(quiz_date=None):
+    quiz = Quiz(quiz_date=quiz_date or date.today(), passage='Test passage content')
+    db.session.add(quiz)
+    db.session.flush()
+    for i in range(1, 11):
+        db.session.add(Question(quiz_id=quiz.id, question_number=i, question_text=f'Question {i}?',
+                                option_a='A', option_b='B', option_c='C', option_d='D',
+                                correct_answer='A', explanation='Because A',
+                                category='Legal Reasoning', difficulty='easy'))
+    db.session.commit()
+    return quiz
+
+
+def _count_commits():
+    commits = []
+    event.listen(db.engine, 'commit', lambda conn: commits.append(1))
+    return commits
+
+
+def test_batch_upserts_answers_in_one_transaction(app, client):
+    """Test a batch inserts new answers, updates existing ones and commits once"""
+    quiz = _make_quiz()
+    questions = quiz.questions.all()
+    submission_id = client.post(f'/api/quiz/{quiz.id}/start').get_json()['submission_id']
+    client.post(f'/api/quiz/{quiz.id}/answers', json={
+        'submission_id': submission_id,
+        'answers': [{'question_id': questions[0].id, 'selected_answer': 'B', 'time_spent_seconds': 5}]
+    })
+
+    commits = _count_commits()
+    response = client.post(f'/api/quiz/{quiz.id}/answers', json={
+        'submission_id': submission_id,
+        'answers': [{'question_id': q.id, 'selected_answer': 'B', 'time_spent_seconds': 10} for q in questions]
+        + [{'question_id': questions[0].id, 'selected_answer': 'A', 'time_spent_seconds': 12}]
+    })
+
+    assert response.status_code == 200 and len(commits) == 1
+    assert len(response.get_json()['answer_ids']) == 10
+    assert Answer.query.count() == 10
+    first = Answer.query.filter_by(question_id=questions[0].id).one()
+    assert first.selected_answer == 'A' and first.is_correct and first.time_spent_seconds == 12
+
+
+def test_batch_rejected_whole_for_foreign_question(app, client):
+    """Test a batch with a question of another quiz saves nothing"""
+    quiz, other = _make_quiz(), _make_quiz(date(2024, 1, 1))
+    submission_id = client.post(f'/api/quiz/{quiz.id}/start').get_json()['submission_id']
+
+    response = client.post(f'/api/quiz/{quiz.id}/answers', json={
+        'submission_id': submission_id,
+        'answers': [{'question_id': quiz.questions.first().id, 'selected_answer': 'A'},
+                    {'question_id': other.questions.first().id, 'selected_answer': 'A'}]
+    })
+
+    assert response.status_code == 400
+    assert Answer.query.count() == 0
+
+
+def test_malformed_question_ids_rejected(app, client):
+    """Test question ids that are not integers are a 400, not a 500"""
+    quiz = _make_quiz()
+    submission_id = client.post(f'/api/quiz/{quiz.id}/start').get_json()['submission_id']
+
+    for question_id in ([1], {'id': 1}, True, '1'):
+        single = client.post(f'/api/quiz/{quiz.id}/answer', json={
+            'submission_id': submission_id, 'question_id': question_id, 'selected_answer': 'A'
+        })
+        batch = client.post(f'/api/quiz/{quiz.id}/answers', json={
+            'submission_id': submission_id, 'answers': [{'question_id': question_id, 'selected_answer': 'A'}]
+        })
+        assert single.status_code == 400 and batch.status_code == 400
+    assert Answer.query.count() == 0
+
+
+def test_submit_saves_buffered_answers_with_fewer_transactions(app, client):
+    """Test answers sent with the submit are scored, and the batched flow
+    commits far less often than one request per click"""
+    quiz = _make_quiz()
+    questions = quiz.questions.all()
+    clicks = [(q, 'A') for q in questions] + [(q, 'B') for q in questions[:4]]
+
+    commits = _count_commits()
+    submission_id = client.post(f'/api/quiz/{quiz.id}/start').get_json()['submission_id']
+    for question, pick in clicks:
+        client.post(f'/api/quiz/{quiz.id}/answer', json={
+            'submission_id': submission_id, 'question_id': question.id, 'selected_answer': pick
+        })
+    client.post(f'/api/quiz/{quiz.id}/submit', json={'submission_id': submission_id})
+    per_click = len(commits)
+
+    db.session.query(Answer).delete()
+    db.session.query(Submission).delete()
+    db.session.commit()
+    get_submission_states().store.clear()
+    commits.clear()
+
+    submission_id = client.post(f'/api/quiz/{quiz.id}/start').get_json()['submission_id']
+    client.post(f'/api/quiz/{quiz.id}/answers', json={
+        'submission_id': submission_id,
+        'answers': [{'question_id': q.id, 'selected_answer': pick} for q, pick in clicks[:7]]
+    })
+    response = client.post(f'/api/quiz/{quiz.id}/submit', json={
+        'submission_id': submission_id,
+        'answers': [{'question_id': q.id, 'selected_answer': pick} for q, pick in clicks[7:]]
+    })
+
+    assert response.get_json()['score'] == 6
+    assert len(commits) == 3 < per_click == 16
+
+
+def test_single_save_is_one_upsert(app, client):
+    """Test a repeated save updates the same row with one upsert (after the
+    tally update) and no question lookup once the answer key is cached"""
+    quiz = _make_quiz()
+    question = quiz.questions.first()
+    submission_id = client.post(f'/api/quiz/{quiz.id}/start').get_json()['submission_id']
+    payload = {'submission_id': submission_id, 'question_id': question.id, 'selected_answer': 'B'}
+    first = client.post(f'/api/quiz/{quiz.id}/answer', json=payload).get_json()['answer_id']
+
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+    second = client.post(f'/api/quiz/{quiz.id}/answer', json=dict(payload, selected_answer='A')).get_json()
+
+    assert second['answer_id'] == first
+    answer = Answer.query.one()
+    assert answer.selected_answer == 'A' and answer.is_correct
+    writes = [s for s in statements if not s.lstrip().upper().startswith('SELECT')]
+    assert len(writes) == 2
+    assert writes[0].startswith('UPDATE submissions') and 'ON CONFLICT' in writes[1]
+    assert not any('FROM questions' in s for s in statements)
+    assert get_answer_keys().stats()['hits'] >= 1
+
+
+def test_legacy_answers_table_gets_unique_constraint(app, user):
+    """Test upgrade_schema dedupes answers, keeping the first, and adds the constraint"""
+    quiz = _make_quiz()
+    question = quiz.questions.first()
+    submission = Submission(user_id=user.id, quiz_id=quiz.id)
+    db.session.add(submission)
+    db.session.commit()
+    db.session.execute(db.text('DROP TABLE answers'))
+    db.session.execute(db.text(
+        'CREATE TABLE answers (id INTEGER NOT NULL, submission_id INTEGER NOT NULL, question_id INTEGER NOT NULL, '
+        'selected_answer VARCHAR(1), is_correct BOOLEAN, time_spent_seconds INTEGER, PRIMARY KEY (id))'
+    ))
+    db.session.execute(db.text('CREATE INDEX ix_answers_submission_question ON answers (submission_id, question_id)'))
+    for answer_id, pick in ((1, 'A'), (2, 'B')):
+        db.session.execute(db.text(
+            'INSERT INTO answers (id, submission_id, question_id, selected_answer) VALUES (:id, :s, :q, :pick)'
+        ), {'id': answer_id, 's': submission.id, 'q': question.id, 'pick': pick})
+    db.session.commit()
+
+    upgrade_schema()
+
+    assert upgrade_schema() == []
+    assert [(a.id, a.selected_answer) for a in Answer.query.all()] == [(1, 'A')]
+    indexes = {ix['name'] for ix in db.inspect(db.engine).get_indexes('answers')}
+    assert 'ix_answers_submission_question' not in indexes
+    db.session.add(Answer(submission_id=submission.id, question_id=question.id, selected_answer='C'))
+    with pytest.raises(Exception):
+        db.session.commit()
+    db.session.rollback()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_running_tally_equals_recount(app, client, seed):
+    """Property: after any sequence of single and batched saves (re-picks,
+    cleared picks, repeated questions) and the submit, the running tally
+    equals the recounted answers"""
+    rng = random.Random(seed)
+    quiz = _make_quiz()
+    question_ids = [q.id for q in quiz.questions]
+    submission_id = client.post(f'/api/quiz/{quiz.id}/start').get_json()['submission_id']
+
+    def pick():
+        return {'question_id': rng.choice(question_ids), 'selected_answer': rng.choice(['A', 'B', 'C', None]),
+                'time_spent_seconds': rng.randint(1, 60)}
+
+    for step in range(40):
+        if rng.random() < 0.5:
+            response = client.post(f'/api/quiz/{quiz.id}/answer', json=dict(pick(), submission_id=submission_id))
+        else:
+            response = client.post(f'/api/quiz/{quiz.id}/answers', json={
+                'submission_id': submission_id, 'answers': [pick() for _ in range(rng.randint(1, 6))]
+            })
+        assert response.status_code == 200
+
+        submission = db.session.get(Submission, submission_id)
+        db.session.refresh(submission)
+        assert (submission.correct_count, submission.answered_count) == submission.recount()
+
+    response = client.post(f'/api/quiz/{quiz.id}/submit', json={
+        'submission_id': submission_id, 'answers': [pick() for _ in range(3)]
+    })
+    submission = db.session.get(Submission, submission_id)
+    db.session.refresh(submission)
+    assert (submission.correct_count, submission.answered_count) == submission.recount()
+    assert response.get_json()['score'] == submission.score == submission.correct_count
+
+    progress = client.get(f'/api/quiz/{quiz.id}/progress').get_json()
+    assert (progress['correct'], progress['answered']) == submission.recount()
+
+
+@pytest.mark.parametrize('duplicates', [False, True])
+def test_tally_backfilled_on_legacy_submissions(app, user, duplicates):
+    """Test upgrade_schema adds the tally columns filled from existing
+    answers, counted after duplicate answers are removed"""
+    quiz = _make_quiz()
+    questions = quiz.questions.all()
+    db.session.execute(db.text('DROP TABLE submissions'))
+    db.session.execute(db.text(
+        'CREATE TABLE submissions (id INTEGER NOT NULL, user_id INTEGER NOT NULL, quiz_id INTEGER NOT NULL, '
+        'started_at DATETIME, submitted_at DATETIME, total_time_seconds INTEGER, score INTEGER, '
+        'completed BOOLEAN, PRIMARY KEY (id))'
+    ))
+    db.session.execute(db.text('INSERT INTO submissions (id, user_id, quiz_id, completed) VALUES (1, :u, :q, 0)'),
+                       {'u': user.id, 'q': quiz.id})
+    picks = [(questions[0], 'A'), (questions[1], 'B'), (questions[2], None)]
+    if duplicates:
+        # A legacy answers table without the unique key, holding a second
+        # row for an answered question
+        db.session.execute(db.text('DROP TABLE answers'))
+        db.session.execute(db.text(
+            'CREATE TABLE answers (id INTEGER NOT NULL, submission_id INTEGER NOT NULL, '
+            'question_id INTEGER NOT NULL, selected_answer VARCHAR(1), is_correct BOOLEAN, '
+            'time_spent_seconds INTEGER, PRIMARY KEY (id))'
+        ))
+        picks.append((questions[1], 'A'))
+    for question, pick in picks:
+        db.session.execute(db.text(
+            'INSERT INTO answers (submission_id, question_id, selected_answer, is_correct) VALUES (1, :q, :pick, :ok)'
+        ), {'q': question.id, 'pick': pick, 'ok': pick == 'A'})
+    db.session.commit()
+
+    upgrade_schema()
+
+    submission = db.session.get(Submission, 1)
+    assert Answer.query.count() == 3
+    assert (submission.correct_count, submission.answered_count) == (1, 2) == submission.recount()
@@ -0,0 +1,226 @@
+"""
+Tests for per-user quizzes: schema, lookup, rate limiting, retries and
+the concurrent generation pipeline
+"""
+import json
+import threading
+import pytest
+from datetime import date, timedelta
+from unittest.mock import Mock
+from app import create_app
+from app.extensions import db
+from app.migrations import upgrade_schema
+from app.models import GenerationTelemetry, User, Quiz
+from app.services.claude_client import TokenBucket, call_with_retry, get_anthropic_client
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SECRET_KEY = 'test-secret'
+    GOOGLE_CLIENT_ID = 'test'
+    GOOGLE_CLIENT_SECRET = 'test'
+    ANTHROPIC_API_KEY = 'test-key'
+    QUIZ_TIME_LIMIT_SECONDS = 360
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def users(app):
+    users = [User(google_id=f'g{i}', email=f'user{i}@example.com', name=f'User {i}') for i in range(3)]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+def _quiz_text(passage='Passage'):
+    return json.dumps({
+        'passage': passage,
+        'questions': [
+            {'number': i, 'text': f'Question {i}?',
+             'options': {'A': 'One', 'B': 'Two', 'C': 'Three', 'D': 'Four'},
+             'correct': 'A', 'explanation': 'Because.',
+             'category': 'Legal Reasoning', 'difficulty': 'easy'}
+            for i in range(1, 11)
+        ]
+    })
+
+
+class FlakyClient:
+    """Stands in for anthropic.Anthropic; the first call whose prompt has
+    a flaky marker raises, later calls succeed. Broken markers always raise."""
+
+    def __init__(self, flaky_markers=(), broken_markers=()):
+        self.flaky = set(flaky_markers)
+        self.broken = set(broken_markers)
+        self.calls = []
+        self.lock = threading.Lock()
+        self.messages = self
+
+    def create(self, **kwargs):
+        prompt = json.dumps(kwargs['messages'][0]['content'])
+        with self.lock:
+            self.calls.append(prompt)
+            failing = [e for e in self.broken if e in prompt]
+            failing += [e for e in self.flaky if e in prompt]
+            self.flaky -= set(failing)
+        if failing:
+            raise ValueError('Failed to parse quiz data from Claude response')
+        return Mock(content=[Mock(text=_quiz_text())], usage=Mock(
+            input_tokens=0, output_tokens=0, cache_creation_input_tokens=0, cache_read_input_tokens=0))
+
+
+def test_token_bucket_limits_rate():
+    """Test the bucket allows a burst, then one token per 1/rate seconds"""
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2.0, capacity=2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(6):
+        bucket.acquire()
+
+    assert now[0] == pytest.approx(2.0)
+    assert bucket.waited == pytest.approx(2.0)
+
+
+def test_call_with_retry_backs_off_then_raises():
+    """Test retryable errors are retried with growing delays, others are not"""
+    delays = []
+    calls = []
+
+    def always_fails():
+        calls.append(1)
+        raise ValueError('bad json')
+
+    with pytest.raises(ValueError):
+        call_with_retry(always_fails, attempts=4, base_delay=1.0, sleep=delays.append)
+    assert len(calls) == 4
+    assert len(delays) == 3
+    assert all(0 <= d <= 2 ** i for i, d in enumerate(delays))
+
+    def type_error():
+        calls.append(1)
+        raise TypeError('bug')
+
+    calls.clear()
+    with pytest.raises(TypeError):
+        call_with_retry(type_error, attempts=4, sleep=delays.append)
+    assert len(calls) == 1
+
+
+def test_shared_client_does_not_retry(app):
+    """Test the SDK's retries are off, leaving call_with_retry (and its
+    rate limiter) as the only retry layer"""
+    assert get_anthropic_client().max_retries == 0
+
+
+def test_personal_and_shared_quizzes_coexist(app, users):
+    """Test one shared and one personal quiz per user can share a date"""
+    today = date.today()
+    db.session.add_all([
+        Quiz(quiz_date=today, passage='shared'),
+        Quiz(quiz_date=today, passage='mine', user_id=users[0].id),
+        Quiz(quiz_date=today, passage='theirs', user_id=users[1].id),
+    ])
+    db.session.commit()
+
+    db.session.add(Quiz(quiz_date=today, passage='second shared'))
+    with pytest.raises(Exception):
+        db.session.commit()
+    db.session.rollback()
+
+    assert Quiz.visible_to(users[0].id).filter(Quiz.quiz_date == today).first().passage == 'mine'
+    assert Quiz.visible_to(users[2].id).filter(Quiz.quiz_date == today).first().passage == 'shared'
+
+
+def test_routes_resolve_own_quiz(app, users):
+    """Test index and take_quiz serve the user's own quiz, not someone else's"""
+    today = date.today()
+    mine = Quiz(quiz_date=today - timedelta(days=1), passage='My passage', user_id=users[0].id)
+    theirs = Quiz(quiz_date=today, passage='Their passage', user_id=users[1].id)
+    db.session.add_all([mine, theirs])
+    db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(users[0].id)
+
+    response = client.get('/')
+    assert response.headers['Location'].endswith(f'/quiz/{mine.quiz_date.isoformat()}')
+    assert b'My passage' in client.get(f'/quiz/{mine.quiz_date.isoformat()}').data
+    assert client.get(f'/quiz/{today.isoformat()}').status_code == 302
+    assert client.post(f'/api/quiz/{theirs.id}/start').status_code == 403
+
+
+def test_legacy_quizzes_table_is_rebuilt(app):
+    """Test upgrade_schema drops the old unique quiz_date and adds user_id"""
+    db.drop_all()
+    db.session.execute(db.text(
+        'CREATE TABLE quizzes (id INTEGER NOT NULL, quiz_date DATE NOT NULL, passage TEXT NOT NULL, '
+        'generated_at DATETIME, generation_prompt TEXT, status VARCHAR(20), notification_sent BOOLEAN, '
+        'PRIMARY KEY (id), UNIQUE (quiz_date))'
+    ))
+    db.session.execute(db.text(
+        "INSERT INTO quizzes (id, quiz_date, passage, status) VALUES (7, '2024-01-01', 'old', 'active')"
+    ))
+    db.session.commit()
+    db.create_all()
+
+    created = upgrade_schema()
+
+    assert set(created) == {'ix_quizzes_daily_user', 'ix_quizzes_daily_shared', 'ix_quizzes_user_kind'}
+    assert upgrade_schema() == []
+    legacy = db.session.get(Quiz, 7)
+    assert legacy.passage == 'old' and legacy.user_id is None
+    db.session.add(User(id=1, google_id='g', email='e@example.com'))
+    db.session.add(Quiz(quiz_date=legacy.quiz_date, passage='personal', user_id=1))
+    db.session.commit()
+
+
+def test_pipeline_generates_per_user_with_retries(app, users):
+    """Test every user gets a quiz, transient failures are retried and
+    permanent ones reported without blocking the others"""
+    from app.services.quiz_generator import QuizGeneratorService
+    from app.services.personal_quizzes import PersonalQuizService
+
+    today = date.today()
+    db.session.add(Quiz(quiz_date=today, passage='existing', user_id=users[2].id))
+    db.session.commit()
+
+    # Users' markers only reach the prompt through recent topics
+    for user, marker in zip(users, ('aardvark', 'zeppelin')):
+        db.session.add(Quiz(quiz_date=today - timedelta(days=1), passage=f'Passage about {marker}',
+                            user_id=user.id))
+    db.session.commit()
+
+    app.config['QUESTION_BANK_FALLBACK'] = False
+    client = FlakyClient(flaky_markers=['aardvark'], broken_markers=['zeppelin'])
+    service = PersonalQuizService(max_workers=4, generator=QuizGeneratorService(client=client),
+                                  limiter=TokenBucket(rate=1000, capacity=1000), attempts=3,
+                                  sleep=lambda s: None)
+    results = service.generate(today)
+
+    by_user = {r.user_id: r for r in results}
+    assert [r.user_id for r in results] == [u.id for u in users]
+    assert by_user[users[0].id].ok and by_user[users[0].id].attempts == 2
+    assert not by_user[users[1].id].ok and by_user[users[1].id].attempts == 3
+    assert by_user[users[2].id].skipped
+    assert len(client.calls) == 5
+
+    quiz = Quiz.query.filter_by(quiz_date=today, user_id=users[0].id).one()
+    assert quiz.questions.count() == 10
+    assert 'aardvark' in quiz.generation_prompt
+    assert Quiz.query.filter_by(quiz_date=today, user_id=users[1].id).first() is None
+    retries = dict(GenerationTelemetry.query.with_entities(GenerationTelemetry.user_id,
+                                                           GenerationTelemetry.retries))
+    assert retries == {users[0].id: 1, users[1].id: 2}
@@ -0,0 +1,194 @@
+"""
+Query plan regression tests
+
+Runs each hot path, captures the SELECTs it issues and checks their
+EXPLAIN QUERY PLAN output for full table scans.
+"""
+import re
+import pytest
+from datetime import date, datetime
+from sqlalchemy import event
+from app import create_app
+from app.extensions import db
+from app.migrations import upgrade_schema
+from app.models import User, Quiz, Question, Submission, Answer
+from app.services.analytics import AnalyticsService
+from app.services.skill_estimator import SkillEstimator
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SECRET_KEY = 'test-secret'
+    GOOGLE_CLIENT_ID = 'test'
+    GOOGLE_CLIENT_SECRET = 'test'
+    QUIZ_TIME_LIMIT_SECONDS = 360
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def data(app):
+    user = User(google_id='test123', email='test@example.com', name='Test User')
+    quiz = Quiz(quiz_date=date.today(), passage='Test passage content')
+    db.session.add_all([user, quiz])
+    db.session.flush()
+    for i in range(1, 4):
+        db.session.add(Question(
+            quiz_id=quiz.id, question_number=i, question_text=f'Question {i}?',
+            option_a='A', option_b='B', option_c='C', option_d='D',
+            correct_answer='A', explanation='Because A',
+            category='Legal Reasoning', difficulty='easy'
+        ))
+    db.session.commit()
+    return {'user': user, 'quiz': quiz, 'questions': list(quiz.questions)}
+
+
+@pytest.fixture
+def client(app, data):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(data['user'].id)
+    return client
+
+
+def _full_scans(fn):
+    """Run fn and return the plan lines of its SELECTs that scan a whole table"""
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert captured, 'hot path issued no queries'
+    tables = '|'.join(db.metadata.tables)
+    scan = re.compile(rf'^(SCAN ({tables})\b(?!.* USING (COVERING )?INDEX)|.*AUTOMATIC)')
+
+    raw = db.engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        offenders = []
+        for statement, parameters in captured:
+            for row in cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters):
+                if scan.match(row[-1]):
+                    offenders.append(f"{row[-1]}  <-  {' '.join(statement.split())[:160]}")
+        return offenders
+    finally:
+        raw.close()
+
+
+def test_indexes_created_on_existing_database(app):
+    """Test upgrade_schema adds indexes missing from an old database"""
+    db.session.execute(db.text('DROP INDEX ix_submissions_user_quiz_completed'))
+    db.session.commit()
+
+    assert upgrade_schema() == ['ix_submissions_user_quiz_completed']
+    assert upgrade_schema() == []
+
+
+def _start_app(uri, results):
+    config = type('Config', (TestConfig,), {'SQLALCHEMY_DATABASE_URI': uri})
+    try:
+        create_app(config)
+        results.put('ok')
+    except Exception as e:
+        results.put(repr(e))
+
+
+def test_concurrent_starts_upgrade_once(tmp_path):
+    """Test processes starting together on an old database (as gunicorn
+    workers do) all start, the schema lock making them upgrade in turn"""
+    import multiprocessing
+    import sqlite3
+
+    path = tmp_path / 'quiz.db'
+    uri = f'sqlite:///{path}'
+    config = type('Config', (TestConfig,), {'SQLALCHEMY_DATABASE_URI': uri})
+    app = create_app(config)
+    with app.app_context():
+        db.engine.dispose()
+    conn = sqlite3.connect(path)
+    conn.execute('DROP INDEX ix_submissions_user_quiz_completed')
+    conn.execute('ALTER TABLE submissions DROP COLUMN correct_count')
+    conn.commit()
+    conn.close()
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=_start_app, args=(uri, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+
+    assert sorted(results.get(timeout=5) for _ in workers) == ['ok'] * 4
+    with app.app_context():
+        assert upgrade_schema() == []
+
+
+def test_quiz_api_flow_uses_indexes(app, data, client):
+    quiz = data['quiz']
+
+    def flow():
+        submission_id = client.post(f'/api/quiz/{quiz.id}/start').get_json()['submission_id']
+        for question in data['questions']:
+            client.post(f'/api/quiz/{quiz.id}/answer', json={
+                'submission_id': submission_id,
+                'question_id': question.id,
+                'selected_answer': 'A',
+                'time_spent_seconds': 10
+            })
+        client.post(f'/api/quiz/{quiz.id}/submit', json={'submission_id': submission_id})
+
+    assert _full_scans(flow) == []
+
+
+def test_quiz_pages_use_indexes(app, data, client):
+    def pages():
+        client.get('/')
+        client.get(f'/quiz/{date.today().isoformat()}')
+        client.get('/history')
+        client.get('/review')
+
+    assert _full_scans(pages) == []
+
+
+def test_results_page_uses_indexes(app, data, client):
+    submission = Submission(user_id=data['user'].id, quiz_id=data['quiz'].id,
+                            completed=True, score=1, total_time_seconds=100,
+                            submitted_at=datetime.utcnow())
+    db.session.add(submission)
+    db.session.flush()
+    db.session.add(Answer(submission_id=submission.id, question_id=data['questions'][0].id,
+                          selected_answer='A', is_correct=True))
+    db.session.commit()
+
+    assert _full_scans(lambda: client.get(f'/results/{submission.id}')) == []
+
+
+@pytest.mark.parametrize('source', ['raw', 'rollup'])
+def test_analytics_summary_uses_indexes(app, data, source):
+    service = AnalyticsService(data['user'].id, days=30, source=source)
+    assert _full_scans(lambda: service.get_performance_summary()) == []
+
+
+def test_skill_estimator_uses_indexes(app, data):
+    assert _full_scans(lambda: SkillEstimator(data['user'].id).load_history()) == []
+
+
+def test_weak_areas_rating_mode_uses_indexes(app, data):
+    service = AnalyticsService(data['user'].id)
+    assert _full_scans(lambda: service.get_weak_areas(mode='rating')) == []
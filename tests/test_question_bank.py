@@ -0,0 +1,192 @@
+"""
+Tests for the question bank index, review sessions and generation fallback
+"""
+import pytest
+from datetime import date, timedelta
+from unittest.mock import patch
+from app import create_app
+from app.extensions import db
+from app.models import User, Quiz, Question, Submission
+from app.models.question import CATEGORIES
+from app.services.question_bank import QuestionBank, get_question_bank
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SECRET_KEY = 'test-secret'
+    GOOGLE_CLIENT_ID = 'test'
+    GOOGLE_CLIENT_SECRET = 'test'
+    ANTHROPIC_API_KEY = 'test-key'
+    QUIZ_TIME_LIMIT_SECONDS = 360
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+def _add_quiz(days_ago, category, difficulty='medium', passage=None, n=10):
+    quiz = Quiz(quiz_date=date.today() - timedelta(days=days_ago),
+                passage=passage or f'A passage about {category.lower()} number {days_ago}')
+    db.session.add(quiz)
+    db.session.flush()
+    for i in range(1, n + 1):
+        db.session.add(Question(
+            quiz_id=quiz.id, question_number=i, question_text=f'{category} question {i}?',
+            option_a='A', option_b='B', option_c='C', option_d='D',
+            correct_answer='A', explanation='Because A',
+            category=category, difficulty=difficulty
+        ))
+    db.session.commit()
+    return quiz
+
+
+@pytest.fixture
+def bank_data(app):
+    user = User(google_id='g1', email='user@example.com', name='User')
+    db.session.add(user)
+    quizzes = [_add_quiz(i + 1, CATEGORIES[i % len(CATEGORIES)]) for i in range(8)]
+    return {'user': user, 'quizzes': quizzes}
+
+
+def _source_quizzes(ids):
+    return {q.quiz_id for q in Question.query.filter(Question.id.in_(ids))}
+
+
+def test_assemble_prefers_category_and_limits_passages(app, bank_data):
+    """Test assembly favours the requested category within max_passages"""
+    bank = QuestionBank()
+    ids = bank.assemble(count=10, categories=['Legal Reasoning'], max_passages=1, seed=1)
+
+    assert len(ids) == 10
+    assert {q.category for q in Question.query.filter(Question.id.in_(ids))} == {'Legal Reasoning'}
+    assert len(_source_quizzes(ids)) == 1
+    assert bank.stats()['questions'] == 80
+
+
+def test_assemble_avoids_seen_questions(app, bank_data):
+    """Test questions from quizzes the user took are picked last"""
+    user, seen_quiz = bank_data['user'], bank_data['quizzes'][1]
+    db.session.add(Submission(user_id=user.id, quiz_id=seen_quiz.id, completed=True))
+    db.session.commit()
+
+    bank = QuestionBank()
+    for seed in range(5):
+        ids = bank.assemble(user_id=user.id, categories=[seen_quiz.questions[0].category], seed=seed)
+        assert seen_quiz.id not in _source_quizzes(ids)
+
+
+def test_difficulty_is_a_hard_filter(app, bank_data):
+    """Test difficulties filter and an unfillable request returns fewer ids"""
+    _add_quiz(20, 'Logical Reasoning', difficulty='hard', n=4)
+    ids = QuestionBank().assemble(count=10, difficulties=['hard'])
+
+    assert len(ids) == 4
+    assert QuestionBank().create_quiz(date.today(), difficulties=['hard']) is None
+
+
+def test_bank_refreshes_incrementally_after_save(app, bank_data):
+    """Test _save_quiz makes new questions available without a reload"""
+    from app.services.quiz_generator import QuizGeneratorService
+
+    bank = get_question_bank()
+    bank.sync()
+    assert bank.stats()['questions'] == 80
+
+    with patch('app.services.claude_client.anthropic'):
+        service = QuizGeneratorService()
+    data = {
+        'passage': 'Trademark dilution and the famous marks doctrine',
+        'questions': [
+            {'number': i, 'text': f'Which trademark rule applies in case {i}?',
+             'options': {'A': 'One', 'B': 'Two', 'C': 'Three', 'D': 'Four'},
+             'correct': 'B', 'explanation': 'Because.',
+             'category': 'Legal Reasoning', 'difficulty': 'easy'}
+            for i in range(1, 11)
+        ]
+    }
+    quiz = service._save_quiz(date.today(), data, 'prompt')
+
+    assert bank.stats()['questions'] == 90
+    ids = bank.assemble(keywords='trademark dilution', max_passages=1, seed=0)
+    assert _source_quizzes(ids) == {quiz.id}
+
+
+def test_review_session_copies_questions(app, bank_data):
+    """Test /review builds a review quiz of copies, resumes it, and its
+    sources count as seen afterwards"""
+    user = bank_data['user']
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user.id)
+
+    response = client.get('/review')
+    assert response.status_code == 200
+    assert b'Review Session' in response.data
+
+    review = Quiz.query.filter_by(kind='review').one()
+    copies = list(review.questions)
+    assert len(copies) == 10
+    assert all(q.source_question_id for q in copies)
+    assert client.get('/review').status_code == 200
+    assert Quiz.query.filter_by(kind='review').count() == 1
+
+    # Copies are not indexed again, but their sources become "seen"
+    bank = get_question_bank()
+    assert bank.stats()['questions'] == 80
+    db.session.add(Submission(user_id=user.id, quiz_id=review.id, completed=True))
+    db.session.commit()
+    sources = {q.source_question_id for q in copies}
+    assert not sources & set(bank.assemble(user_id=user.id, count=60, max_passages=8, seed=3))
+
+    # Review quizzes never shadow the daily quiz
+    assert Quiz.visible_to(user.id).first().kind == 'daily'
+
+
+class FailingClient:
+    def __init__(self):
+        self.messages = self
+
+    def create(self, **kwargs):
+        raise ValueError('Failed to parse quiz data from Claude response')
+
+
+def test_generation_falls_back_to_question_bank(app, bank_data):
+    """Test a failed Claude call still produces today's quiz from the bank"""
+    from app.services.quiz_generator import QuizGeneratorService
+
+    service = QuizGeneratorService(client=FailingClient())
+    quiz = service.generate_daily_quiz()
+
+    assert quiz.quiz_date == date.today()
+    assert quiz.kind == 'daily' and quiz.user_id is None
+    assert quiz.questions.count() == 10
+    assert 'question bank' in quiz.generation_prompt
+
+    app.config['QUESTION_BANK_FALLBACK'] = False
+    Question.query.filter_by(quiz_id=quiz.id).delete()
+    db.session.delete(quiz)
+    db.session.commit()
+    with pytest.raises(ValueError):
+        service.generate_daily_quiz()
+
+
+def test_personal_pipeline_falls_back_per_user(app, bank_data):
+    """Test users whose generation keeps failing get a bank-assembled quiz"""
+    from app.services.claude_client import TokenBucket
+    from app.services.quiz_generator import QuizGeneratorService
+    from app.services.personal_quizzes import PersonalQuizService
+
+    service = PersonalQuizService(max_workers=2, generator=QuizGeneratorService(client=FailingClient()),
+                                  limiter=TokenBucket(rate=1000, capacity=1000), attempts=2,
+                                  sleep=lambda s: None)
+    [result] = service.generate(user_ids=[bank_data['user'].id])
+
+    assert result.ok and result.fallback and result.attempts == 2
+    quiz = db.session.get(Quiz, result.quiz_id)
+    assert quiz.user_id == bank_data['user'].id and quiz.kind == 'daily'
@@ -0,0 +1,93 @@
+"""
+Tests for JSONL quiz export and bulk import
+"""
+import io
+import json
+import pytest
+from datetime import date, datetime, timedelta
+from app import create_app
+from app.extensions import db
+from app.models import User, Quiz, Question, Submission, Answer
+from app.services.quiz_archive import QuizArchiveService
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SECRET_KEY = 'test-secret'
+    GOOGLE_CLIENT_ID = 'test'
+    GOOGLE_CLIENT_SECRET = 'test'
+    ANTHROPIC_API_KEY = 'test-key'
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+def _seed(days=7):
+    user = User(google_id='g1', email='user@example.com', name='User')
+    db.session.add(user)
+    db.session.flush()
+    for d in range(days):
+        quiz = Quiz(quiz_date=date.today() - timedelta(days=d), passage=f'Passage {d}',
+                    user_id=user.id if d == 0 else None)
+        db.session.add(quiz)
+        db.session.flush()
+        questions = []
+        for n in range(1, 11):
+            question = Question(quiz_id=quiz.id, question_number=n, question_text=f'Q{n}?',
+                                option_a='A', option_b='B', option_c='C', option_d='D',
+                                correct_answer='B', explanation='Because B',
+                                category='Legal Reasoning', difficulty='easy')
+            db.session.add(question)
+            questions.append(question)
+        db.session.flush()
+        if d % 2:
+            submission = Submission(user_id=user.id, quiz_id=quiz.id, completed=True, score=1,
+                                    started_at=datetime(2024, 1, 1, 8), submitted_at=datetime(2024, 1, 1, 8, 5))
+            db.session.add(submission)
+            db.session.flush()
+            db.session.add(Answer(submission_id=submission.id, question_id=questions[3].id,
+                                  selected_answer='B', is_correct=True, time_spent_seconds=30))
+    db.session.commit()
+
+
+def test_round_trip_with_submissions(app):
+    """Test an export imports into an empty database with every row and link"""
+    _seed()
+    out = io.StringIO()
+    stats = QuizArchiveService(batch_size=3).export(out, submissions=True)
+    assert stats.counts == {'users': 1, 'quizzes': 7, 'questions': 70, 'submissions': 3, 'answers': 3}
+
+    lines = out.getvalue().splitlines()
+    assert json.loads(lines[0])['type'] == 'user'
+
+    db.drop_all()
+    db.create_all()
+    stats = QuizArchiveService(batch_size=3).import_(io.StringIO(out.getvalue()))
+
+    assert stats.counts == {'users': 1, 'quizzes': 7, 'questions': 70, 'submissions': 3, 'answers': 3}
+    user = User.query.one()
+    personal = Quiz.query.filter_by(user_id=user.id).one()
+    assert personal.quiz_date == date.today() and personal.questions.count() == 10
+    answer = Answer.query.first()
+    assert answer.question.question_number == 4
+    assert answer.submission.user_id == user.id
+    assert answer.submission.started_at == datetime(2024, 1, 1, 8)
+
+
+def test_import_skips_existing_quizzes(app):
+    """Test re-importing the same archive adds nothing"""
+    _seed(days=3)
+    out = io.StringIO()
+    QuizArchiveService().export(out)
+
+    stats = QuizArchiveService().import_(io.StringIO(out.getvalue()))
+
+    assert stats.counts['quizzes'] == 0 and stats.skipped == 3
+    assert Quiz.query.count() == 3 and Question.query.count() == 30
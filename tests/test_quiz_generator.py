@@ -3,6 +3,7 @@ Tests for Quiz Generator Service
 """
 import pytest
 import json
+import re
 from unittest.mock import Mock, patch
 from datetime import date
 from app import create_app
@@ -57,7 +58,7 @@ def test_build_prompt_without_analytics(app):
     with app.app_context():
         from app.services.quiz_generator import QuizGeneratorService
 
-        with patch('app.services.quiz_generator.anthropic'):
+        with patch('app.services.claude_client.anthropic'):
             service = QuizGeneratorService()
             prompt = service._build_prompt(None)
 
@@ -83,7 +84,7 @@ def test_build_prompt_with_analytics(app):
             'recent_trends': {'trend': 'stable'}
         }
 
-        with patch('app.services.quiz_generator.anthropic'):
+        with patch('app.services.claude_client.anthropic'):
             service = QuizGeneratorService()
             prompt = service._build_prompt(analytics)
 
@@ -91,12 +92,46 @@ def test_build_prompt_with_analytics(app):
             assert 'weak areas' in prompt.lower() or 'Weak areas' in prompt
 
 
+def test_prompt_compacted_to_token_budget(app):
+    """Test a budget drops the least informative sections and keeps the rest"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+        from app.services.prompt_budget import estimate_tokens
+
+        analytics = {
+            'category_performance': {
+                'Constitutional Law': {'total': 5, 'correct': 2, 'accuracy': 40.0},
+                'Legal Reasoning': {'total': 40, 'correct': 30, 'accuracy': 75.0},
+                'Logical Reasoning': {'total': 2, 'correct': 2, 'accuracy': 100.0}
+            },
+            'weak_areas': [{'category': 'Constitutional Law', 'accuracy': 40.0, 'attempts': 5}],
+            'time_struggles': [{'category': 'Quantitative Techniques'}],
+            'recent_trends': {'trend': 'declining'}
+        }
+        topics = [f'topic{i} words{i}' for i in range(20)]
+
+        with patch('app.services.claude_client.anthropic'):
+            service = QuizGeneratorService()
+        full = service._build_dynamic_prompt(analytics, topics, date(2024, 3, 9), budget=0)
+        compact = service._build_dynamic_prompt(analytics, topics, date(2024, 3, 9), budget=200)
+
+        assert estimate_tokens(full) > 200 >= estimate_tokens(compact)
+        for kept in ('2024-03-09', 'Weak areas (needs more practice): Constitutional Law',
+                     '- Constitutional Law: 40.0%', 'Time management issues', 'declining',
+                     '- topic0 words0', 'Choose a completely different topic', 'Generate the quiz now'):
+            assert kept in compact
+        assert '- topic19 words19' not in compact
+        assert '- Logical Reasoning: 100.0%' not in compact
+        # Without a budget nothing is dropped
+        assert service._build_dynamic_prompt(analytics, topics, date(2024, 3, 9)) == full
+
+
 def test_save_quiz(app, mock_claude_response):
     """Test saving quiz to database"""
     with app.app_context():
         from app.services.quiz_generator import QuizGeneratorService
 
-        with patch('app.services.quiz_generator.anthropic'):
+        with patch('app.services.claude_client.anthropic'):
             service = QuizGeneratorService()
             quiz = service._save_quiz(date.today(), mock_claude_response, "test prompt")
 
@@ -106,3 +141,691 @@ def test_save_quiz(app, mock_claude_response):
             questions = list(quiz.questions)
             assert len(questions) == 1
             assert questions[0].correct_answer == 'A'
+
+
+def test_build_prompt_with_skill_signals(app):
+    """Test skill signals are rendered into the adaptive section"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        analytics = {
+            'category_performance': {
+                'Constitutional Law': {'total': 5, 'correct': 2, 'accuracy': 40.0}
+            },
+            'weak_areas': [
+                {'category': 'Constitutional Law', 'accuracy': 40.0, 'attempts': 5}
+            ],
+            'time_struggles': [],
+            'recent_trends': {'trend': 'stable'},
+            'skill_signals': {
+                'answers': 5,
+                'window_accuracy': {'7d': {'Constitutional Law': 40.0}, '90d': {'Constitutional Law': 55.0}},
+                'ewma_accuracy': {'Constitutional Law': 35.5},
+                'ewma_seconds': {'Constitutional Law': 42.0},
+                'difficulty_curves': {'hard': [20.0, None, 50.0]}
+            }
+        }
+
+        with patch('app.services.claude_client.anthropic'):
+            service = QuizGeneratorService()
+            prompt = service._build_prompt(analytics)
+
+            assert '- Constitutional Law: 40.0% / - / 55.0%, recent-weighted 35.5%, ~42s per question' in prompt
+            assert 'Hard questions: 20.0% earlier -> 50.0% lately' in prompt
+
+
+def _full_quiz(n=3):
+    return {
+        "passage": 'A "quoted" passage with {braces} and [brackets] \\ backslash.',
+        "questions": [
+            {
+                "number": i,
+                "text": f"Question {i} about {{this}}?",
+                "options": {"A": "One", "B": "Two", "C": "Three", "D": "Four"},
+                "correct": "C",
+                "explanation": "Because \"C\" is right.",
+                "category": "Legal Reasoning",
+                "difficulty": "medium"
+            }
+            for i in range(1, n + 1)
+        ]
+    }
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.text_stream = iter(chunks)
+
+    def get_final_message(self):
+        return Mock(usage=Mock(input_tokens=200, output_tokens=900,
+                               cache_creation_input_tokens=0, cache_read_input_tokens=800))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeStreamingClient:
+    """Stands in for anthropic.Anthropic, streaming a fixed text in chunks.
+    Repair requests (messages.create) get valid questions for the slots
+    they ask for, or `repair_text` if given."""
+
+    def __init__(self, text, chunk_size=7, repair_text=None):
+        self.chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        self.repair_text = repair_text
+        self.repairs = 0
+        self.streams = []
+        self.messages = self
+
+    def stream(self, **kwargs):
+        self.streams.append(kwargs)
+        return FakeStream(self.chunks)
+
+    def create(self, **kwargs):
+        self.repairs += 1
+        text = self.repair_text
+        if text is None:
+            prompt = kwargs['messages'][0]['content']
+            slots = [int(n) for n in re.search(r'numbered ([\d, ]+)\.', prompt).group(1).split(', ')]
+            questions = _full_quiz(max(slots))['questions']
+            text = json.dumps({'questions': [questions[slot - 1] for slot in slots]})
+        return Mock(content=[Mock(text=text)], usage=Mock(
+            input_tokens=100, output_tokens=300, cache_creation_input_tokens=0, cache_read_input_tokens=0))
+
+
+def test_streaming_request_uses_timeout(app):
+    """Test streamed requests honour CLAUDE_TIMEOUT_SECONDS like others"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        app.config['CLAUDE_TIMEOUT_SECONDS'] = 30
+        client = FakeStreamingClient(json.dumps(_full_quiz(10)))
+        QuizGeneratorService(client=client)._stream_claude('prompt')
+
+        assert client.streams[0]['timeout'] == 30
+
+
+def test_incremental_parser_emits_items_as_they_complete():
+    """Test the parser yields passage then questions for any chunking"""
+    import random
+    from app.services.quiz_stream import IncrementalQuizParser
+
+    data = _full_quiz()
+    text = "Here is the quiz:\n```json\n" + json.dumps(data, indent=2) + "\n```"
+    rng = random.Random(3)
+
+    for _ in range(20):
+        parser = IncrementalQuizParser()
+        events = []
+        pos = 0
+        while pos < len(text):
+            step = rng.randint(1, 40)
+            events.extend(parser.feed(text[pos:pos + step]))
+            pos += step
+
+        assert events[0] == ('passage', data['passage'])
+        assert [e[1] for e in events[1:]] == data['questions']
+        assert parser.complete
+        assert parser.result() == data
+
+
+def test_streaming_generation_persists_questions(app):
+    """Test streamed generation saves the valid questions and repairs the
+    invalid and missing ones, so the quiz has all ten"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        data = _full_quiz(4)
+        data['questions'][2]['category'] = 'Astrology'
+
+        with patch('app.services.claude_client.anthropic'):
+            service = QuizGeneratorService()
+        service.client = FakeStreamingClient(json.dumps(data))
+
+        quiz = service.generate_daily_quiz(stream=True)
+
+        assert quiz.passage == data['passage']
+        assert [q.question_number for q in quiz.questions] == list(range(1, 11))
+        assert service.client.repairs == 1 and service.last_repair['questions'] == [3, 5, 6, 7, 8, 9, 10]
+        assert Quiz.query.count() == 1
+
+
+def test_streaming_generation_rolls_back_failed_repair(app):
+    """Test a streamed quiz whose gaps cannot be repaired is not saved"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        app.config['QUESTION_BANK_FALLBACK'] = False
+        with patch('app.services.claude_client.anthropic'):
+            service = QuizGeneratorService()
+        service.client = FakeStreamingClient(json.dumps(_full_quiz(8)), repair_text='not json')
+
+        with pytest.raises(ValueError):
+            service.generate_daily_quiz(stream=True)
+
+        assert Quiz.query.count() == 0
+        assert Question.query.count() == 0
+
+
+def test_streaming_generation_rolls_back_truncated_stream(app):
+    """Test a stream that ends mid-JSON leaves nothing in the database"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        text = json.dumps(_full_quiz(3))
+        with patch('app.services.claude_client.anthropic'):
+            service = QuizGeneratorService()
+        service.client = FakeStreamingClient(text[:len(text) // 2 + 40])
+
+        with pytest.raises(ValueError):
+            service.generate_daily_quiz(stream=True)
+
+        assert Quiz.query.count() == 0
+        assert Question.query.count() == 0
+
+
+class FakeClient:
+    """Stands in for anthropic.Anthropic, recording messages.create calls"""
+
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage = usage or {}
+        self.calls = []
+        self.messages = self
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return Mock(content=[Mock(text=self.text)], usage=Mock(**{
+            'input_tokens': 0, 'output_tokens': 0,
+            'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 0,
+            **self.usage
+        }))
+
+
+def test_static_prefix_sent_as_cached_block(app):
+    """Test the static prompt prefix is identical across generations and cached"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService, STATIC_PROMPT
+
+        with patch('app.services.claude_client.anthropic'):
+            service = QuizGeneratorService()
+        service.client = FakeClient(json.dumps(_full_quiz()), usage={
+            'input_tokens': 150, 'output_tokens': 900, 'cache_read_input_tokens': 1100
+        })
+
+        analytics = {
+            'category_performance': {'Legal Reasoning': {'total': 5, 'correct': 1, 'accuracy': 20.0}},
+            'weak_areas': [{'category': 'Legal Reasoning', 'accuracy': 20.0, 'attempts': 5}],
+            'time_struggles': [],
+            'recent_trends': {'trend': 'stable'}
+        }
+        service._call_claude(service._build_prompt(None, ['Old topic']))
+        service._call_claude(service._build_prompt(analytics))
+
+        contents = [call['messages'][0]['content'] for call in service.client.calls]
+        for content in contents:
+            assert content[0] == {
+                'type': 'text', 'text': STATIC_PROMPT, 'cache_control': {'type': 'ephemeral'}
+            }
+            assert 'cache_control' not in content[1]
+        assert 'Old topic' in contents[0][1]['text']
+        assert 'Weak areas' in contents[1][1]['text']
+        assert date.today().isoformat() not in STATIC_PROMPT
+
+        assert service.last_usage['cache_read_input_tokens'] == 1100
+        assert service.last_usage['input_tokens'] == 150
+
+
+class FailingDateClient(FakeClient):
+    """FakeClient that raises for prompts mentioning a given date"""
+
+    def __init__(self, text, fail_date):
+        super().__init__(text)
+        self.fail_date = fail_date
+
+    def create(self, **kwargs):
+        content = kwargs['messages'][0]['content']
+        if self.fail_date.isoformat() in json.dumps(content):
+            raise RuntimeError('overloaded')
+        return super().create(**kwargs)
+
+
+def test_pregenerate_stores_pending_quizzes(app):
+    """Test pre-generation skips existing dates, reports failures and stays hidden"""
+    from datetime import timedelta
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+        from app.services.pregeneration import PregenerationService
+
+        today = date.today()
+        dates = [today + timedelta(days=i) for i in range(1, 5)]
+        with patch('app.services.claude_client.anthropic'):
+            generator = QuizGeneratorService()
+        generator.client = FailingDateClient(json.dumps(_full_quiz(10)), fail_date=dates[2])
+        generator._save_quiz(dates[0], _full_quiz(10), 'prompt')
+        # Every date gets the same passage; topic checks are tested elsewhere
+        app.config['TOPIC_DUPLICATE_RETRIES'] = 0
+
+        results = PregenerationService(max_workers=3, generator=generator).pregenerate(days=4)
+
+        assert [r.quiz_date for r in results] == dates
+        assert results[0].skipped
+        assert results[1].ok and results[3].ok
+        assert not results[2].ok and 'overloaded' in results[2].error
+        assert len(generator.client.calls) == 2
+        assert {q.quiz_date: q.status for q in Quiz.query.all()} == {
+            dates[0]: 'active', dates[1]: 'pending', dates[3]: 'pending'
+        }
+
+        # Future quizzes are not reachable before their date
+        from app.models import User
+        user = User(google_id='g1', email='u@example.com', name='U')
+        db.session.add(user)
+        db.session.commit()
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+        response = client.get(f'/quiz/{dates[1].isoformat()}')
+        assert response.status_code == 302
+        assert response.headers['Location'].endswith('/')
+
+
+def test_pending_quiz_promoted_on_its_date(app):
+    """Test today's pending quiz is activated instead of generating a new one"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+        from app.services.pregeneration import PregenerationService
+
+        with patch('app.services.claude_client.anthropic'):
+            generator = QuizGeneratorService()
+        generator.client = FakeClient(json.dumps(_full_quiz(10)))
+        pending = generator._save_quiz(date.today(), _full_quiz(10), 'prompt', status='pending')
+
+        assert PregenerationService(generator=generator).promote_due() == [pending]
+        assert pending.status == 'active'
+
+        pending.status = 'pending'
+        db.session.commit()
+        assert generator.generate_daily_quiz() is pending
+        assert pending.status == 'active'
+        assert generator.client.calls == []
+
+
+def test_pending_and_future_quizzes_not_served(app):
+    """Test a quiz is hidden from the pages and the API until it is
+    promoted and its date has arrived"""
+    from datetime import timedelta
+    from app.models import User
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        user = User(google_id='g1', email='u@example.com', name='U')
+        db.session.add(user)
+        db.session.commit()
+        with patch('app.services.claude_client.anthropic'):
+            generator = QuizGeneratorService()
+        app.config['QUIZ_TIME_LIMIT_SECONDS'] = 360
+        today = generator._save_quiz(date.today(), _full_quiz(10), 'prompt', status='pending')
+        future = generator._save_quiz(date.today() + timedelta(days=1), _full_quiz(10), 'prompt')
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+
+        assert b'/quiz/' not in client.get('/').data
+        assert client.get(f'/quiz/{date.today().isoformat()}').status_code == 302
+        for quiz in (today, future):
+            assert client.post(f'/api/quiz/{quiz.id}/start').status_code == 404
+            assert client.get(f'/api/quiz/{quiz.id}/data').status_code == 404
+
+        generator.promote_pending(today)
+        assert client.get('/').headers['Location'].endswith(f'/quiz/{date.today().isoformat()}')
+        assert client.post(f'/api/quiz/{today.id}/start').status_code == 200
+        assert client.get(f'/api/quiz/{today.id}/data').status_code == 200
+
+
+def test_promotion_keeps_questions_when_refresh_fails(app):
+    """Test a failed adaptive refresh falls back to the pre-generated questions"""
+    from app.models import User
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        user = User(google_id='g1', email='u@example.com', name='U')
+        db.session.add(user)
+        db.session.commit()
+
+        with patch('app.services.claude_client.anthropic'):
+            generator = QuizGeneratorService()
+        generator.client = FakeClient(json.dumps(_full_quiz(3)))
+        quiz = generator._save_quiz(date.today(), _full_quiz(10), 'prompt', status='pending')
+        original = [q.id for q in quiz.questions]
+
+        generator.promote_pending(quiz, user.id, refresh=True)
+
+        assert len(generator.client.calls) == 1
+        assert quiz.status == 'active'
+        assert [q.id for q in quiz.questions] == original
+
+
+def test_promotion_keeps_questions_of_started_quiz(app):
+    """Test the adaptive refresh never replaces questions that a
+    submission's answers already point at"""
+    from datetime import datetime
+    from app.models import User, Submission, Answer
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        user = User(google_id='g1', email='u@example.com', name='U')
+        db.session.add(user)
+        db.session.commit()
+
+        with patch('app.services.claude_client.anthropic'):
+            generator = QuizGeneratorService()
+        generator.client = FakeClient(json.dumps(_full_quiz(10)))
+        quiz = generator._save_quiz(date.today(), _full_quiz(10), 'prompt', status='pending')
+        original = [q.id for q in quiz.questions]
+        submission = Submission(user_id=user.id, quiz_id=quiz.id, started_at=datetime.utcnow())
+        db.session.add(submission)
+        db.session.flush()
+        db.session.add(Answer(submission_id=submission.id, question_id=original[0],
+                              selected_answer='A', is_correct=True))
+        db.session.commit()
+
+        generator.promote_pending(quiz, user.id, refresh=True)
+
+        assert generator.client.calls == []
+        assert quiz.status == 'active'
+        assert [q.id for q in quiz.questions] == original
+        assert Answer.query.one().question_id == original[0]
+
+
+class ScriptedClient:
+    """Stands in for anthropic.Anthropic, returning the given texts in turn
+    with usage proportional to the requested max_tokens"""
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self.calls = []
+        self.messages = self
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return Mock(content=[Mock(text=self.texts.pop(0))], usage=Mock(
+            input_tokens=1500, output_tokens=kwargs['max_tokens'] // 2,
+            cache_creation_input_tokens=0, cache_read_input_tokens=0))
+
+
+def test_invalid_questions_repaired_with_small_request(app):
+    """Test only the invalid questions are regenerated and the savings recorded"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        data = _full_quiz(10)
+        data['questions'][2]['category'] = 'Astrology'
+        del data['questions'][6]['options']
+        fixes = _full_quiz(2)['questions']
+        fixes[0]['text'] = 'Replacement one?'
+        fixes[1]['text'] = 'Replacement two?'
+
+        client = ScriptedClient([json.dumps(data), json.dumps({'questions': fixes})])
+        service = QuizGeneratorService(client=client)
+        result = service._call_claude_validated('prompt')
+
+        assert [q['number'] for q in result['questions']] == list(range(1, 11))
+        assert result['questions'][2]['text'] == 'Replacement one?'
+        assert result['questions'][6]['text'] == 'Replacement two?'
+        assert client.calls[1]['max_tokens'] == 2 * service.REPAIR_TOKENS_PER_QUESTION
+        assert 'numbered 3, 7' in client.calls[1]['messages'][0]['content']
+        assert service.last_repair['questions'] == [3, 7]
+        assert service.last_repair['saved_tokens'] == service.MAX_TOKENS // 2 - service.REPAIR_TOKENS_PER_QUESTION
+        assert service.repair_totals['repairs'] == 1
+
+
+def test_truncated_response_salvaged_and_completed(app):
+    """Test a response cut off mid-question keeps its complete questions"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        text = json.dumps(_full_quiz(10))
+        cut = text.index('"number": 7')
+        fixes = {'questions': _full_quiz(10)['questions'][6:]}
+        client = ScriptedClient(["```json\n" + text[:cut], json.dumps(fixes)])
+
+        quiz = QuizGeneratorService(client=client).generate_daily_quiz()
+
+        assert quiz.questions.count() == 10
+        assert len(client.calls) == 2
+
+
+def test_unrepairable_questions_raise(app):
+    """Test repair gives up after QUIZ_REPAIR_ATTEMPTS so callers retry in full"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        app.config['QUIZ_REPAIR_ATTEMPTS'] = 2
+        client = ScriptedClient([json.dumps(_full_quiz(8)), 'not json', '{"questions": []}'])
+        service = QuizGeneratorService(client=client)
+
+        with pytest.raises(ValueError):
+            service._call_claude_validated('prompt')
+        assert len(client.calls) == 3
+        assert service.last_repair['ok'] is False
+        assert service.repair_totals['repairs'] == 0
+
+
+def test_rerun_served_from_response_cache(app, tmp_path):
+    """Test a rerun after a crash before commit reuses the cached response"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        app.config['GENERATION_CACHE_DIR'] = str(tmp_path)
+        client = FakeClient(json.dumps(_full_quiz(10)), usage={'output_tokens': 900})
+        service = QuizGeneratorService(client=client)
+
+        with patch.object(QuizGeneratorService, '_save_quiz', side_effect=RuntimeError('crashed')):
+            with pytest.raises(RuntimeError):
+                service.generate_daily_quiz()
+        quiz = service.generate_daily_quiz()
+
+        assert quiz.questions.count() == 10
+        assert len(client.calls) == 1
+        assert service.last_usage['output_tokens'] == 900
+
+
+def test_response_cache_ttl_and_size_eviction(tmp_path):
+    """Test entries expire after the TTL and the oldest go when over size"""
+    from app.services.response_cache import ResponseCache
+
+    now = [1000.0]
+    cache = ResponseCache(str(tmp_path), ttl=60, max_bytes=400, clock=lambda: now[0])
+    keys = [cache.key('model', 4096, f'prompt {i}') for i in range(3)]
+
+    cache.put(keys[0], 'x' * 100)
+    now[0] += 10
+    cache.put(keys[1], 'y' * 100)
+    assert cache.get(keys[0])['text'] == 'x' * 100
+
+    now[0] += 10
+    cache.put(keys[2], 'z' * 100)
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[1]) is not None and cache.get(keys[2]) is not None
+
+    now[0] += 55
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2])['text'] == 'z' * 100
+    assert cache.stats()['entries'] == 1
+
+
+def test_unusable_cached_response_is_discarded(app, tmp_path):
+    """Test a response that fails to parse is not replayed on retry"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        app.config['GENERATION_CACHE_DIR'] = str(tmp_path)
+        service = QuizGeneratorService(client=FakeClient('not json'))
+        with pytest.raises(ValueError):
+            service._call_claude('prompt')
+        service.client = FakeClient(json.dumps(_full_quiz(1)))
+
+        assert service._call_claude('prompt')['passage'] == _full_quiz(1)['passage']
+
+
+def test_responses_needing_repair_not_cached(app, tmp_path):
+    """Test a response with invalid questions is evicted once used, while
+    the repair that fixed it stays cached"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+        from app.services.response_cache import get_response_cache
+
+        app.config['GENERATION_CACHE_DIR'] = str(tmp_path)
+        data = _full_quiz(10)
+        data['questions'][2]['category'] = 'Astrology'
+        fixes = {'questions': _full_quiz(1)['questions']}
+        client = ScriptedClient([json.dumps(data), json.dumps(fixes), json.dumps(data)])
+        service = QuizGeneratorService(client=client)
+
+        service._call_claude_validated('prompt')
+        assert get_response_cache().stats()['entries'] == 1
+        service._call_claude_validated('prompt')
+
+        # The cached repair counts what it cost when made, not nothing
+        assert len(client.calls) == 3
+        assert service.last_repair['saved_tokens'] == (service.MAX_TOKENS - service.REPAIR_TOKENS_PER_QUESTION) // 2
+
+
+class ShardingClient:
+    """Stands in for anthropic.Anthropic, answering passage-only and
+    question-shard prompts; shards containing `fail_slot` raise"""
+
+    def __init__(self, fail_slot=None):
+        self.fail_slot = fail_slot
+        self.prompts = []
+        self.messages = self
+
+    def create(self, **kwargs):
+        content = kwargs['messages'][0]['content']
+        prompt = content if isinstance(content, str) else ''.join(block['text'] for block in content)
+        self.prompts.append(prompt)
+        question = _full_quiz(1)['questions'][0]
+        if 'Write ONLY the passage' in prompt:
+            text = json.dumps({'passage': 'A passage on the doctrine of promissory estoppel.'})
+        elif 'replacement' in prompt:
+            slots = re.search(r'numbered ([\d, ]+)', prompt).group(1).split(', ')
+            text = json.dumps({'questions': [dict(question, text='Repaired question?') for _ in slots]})
+        else:
+            numbers = re.search(r'Write ONLY questions ([\d, ]+)', prompt).group(1)
+            slots = [int(n) for n in numbers.split(', ')]
+            if self.fail_slot in slots:
+                raise TimeoutError('shard timed out')
+            text = json.dumps({'questions': [dict(question, number=99, text=f'Shard question {slot}?')
+                                             for slot in slots]})
+        return Mock(content=[Mock(text=text)], usage=Mock(
+            input_tokens=100, output_tokens=50, cache_creation_input_tokens=0, cache_read_input_tokens=0))
+
+
+def test_sharded_generation_merges_and_renumbers(app):
+    """Test the passage comes first and the shards are merged in slot order"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        client = ShardingClient()
+        quiz = QuizGeneratorService(client=client).generate_daily_quiz(shards=3)
+
+        assert len(client.prompts) == 4
+        assert 'Write ONLY the passage' in client.prompts[0]
+        assert 'promissory estoppel' in client.prompts[1]
+        questions = quiz.questions.order_by(Question.question_number).all()
+        assert [q.question_number for q in questions] == list(range(1, 11))
+        assert [q.question_text for q in questions] == [f'Shard question {n}?' for n in range(1, 11)]
+
+
+class ContentRecordingClient(ShardingClient):
+    """ShardingClient that also keeps each request's message content"""
+
+    def __init__(self):
+        super().__init__()
+        self.contents = []
+
+    def create(self, **kwargs):
+        self.contents.append(kwargs['messages'][0]['content'])
+        return super().create(**kwargs)
+
+
+def test_cached_prefixes_reach_minimum_length(app):
+    """Test the static prefix is long enough to be cached, and sharded
+    requests also mark the shared prompt for caching"""
+    with app.app_context():
+        from app.services.prompt_budget import estimate_tokens
+        from app.services.quiz_generator import QuizGeneratorService, STATIC_PROMPT, MIN_CACHEABLE_TOKENS
+
+        assert estimate_tokens(STATIC_PROMPT) >= MIN_CACHEABLE_TOKENS
+
+        client = ContentRecordingClient()
+        service = QuizGeneratorService(client=client)
+        prompt = service._build_prompt(quiz_date=date(2024, 3, 9))
+        service._call_claude_sharded(prompt, shards=2, quiz_date=date(2024, 3, 9))
+
+        assert len(client.contents) == 3
+        for content in client.contents:
+            assert [block.get('cache_control') is not None for block in content] == [True, True, False]
+            assert ''.join(block['text'] for block in content[:2]) == prompt
+
+
+def test_sharded_generation_repairs_failed_shard(app):
+    """Test a failed shard's questions are rewritten with a repair request"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        client = ShardingClient(fail_slot=2)
+        service = QuizGeneratorService(client=client)
+        data = service._call_claude_sharded('prompt', shards=2, quiz_date=date(2024, 3, 9))
+
+        assert len(data['questions']) == 10
+        assert [q['text'] for q in data['questions']].count('Repaired question?') == 5
+        assert service.last_repair['questions'] == [2, 4, 6, 8, 10]
+
+
+class MalformedShardClient(ShardingClient):
+    """ShardingClient whose shard for the even slots is not JSON"""
+
+    def create(self, **kwargs):
+        response = super().create(**kwargs)
+        if 'Write ONLY questions 2, 4' in self.prompts[-1]:
+            response.content[0].text = 'not json'
+        return response
+
+
+def test_malformed_shard_not_cached(app, tmp_path):
+    """Test a shard that fails to parse is evicted, so a rerun asks again"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+        from app.services.response_cache import get_response_cache
+
+        app.config['GENERATION_CACHE_DIR'] = str(tmp_path)
+        client = MalformedShardClient()
+        service = QuizGeneratorService(client=client)
+        service._call_claude_sharded('prompt', shards=2, quiz_date=date(2024, 3, 9))
+        service._call_claude_sharded('prompt', shards=2, quiz_date=date(2024, 3, 9))
+
+        # Passage, good shard and repair once; the bad shard both times
+        assert len(client.prompts) == 5
+        assert get_response_cache().stats()['entries'] == 3
+
+
+def test_question_plan_follows_weak_areas_and_weekday(app):
+    """Test six slots go to weak areas, or to the day's focus without analytics"""
+    with app.app_context():
+        from app.services.quiz_generator import QuizGeneratorService
+
+        with patch('app.services.claude_client.anthropic'):
+            service = QuizGeneratorService()
+
+        plan = service._plan_questions({'weak_areas': [{'category': 'Logical Reasoning'}]})
+        assert [category for _, category in plan].count('Logical Reasoning') == 6
+        assert [slot for slot, _ in plan] == list(range(1, 11))
+
+        friday = [category for _, category in service._plan_questions(quiz_date=date(2024, 3, 8))]
+        assert friday.count('Quantitative Techniques') == 3 and friday.count('Logical Reasoning') == 3
+        saturday = [category for _, category in service._plan_questions(quiz_date=date(2024, 3, 9))]
+        assert len(set(saturday)) == 6
@@ -0,0 +1,146 @@
+"""
+Tests for the results builder and results cache
+"""
+import pytest
+from datetime import date, datetime
+from sqlalchemy import event
+from app import create_app
+from app.extensions import db
+from app.models import User, Quiz, Question, Submission, Answer
+from app.services.results import build_results, get_results_cache
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SECRET_KEY = 'test-secret'
+    GOOGLE_CLIENT_ID = 'test'
+    GOOGLE_CLIENT_SECRET = 'test'
+    RESULTS_CACHE_SIZE = 2
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def user(app):
+    user = User(google_id='test123', email='test@example.com', name='Test User')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user.id)
+    return client
+
+
+def _submission(user, completed=True, quiz_date=None):
+    """A submission of a fresh quiz, right on the odd-numbered questions"""
+    quiz = Quiz(quiz_date=quiz_date or date.today(), passage='Test passage content')
+    db.session.add(quiz)
+    db.session.flush()
+    submission = Submission(user_id=user.id, quiz_id=quiz.id, started_at=datetime.utcnow(),
+                            completed=completed, score=5 if completed else 0, total_time_seconds=300)
+    db.session.add(submission)
+    db.session.flush()
+    for i in range(10, 0, -1):
+        question = Question(quiz_id=quiz.id, question_number=i, question_text=f'Question {i}?',
+                            option_a='A', option_b='B', option_c='C', option_d='D',
+                            correct_answer='A', explanation='Because A',
+                            category='Legal Reasoning' if i <= 6 else 'Logical Reasoning', difficulty='easy')
+        db.session.add(question)
+        db.session.flush()
+        if i < 10:
+            db.session.add(Answer(submission_id=submission.id, question_id=question.id,
+                                  selected_answer='A' if i % 2 else 'B', is_correct=bool(i % 2)))
+    db.session.commit()
+    return submission
+
+
+def _statements():
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+def test_build_results_in_one_query(app, user):
+    """Test the builder loads everything in one query and counts categories"""
+    submission_id = _submission(user).id
+    db.session.expire_all()
+    statements = _statements()
+
+    results = build_results(submission_id)
+
+    assert [q.question_number for q in results.questions] == list(range(1, 11))
+    assert len(results.answers) == 9
+    assert results.category_stats == {'Legal Reasoning': {'correct': 3, 'total': 6},
+                                      'Logical Reasoning': {'correct': 2, 'total': 4}}
+    data = results.to_dict()
+    assert data['questions'][9]['answer'] is None and data['questions'][0]['answer']['is_correct']
+    assert len(statements) == 1
+    assert build_results(9999) is None
+
+
+def test_results_page_cached_with_etag(app, user, client):
+    """Test a completed submission's page is rendered once, then served from
+    the cache, and revalidated with a 304"""
+    submission_id = _submission(user).id
+    first = client.get(f'/results/{submission_id}')
+    assert first.status_code == 200 and first.headers['ETag']
+    assert b'Question 10?' in first.data and b'3/6' in first.data
+
+    statements = _statements()
+    second = client.get(f'/results/{submission_id}')
+    not_modified = client.get(f'/results/{submission_id}', headers={'If-None-Match': first.headers['ETag']})
+
+    assert second.data == first.data
+    assert not_modified.status_code == 304 and not_modified.data == b''
+    assert not any('FROM submissions' in s or 'FROM questions' in s for s in statements)
+    assert get_results_cache().stats()['hits'] == 2
+
+
+def test_in_progress_and_foreign_results_not_cached(app, user, client):
+    """Test unfinished submissions are rendered each time and other users
+    cannot read a cached page"""
+    open_id = _submission(user, completed=False).id
+    response = client.get(f'/results/{open_id}')
+    assert response.status_code == 200 and 'ETag' not in response.headers
+
+    other = User(google_id='other', email='other@example.com', name='Other')
+    db.session.add(other)
+    db.session.commit()
+    theirs = _submission(other, quiz_date=date(2024, 1, 1)).id
+    get_results_cache().put(db.session.get(Submission, theirs), 'html', 'their page')
+
+    assert client.get(f'/results/{theirs}').status_code == 302
+    assert client.get(f'/api/submission/{theirs}/results').status_code == 403
+    assert get_results_cache().stats()['size'] == 1
+
+
+def test_results_json_cached_and_evicted(app, user, client):
+    """Test the JSON results carry an ETag, and the cache is bounded"""
+    ids = [_submission(user, quiz_date=date(2024, 1, day)).id for day in (1, 2, 3)]
+
+    response = client.get(f'/api/submission/{ids[0]}/results')
+    assert response.get_json()['category_stats']['Legal Reasoning'] == {'correct': 3, 'total': 6}
+    assert client.get(f'/api/submission/{ids[0]}/results',
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    for submission_id in ids[1:]:
+        client.get(f'/api/submission/{submission_id}/results')
+    cache = get_results_cache()
+    assert cache.stats()['size'] == 2 and cache.get(ids[0], 'json') is None
+
+    cache.invalidate_quiz(db.session.get(Submission, ids[2]).quiz_id)
+    assert cache.get(ids[2], 'json') is None and cache.get(ids[1], 'json') is not None
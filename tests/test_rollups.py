@@ -0,0 +1,191 @@
+"""
+Tests for analytics rollups
+"""
+import pytest
+from datetime import date, datetime, timedelta
+from app import create_app
+from app.extensions import db
+from app.models import User, Quiz, Question, Submission, Answer, DailyRollup
+from app.services.analytics import AnalyticsService
+from app.services.rollups import RollupService
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SECRET_KEY = 'test-secret'
+    GOOGLE_CLIENT_ID = 'test'
+    GOOGLE_CLIENT_SECRET = 'test'
+    QUIZ_TIME_LIMIT_SECONDS = 360
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def user(app):
+    user = User(google_id='test123', email='test@example.com', name='Test User')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user.id)
+    return client
+
+
+def _make_quiz(quiz_date, categories):
+    quiz = Quiz(quiz_date=quiz_date, passage='Test passage content')
+    db.session.add(quiz)
+    db.session.flush()
+    for i, category in enumerate(categories, 1):
+        db.session.add(Question(
+            quiz_id=quiz.id,
+            question_number=i,
+            question_text=f'Question {i}?',
+            option_a='A', option_b='B', option_c='C', option_d='D',
+            correct_answer='A',
+            explanation='Because A',
+            category=category,
+            difficulty='easy' if i % 2 else 'hard'
+        ))
+    db.session.commit()
+    return quiz
+
+
+def _take_quiz(client, quiz, picks):
+    submission_id = client.post(f'/api/quiz/{quiz.id}/start').get_json()['submission_id']
+    for question, pick in zip(quiz.questions, picks):
+        client.post(f'/api/quiz/{quiz.id}/answer', json={
+            'submission_id': submission_id,
+            'question_id': question.id,
+            'selected_answer': pick,
+            'time_spent_seconds': 20
+        })
+    response = client.post(f'/api/quiz/{quiz.id}/submit', json={'submission_id': submission_id})
+    assert response.status_code == 200
+    return submission_id
+
+
+def test_submit_updates_rollups(app, user, client):
+    """Test completing a submission adds its answers to the rollups"""
+    quiz = _make_quiz(date.today(), ['Legal Reasoning', 'Legal Reasoning', 'Logical Reasoning'])
+    _take_quiz(client, quiz, ['A', 'B', 'A'])
+
+    cells = {(r.category, r.difficulty): r for r in DailyRollup.query.all()}
+    easy = cells[('Legal Reasoning', 'easy')]
+    assert (easy.total, easy.correct, easy.timed, easy.time_spent) == (1, 1, 1, 20)
+    hard = cells[('Legal Reasoning', 'hard')]
+    assert (hard.total, hard.correct) == (1, 0)
+    assert cells[('Logical Reasoning', 'easy')].correct == 1
+
+
+def test_rollup_summary_matches_raw(app, user, client):
+    """Test rollup-backed summary equals the raw-join summary"""
+    categories = ['Constitutional Law', 'Legal Reasoning', 'Logical Reasoning', 'Legal Reasoning']
+    for days_ago, picks in [(5, 'ABAB'), (1, 'AAAB'), (0, 'BBBA')]:
+        quiz = _make_quiz(date.today() - timedelta(days=days_ago), categories)
+        _take_quiz(client, quiz, picks)
+
+    raw = AnalyticsService(user.id, source='raw').get_performance_summary()
+    rollup = AnalyticsService(user.id, source='rollup').get_performance_summary()
+
+    assert rollup == raw
+    assert RollupService().check_consistency(user.id) == []
+
+
+def test_rebuild_restores_rollups(app, user, client):
+    """Test rebuild recomputes rollups from raw answers"""
+    quiz = _make_quiz(date.today(), ['Legal Reasoning', 'Logical Reasoning'])
+    _take_quiz(client, quiz, ['A', 'A'])
+
+    DailyRollup.query.delete()
+    db.session.commit()
+    assert RollupService().check_consistency(user.id) != []
+
+    assert RollupService().rebuild() == 2
+    assert RollupService().check_consistency(user.id) == []
+
+
+def test_summary_cache_hits_until_next_submission(app, user, client):
+    """Test summaries are cached and refreshed after a new submission"""
+    from app.services.analytics import get_summary_cache
+
+    cache = get_summary_cache()
+    categories = ['Legal Reasoning', 'Logical Reasoning']
+    _take_quiz(client, _make_quiz(date.today() - timedelta(days=1), categories), ['A', 'B'])
+
+    first = AnalyticsService(user.id).get_performance_summary()
+    again = AnalyticsService(user.id).get_performance_summary()
+    assert again == first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    _take_quiz(client, _make_quiz(date.today(), categories), ['A', 'A'])
+    assert cache.invalidations == 1
+
+    refreshed = AnalyticsService(user.id).get_performance_summary()
+    assert refreshed['category_performance']['Legal Reasoning']['total'] == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    stats = client.get('/api/analytics/cache-stats').get_json()
+    assert stats['hits'] == 1 and stats['size'] == 1
+
+
+def test_summary_cache_evicts_least_recently_used():
+    """Test the cache stays within maxsize"""
+    from app.services.analytics import SummaryCache
+
+    cache = SummaryCache(maxsize=2)
+    cache.put((1, 7), 'a')
+    cache.put((2, 7), 'b')
+    cache.get((1, 7))
+    cache.put((3, 7), 'c')
+
+    assert cache.get((2, 7)) is None
+    assert cache.get((1, 7)) == 'a'
+    assert cache.evictions == 1
+
+
+@pytest.mark.parametrize('source', ['raw', 'rollup'])
+def test_cohort_summaries_match_per_user(app, user, client, source):
+    """Test batch summaries equal individual summaries for every user"""
+    other = User(google_id='other', email='other@example.com', name='Other')
+    idle = User(google_id='idle', email='idle@example.com', name='Idle')
+    db.session.add_all([other, idle])
+    db.session.commit()
+
+    categories = ['Constitutional Law', 'Legal Reasoning', 'Logical Reasoning']
+    for days_ago, picks, other_picks in [(4, 'ABA', 'BBB'), (0, 'AAB', 'ABA')]:
+        quiz = _make_quiz(date.today() - timedelta(days=days_ago), categories)
+        _take_quiz(client, quiz, picks)
+
+        submission = Submission(user_id=other.id, quiz_id=quiz.id, completed=True,
+                                submitted_at=datetime.utcnow(), total_time_seconds=200)
+        db.session.add(submission)
+        db.session.flush()
+        for question, pick in zip(quiz.questions, other_picks):
+            db.session.add(Answer(submission_id=submission.id, question_id=question.id,
+                                  selected_answer=pick, is_correct=pick == 'A',
+                                  time_spent_seconds=15))
+        submission.calculate_score()
+        RollupService().record_submission(submission)
+        db.session.commit()
+
+    summaries = AnalyticsService.get_all_performance_summaries(source=source)
+    assert set(summaries) == {user.id, other.id}
+    for user_id, summary in summaries.items():
+        assert summary == AnalyticsService(user_id, source=source).get_performance_summary(use_cache=False)
+
+    summaries = AnalyticsService.get_all_performance_summaries(source=source, user_ids=[other.id, idle.id])
+    assert set(summaries) == {other.id, idle.id}
+    assert summaries[idle.id]['overall_stats']['quizzes_taken'] == 0
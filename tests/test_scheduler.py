@@ -0,0 +1,140 @@
+"""
+Tests for the in-process quiz scheduler
+"""
+import json
+import pytest
+from datetime import date, datetime, timedelta, timezone
+from app import create_app
+from app.extensions import db
+from app.models import Quiz
+from app.services.scheduler import QuizScheduler, parse_ist_time, read_status, run_daily_job
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SECRET_KEY = 'test-secret'
+    GOOGLE_CLIENT_ID = 'test'
+    GOOGLE_CLIENT_SECRET = 'test'
+    ANTHROPIC_API_KEY = 'test-key'
+    QUIZ_GENERATION_TIME_IST = '07:30'
+    SCHEDULER_LEAD_MINUTES = 15
+    SCHEDULER_MAX_ATTEMPTS = 3
+    SCHEDULER_RETRY_SECONDS = 60
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+
+def _scheduler(app, clock, job):
+    return QuizScheduler(app, job=job, clock=clock, sleep=clock.sleep)
+
+
+def _quiz(quiz_date):
+    quiz = Quiz(quiz_date=quiz_date, passage='Passage')
+    db.session.add(quiz)
+    db.session.commit()
+    return quiz
+
+
+def test_parse_ist_time_falls_back_on_bad_values():
+    """Test malformed generation times fall back to 07:30"""
+    assert parse_ist_time('07:15') == (7, 15)
+    assert parse_ist_time('7.15') == (7, 30)
+    assert parse_ist_time('25:00') == (7, 30)
+
+
+def test_next_run_converts_ist_and_skips_done_days(app):
+    """Test the run starts the lead time before the IST deadline, in UTC"""
+    clock = FakeClock(datetime(2024, 3, 10, 0, 0, tzinfo=timezone.utc))  # 05:30 IST
+    scheduler = _scheduler(app, clock, job=_quiz)
+
+    quiz_date, start = scheduler.next_run()
+    assert quiz_date == date(2024, 3, 10)
+    assert start == datetime(2024, 3, 10, 1, 45, tzinfo=timezone.utc)
+
+    _quiz(date(2024, 3, 10))
+    assert scheduler.next_run()[0] == date(2024, 3, 11)
+
+
+class DateRecordingGenerator:
+    """Generator stand-in that saves the quiz for the date it is asked for"""
+
+    def __init__(self):
+        self.dates = []
+
+    def pick_adaptive_user(self):
+        return None
+
+    def generate_daily_quiz(self, user_id=None, quiz_date=None):
+        self.dates.append(quiz_date)
+        return _quiz(quiz_date or date.today())
+
+
+def test_daily_job_generates_for_its_date(app):
+    """Test the job generates the quiz for the IST date it was given, not
+    the server's local date"""
+    generator = DateRecordingGenerator()
+
+    quiz = run_daily_job(date(2024, 3, 11), generator=generator)
+
+    assert generator.dates == [date(2024, 3, 11)]
+    assert quiz.quiz_date == date(2024, 3, 11)
+
+
+def test_missed_run_caught_up_and_retried(app):
+    """Test a daemon started after the run time runs at once and retries failures"""
+    clock = FakeClock(datetime(2024, 3, 10, 1, 50, tzinfo=timezone.utc))
+    calls = []
+
+    def job(quiz_date):
+        calls.append(clock.now)
+        if len(calls) < 2:
+            raise RuntimeError('overloaded')
+        return _quiz(quiz_date)
+
+    scheduler = _scheduler(app, clock, job)
+    quiz_date, start = scheduler.next_run()
+    assert start < clock.now
+
+    record = scheduler.run(quiz_date)
+
+    assert record['ok'] and record['attempts'] == 2 and record['met_deadline']
+    assert calls[1] - calls[0] == timedelta(seconds=60)
+    assert scheduler.next_run()[0] == date(2024, 3, 11)
+
+
+def test_retries_stop_at_the_deadline(app, tmp_path):
+    """Test no retry is scheduled past the deadline, and status is written"""
+    app.config['SCHEDULER_STATUS_PATH'] = str(tmp_path / 'status.json')
+    clock = FakeClock(datetime(2024, 3, 10, 1, 59, 30, tzinfo=timezone.utc))
+
+    def job(quiz_date):
+        raise RuntimeError('overloaded')
+
+    scheduler = _scheduler(app, clock, job)
+    record = scheduler.run(date(2024, 3, 10))
+
+    assert not record['ok'] and record['attempts'] == 1
+    assert record['met_deadline'] is False and record['error'] == 'overloaded'
+    status = read_status(app.config['SCHEDULER_STATUS_PATH'])
+    assert status['last_run']['error'] == 'overloaded'
+    assert status['next_run']['quiz_date'] == '2024-03-11'
+    assert json.dumps(scheduler.status()) == json.dumps(status)
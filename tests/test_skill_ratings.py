@@ -0,0 +1,148 @@
+"""
+Tests for incremental skill ratings
+"""
+import pytest
+from unittest.mock import patch
+from datetime import date, datetime
+from app import create_app
+from app.extensions import db
+from app.models import User, Quiz, Question, Submission, Answer, SkillRating
+from app.services.analytics import AnalyticsService
+from app.services.skill_ratings import SkillRatingService, INITIAL_RATING
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SECRET_KEY = 'test-secret'
+    GOOGLE_CLIENT_ID = 'test'
+    GOOGLE_CLIENT_SECRET = 'test'
+    QUIZ_TIME_LIMIT_SECONDS = 360
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def user(app):
+    user = User(google_id='test123', email='test@example.com', name='Test User')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def _submit(user, quiz_date, questions):
+    """Record a completed submission; questions are (category, difficulty, correct)"""
+    quiz = Quiz(quiz_date=quiz_date, passage='Test passage content')
+    db.session.add(quiz)
+    db.session.flush()
+    submission = Submission(user_id=user.id, quiz_id=quiz.id, completed=True,
+                            submitted_at=datetime.utcnow())
+    db.session.add(submission)
+    db.session.flush()
+    for i, (category, difficulty, correct) in enumerate(questions, 1):
+        question = Question(quiz_id=quiz.id, question_number=i, question_text='Q?',
+                            option_a='A', option_b='B', option_c='C', option_d='D',
+                            correct_answer='A', category=category, difficulty=difficulty)
+        db.session.add(question)
+        db.session.flush()
+        db.session.add(Answer(submission_id=submission.id, question_id=question.id,
+                              selected_answer='A' if correct else 'B', is_correct=correct))
+    SkillRatingService().apply_submission(submission)
+    db.session.commit()
+    return submission
+
+
+def _ratings(user):
+    return {r.category: r.rating for r in SkillRating.query.filter_by(user_id=user.id)}
+
+
+def test_ratings_move_with_answers(app, user):
+    """Test correct answers raise a rating and wrong ones lower it"""
+    _submit(user, date(2024, 1, 1), [
+        ('Legal Reasoning', 'medium', True),
+        ('Logical Reasoning', 'medium', False)
+    ])
+
+    ratings = _ratings(user)
+    assert ratings['Legal Reasoning'] == pytest.approx(INITIAL_RATING + 16)
+    assert ratings['Logical Reasoning'] == pytest.approx(INITIAL_RATING - 16)
+
+
+def test_harder_questions_weigh_more(app, user):
+    """Test a correct hard answer gains more than a correct easy one"""
+    _submit(user, date(2024, 1, 1), [
+        ('Legal Reasoning', 'hard', True),
+        ('Logical Reasoning', 'easy', True)
+    ])
+
+    ratings = _ratings(user)
+    assert ratings['Legal Reasoning'] - INITIAL_RATING > ratings['Logical Reasoning'] - INITIAL_RATING > 0
+
+
+def test_concurrent_first_ratings_are_merged(app, user):
+    """Test a rating row another submission inserted after this one read
+    the ratings is added to rather than failing on the primary key"""
+    original = SkillRatingService._upsert
+
+    def racing(self, *args):
+        db.session.execute(db.insert(SkillRating).values(
+            user_id=user.id, category='Legal Reasoning', rating=INITIAL_RATING + 16, answers=1))
+        return original(self, *args)
+
+    with patch.object(SkillRatingService, '_upsert', racing):
+        _submit(user, date(2024, 1, 1), [('Legal Reasoning', 'medium', True)])
+
+    rating = SkillRating.query.filter_by(user_id=user.id).one()
+    assert rating.answers == 2
+    assert rating.rating == pytest.approx(INITIAL_RATING + 32)
+
+
+def test_weak_areas_from_ratings(app, user):
+    """Test rating mode reports categories with low expected accuracy"""
+    for day in range(1, 6):
+        _submit(user, date(2024, 1, day), [
+            ('Legal Reasoning', 'medium', True),
+            ('Quantitative Techniques', 'easy', False)
+        ])
+
+    weak = AnalyticsService(user.id).get_weak_areas(mode='rating')
+
+    assert [w['category'] for w in weak] == ['Quantitative Techniques']
+    assert weak[0]['attempts'] == 5
+    assert weak[0]['accuracy'] < 50
+
+
+def test_batch_summaries_use_ratings(app, user):
+    """Test the batched summaries report the same rating-mode weak areas
+    as a single user's, from one ratings query"""
+    app.config['WEAK_AREAS_MODE'] = 'rating'
+    for day in range(1, 6):
+        _submit(user, date(2024, 1, day), [
+            ('Legal Reasoning', 'medium', True),
+            ('Quantitative Techniques', 'easy', False)
+        ])
+
+    summaries = AnalyticsService.get_all_performance_summaries(user_ids=[user.id])
+
+    assert summaries[user.id]['weak_areas'] == AnalyticsService(user.id).get_weak_areas(mode='rating')
+    assert [w['category'] for w in summaries[user.id]['weak_areas']] == ['Quantitative Techniques']
+
+
+def test_rebuild_matches_incremental(app, user):
+    """Test replaying history reproduces the incremental ratings"""
+    for day, correct in enumerate([True, False, True, True], 1):
+        _submit(user, date(2024, 1, day), [
+            ('Legal Reasoning', 'hard', correct),
+            ('English Comprehension', 'easy', not correct)
+        ])
+    incremental = _ratings(user)
+
+    assert SkillRatingService().rebuild(user.id) == 4
+    assert _ratings(user) == pytest.approx(incremental)
@@ -0,0 +1,203 @@
+"""
+Tests for the submission state cache
+"""
+import pytest
+from datetime import date, datetime
+from sqlalchemy import event
+from app import create_app
+from app.extensions import db
+from app.models import User, Quiz, Question, Submission, Answer
+from app.services.submission_state import (
+    SubmissionState, ProcessStateStore, SqliteStateStore, get_submission_states
+)
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SECRET_KEY = 'test-secret'
+    GOOGLE_CLIENT_ID = 'test'
+    GOOGLE_CLIENT_SECRET = 'test'
+    QUIZ_TIME_LIMIT_SECONDS = 360
+
+
+@pytest.fixture(params=['process', 'sqlite'])
+def app(request, tmp_path):
+    config = type('Config', (TestConfig,), {
+        'SUBMISSION_STATE_CACHE': request.param,
+        'SUBMISSION_STATE_PATH': str(tmp_path / 'submission_state.db'),
+    })
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+@pytest.fixture
+def user(app):
+    user = User(google_id='test123', email='test@example.com', name='Test User')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user.id)
+    return client
+
+
+def _make_quiz():
+    quiz = Quiz(quiz_date=date.today(), passage='Test passage content')
+    db.session.add(quiz)
+    db.session.flush()
+    for i in range(1, 11):
+        db.session.add(Question(quiz_id=quiz.id, question_number=i, question_text=f'Question {i}?',
+                                option_a='A', option_b='B', option_c='C', option_d='D',
+                                correct_answer='A', explanation='Because A',
+                                category='Legal Reasoning', difficulty='easy'))
+    db.session.commit()
+    return quiz
+
+
+def _statements():
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+def test_saves_validate_without_reading_submissions(app, client):
+    """Test answer saves check the submission from the cache, not the table"""
+    quiz = _make_quiz()
+    questions = quiz.questions.all()
+    submission_id = client.post(f'/api/quiz/{quiz.id}/start').get_json()['submission_id']
+    client.post(f'/api/quiz/{quiz.id}/answer', json={
+        'submission_id': submission_id, 'question_id': questions[0].id, 'selected_answer': 'A'
+    })
+
+    statements = _statements()
+    client.post(f'/api/quiz/{quiz.id}/answer', json={
+        'submission_id': submission_id, 'question_id': questions[1].id, 'selected_answer': 'B'
+    })
+    client.post(f'/api/quiz/{quiz.id}/answers', json={
+        'submission_id': submission_id,
+        'answers': [{'question_id': q.id, 'selected_answer': 'A'} for q in questions[2:5]]
+    })
+
+    assert Answer.query.count() == 5
+    assert not any(s.lstrip().upper().startswith('SELECT') and 'FROM submissions' in s for s in statements)
+    assert get_submission_states().stats()['hits'] >= 2
+
+
+def test_submit_writes_state_through(app, client):
+    """Test a submit marks the cached state completed, so later saves and
+    starts are refused from the cache"""
+    quiz = _make_quiz()
+    question = quiz.questions.first()
+    submission_id = client.post(f'/api/quiz/{quiz.id}/start').get_json()['submission_id']
+    client.post(f'/api/quiz/{quiz.id}/submit', json={'submission_id': submission_id})
+
+    assert get_submission_states().store.get(submission_id).completed
+    if app.config['SUBMISSION_STATE_CACHE'] == 'sqlite':
+        # Another worker opening the same file sees the submit
+        assert SqliteStateStore(app.config['SUBMISSION_STATE_PATH']).get(submission_id).completed
+
+    statements = _statements()
+    save = client.post(f'/api/quiz/{quiz.id}/answer', json={
+        'submission_id': submission_id, 'question_id': question.id, 'selected_answer': 'A'
+    })
+    start = client.post(f'/api/quiz/{quiz.id}/start')
+
+    assert save.status_code == 400 and start.status_code == 400
+    assert start.get_json()['submission_id'] == submission_id
+    assert not any('submissions' in s for s in statements)
+
+
+def test_stale_open_state_cannot_write(app, client):
+    """Test a submit the cache missed (another worker's, under the process
+    store) still blocks saves, and refreshes the cached state"""
+    quiz = _make_quiz()
+    question = quiz.questions.first()
+    submission_id = client.post(f'/api/quiz/{quiz.id}/start').get_json()['submission_id']
+    db.session.execute(db.update(Submission).where(Submission.id == submission_id)
+                       .values(completed=True, submitted_at=datetime.utcnow()))
+    db.session.commit()
+
+    response = client.post(f'/api/quiz/{quiz.id}/answer', json={
+        'submission_id': submission_id, 'question_id': question.id, 'selected_answer': 'A'
+    })
+    submit = client.post(f'/api/quiz/{quiz.id}/submit', json={'submission_id': submission_id})
+
+    assert response.status_code == 400 and submit.status_code == 400
+    assert Answer.query.count() == 0
+    assert get_submission_states().store.get(submission_id).completed
+
+
+def test_stale_open_state_not_offered(app, client):
+    """Test starting or taking a quiz confirms a cached in-progress state,
+    so a submit the cache missed is not offered again"""
+    quiz = _make_quiz()
+    submission_id = client.post(f'/api/quiz/{quiz.id}/start').get_json()['submission_id']
+    db.session.execute(db.update(Submission).where(Submission.id == submission_id)
+                       .values(completed=True, submitted_at=datetime.utcnow()))
+    db.session.commit()
+
+    start = client.post(f'/api/quiz/{quiz.id}/start')
+    take = client.get(f'/quiz/{quiz.quiz_date.isoformat()}')
+
+    assert start.status_code == 400 and start.get_json()['submission_id'] == submission_id
+    assert take.status_code == 302 and f'/results/{submission_id}' in take.headers['Location']
+
+
+def test_completed_state_never_downgraded(app):
+    """Test an in-progress state read before a submit cannot overwrite the
+    completed one in either store"""
+    store = get_submission_states().store
+    started = datetime(2024, 1, 1)
+    store.put(SubmissionState(1, user_id=1, quiz_id=2, started_at=started, completed=True))
+    store.put(SubmissionState(1, user_id=1, quiz_id=2, started_at=started, completed=False))
+
+    assert store.get(1).completed and store.find(1, 2).completed
+
+
+def test_unknown_and_foreign_submissions(app, client):
+    """Test missing submissions are 404 and other users' are 403"""
+    quiz = _make_quiz()
+    other = User(google_id='other', email='other@example.com', name='Other')
+    db.session.add(other)
+    db.session.flush()
+    theirs = Submission(user_id=other.id, quiz_id=quiz.id, started_at=datetime.utcnow())
+    db.session.add(theirs)
+    db.session.commit()
+    question_id = quiz.questions.first().id
+
+    def save(submission_id):
+        return client.post(f'/api/quiz/{quiz.id}/answer', json={
+            'submission_id': submission_id, 'question_id': question_id, 'selected_answer': 'A'
+        }).status_code
+
+    assert save(9999) == 404
+    assert save(theirs.id) == 403
+
+
+def test_process_store_expires_and_evicts():
+    """Test process entries expire after the TTL and the least recently
+    used are evicted past the size"""
+    now = [0.0]
+    store = ProcessStateStore(maxsize=2, ttl=60, clock=lambda: now[0])
+    started = datetime(2024, 1, 1)
+    for i in (1, 2):
+        store.put(SubmissionState(i, user_id=1, quiz_id=10 + i, started_at=started, completed=False))
+
+    assert store.find(1, 11).id == 1
+    store.put(SubmissionState(3, user_id=1, quiz_id=13, started_at=started, completed=False))
+    assert store.get(2) is None and store.find(1, 12) is None
+    assert store.get(1) is not None
+
+    now[0] = 61
+    assert store.get(1) is None and store.find(1, 13) is None
+    assert len(store) == 0
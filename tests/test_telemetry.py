@@ -0,0 +1,149 @@
+"""
+Tests for generation telemetry
+"""
+import json
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+from app import create_app
+from app.extensions import db
+from app.models import GenerationTelemetry
+from app.services.quiz_generator import QuizGeneratorService
+from app.services.telemetry import TelemetryService
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SECRET_KEY = 'test-secret'
+    GOOGLE_CLIENT_ID = 'test'
+    GOOGLE_CLIENT_SECRET = 'test'
+    ANTHROPIC_API_KEY = 'test-key'
+    QUESTION_BANK_FALLBACK = False
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+def _quiz(n=10):
+    return {
+        'passage': 'A passage about the doctrine of frustration in contract law.',
+        'questions': [
+            {'number': i, 'text': f'Question {i}?',
+             'options': {'A': 'One', 'B': 'Two', 'C': 'Three', 'D': 'Four'},
+             'correct': 'B', 'explanation': 'Because B.', 'category': 'Legal Reasoning',
+             'difficulty': 'medium'}
+            for i in range(1, n + 1)
+        ]
+    }
+
+
+class ScriptedClient:
+    """Stands in for anthropic.Anthropic, returning the given texts in turn"""
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self.messages = self
+
+    def create(self, **kwargs):
+        return Mock(content=[Mock(text=self.texts.pop(0))], usage=Mock(
+            input_tokens=1500, output_tokens=400,
+            cache_creation_input_tokens=0, cache_read_input_tokens=1000))
+
+
+def test_daily_generation_records_phases_and_usage(app):
+    """Test a generation with one repair writes a row with both requests' usage"""
+    data = _quiz()
+    data['questions'][4]['category'] = 'Astrology'
+    fix = {'questions': [_quiz(5)['questions'][4]]}
+    service = QuizGeneratorService(client=ScriptedClient([json.dumps(data), json.dumps(fix)]))
+
+    quiz = service.generate_daily_quiz()
+
+    row = GenerationTelemetry.query.one()
+    assert row.kind == 'daily' and row.outcome == 'ok' and row.quiz_id == quiz.id
+    assert row.requests == 2 and row.retries == 0 and row.repaired_questions == 1
+    assert row.input_tokens == 3000 and row.output_tokens == 800 and row.cache_read_tokens == 2000
+    assert row.estimated_input_tokens > 1000
+    assert row.total_seconds >= row.api_seconds + row.parse_seconds + row.save_seconds
+    assert service.timer is None
+
+
+def test_failed_generation_recorded(app):
+    """Test a generation that raises still leaves a failed row"""
+    service = QuizGeneratorService(client=ScriptedClient(['not json']))
+
+    with pytest.raises(ValueError):
+        service.generate_daily_quiz()
+
+    row = GenerationTelemetry.query.one()
+    assert row.outcome == 'failed' and row.quiz_id is None
+    assert row.requests == 1 and row.input_tokens == 1500
+
+
+def test_summary_percentiles_per_period(app):
+    """Test runs are bucketed by day and reduced to p50/p95 and means"""
+    today = datetime.utcnow().replace(hour=12)
+    for i, seconds in enumerate([10, 20, 30, 40, 100]):
+        db.session.add(GenerationTelemetry(kind='daily', outcome='ok', created_at=today,
+                                           total_seconds=seconds, api_seconds=seconds - 1,
+                                           input_tokens=1000 + i, requests=1))
+    db.session.add(GenerationTelemetry(kind='personal', outcome='failed', error='boom',
+                                       created_at=today - timedelta(days=1), total_seconds=5))
+    db.session.add(GenerationTelemetry(kind='daily', outcome='ok', created_at=today - timedelta(days=60),
+                                       total_seconds=5))
+    db.session.commit()
+
+    periods = TelemetryService().summary(days=30)
+
+    assert [p['runs'] for p in periods] == [1, 5]
+    assert periods[0]['outcomes'] == {'failed': 1}
+    latest = periods[1]
+    assert latest['seconds']['total'] == {'p50': 30.0, 'p95': 88.0}
+    assert latest['seconds']['api']['p50'] == 29.0
+    assert latest['mean_input_tokens'] == 1002.0
+
+    assert [p['runs'] for p in TelemetryService().summary(days=30, kind='personal')] == [1]
+    with pytest.raises(ValueError):
+        TelemetryService().summary(bucket='month')
+
+
+def test_sharded_generation_has_no_retries(app):
+    """Test a clean sharded generation records its requests but no retries"""
+    from tests.test_quiz_generator import ShardingClient
+
+    QuizGeneratorService(client=ShardingClient()).generate_daily_quiz(shards=3)
+
+    row = GenerationTelemetry.query.one()
+    assert row.requests == 4 and row.retries == 0
+
+
+def test_batch_generations_record_analytics_and_prompt_time(app):
+    """Test pre-generated and personal quizzes record the analytics and
+    prompt phases done on the calling thread"""
+    from app.models import User
+    from app.services.claude_client import TokenBucket
+    from app.services.personal_quizzes import PersonalQuizService
+    from app.services.pregeneration import PregenerationService
+
+    user = User(google_id='g1', email='one@example.com', name='One')
+    db.session.add(user)
+    db.session.commit()
+    client = ScriptedClient([json.dumps(_quiz())] * 3)
+
+    PregenerationService(max_workers=2, generator=QuizGeneratorService(client=client)) \
+        .pregenerate(days=2, user_id=user.id)
+    PersonalQuizService(max_workers=1, generator=QuizGeneratorService(client=client),
+                        limiter=TokenBucket(rate=1000, capacity=1000)).generate(user_ids=[user.id])
+
+    rows = GenerationTelemetry.query.all()
+    assert sorted(row.kind for row in rows) == ['personal', 'pregenerate', 'pregenerate']
+    for row in rows:
+        assert row.analytics_seconds > 0 and row.prompt_seconds > 0
+        assert row.total_seconds >= row.analytics_seconds + row.prompt_seconds + row.api_seconds
@@ -0,0 +1,189 @@
+"""
+Tests for near-duplicate topic detection over stored passages
+"""
+import json
+import threading
+import pytest
+from datetime import date, timedelta
+from types import SimpleNamespace
+from app import create_app
+from app.extensions import db
+from app.models import GenerationTelemetry, Quiz
+from app.services.topic_index import TopicIndex, get_topic_index
+
+
+class TestConfig:
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SECRET_KEY = 'test-secret'
+    GOOGLE_CLIENT_ID = 'test'
+    GOOGLE_CLIENT_SECRET = 'test'
+    ANTHROPIC_API_KEY = 'test-key'
+    QUESTION_BANK_FALLBACK = False
+
+
+BASIC_STRUCTURE = (
+    "The basic structure doctrine, laid down by the Supreme Court in Kesavananda Bharati v State of "
+    "Kerala in 1973, holds that Parliament may amend any part of the Constitution but cannot alter its "
+    "basic structure. The judges identified features such as the supremacy of the Constitution, the rule "
+    "of law, separation of powers, judicial review and federalism. Minerva Mills applied the doctrine to "
+    "strike down amendments that destroyed judicial review."
+)
+BASIC_STRUCTURE_REWORDED = (
+    "In 1973 a thirteen judge bench decided Kesavananda Bharati, ruling that the amending power of "
+    "Parliament under Article 368 does not extend to destroying the basic structure of the Constitution. "
+    "Judicial review, federalism, secularism and separation of powers were later recognised as part of "
+    "that structure, and Minerva Mills struck down clauses of the 42nd Amendment that curtailed judicial review."
+)
+POLLUTER_PAYS = (
+    "The polluter pays principle requires those who cause environmental damage to bear the cost of "
+    "remedying it. Indian courts adopted it in Indian Council for Enviro-Legal Action, where chemical "
+    "industries were ordered to pay for restoring contaminated soil and groundwater in Bichhri village."
+)
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+
+def _add_quiz(days_ago, passage, kind='daily'):
+    quiz = Quiz(quiz_date=date.today() - timedelta(days=days_ago), passage=passage, kind=kind)
+    db.session.add(quiz)
+    db.session.commit()
+    return quiz
+
+
+def test_finds_reworded_topic_across_history(app):
+    """Test a reworded passage matches an old quiz and an unrelated one does not"""
+    old = _add_quiz(400, BASIC_STRUCTURE)
+    _add_quiz(1, POLLUTER_PAYS)
+    _add_quiz(2, BASIC_STRUCTURE, kind='review')
+
+    index = TopicIndex()
+    assert index.sync() == 2
+    quiz_id, similarity = index.find_duplicate(BASIC_STRUCTURE_REWORDED)
+    assert quiz_id == old.id and similarity >= 0.25
+    assert index.find_duplicate("Trademark dilution protects famous marks from blurring and tarnishment.") is None
+    assert index.topic(old.id).startswith('basic, structure')
+
+
+def test_recent_topics_are_compact_key_terms(app):
+    """Test the prompt blocklist lists topic words, not passage prefixes"""
+    from app.services.quiz_generator import QuizGeneratorService
+
+    _add_quiz(2, BASIC_STRUCTURE)
+    _add_quiz(1, POLLUTER_PAYS)
+    service = QuizGeneratorService(client=object())
+
+    topics = service.get_recent_topics()
+    assert len(topics) == 2 and 'polluter' in topics[0]
+    assert all(len(t.split(', ')) <= 5 for t in topics)
+    prompt = service._build_prompt(None, topics)
+    assert f"- {topics[1]}\n" in prompt
+    assert BASIC_STRUCTURE[:60] not in prompt
+
+
+class SequenceClient:
+    """Returns the given passages in turn, each with ten valid questions"""
+
+    def __init__(self, passages):
+        self.messages = self
+        self.passages = list(passages)
+        self.prompts = []
+
+    def create(self, **kwargs):
+        content = kwargs['messages'][0]['content']
+        self.prompts.append(content if isinstance(content, str) else ''.join(b['text'] for b in content))
+        data = {'passage': self.passages.pop(0), 'questions': [{
+            'number': i, 'text': 'Which principle applies?',
+            'options': {'A': 'One', 'B': 'Two', 'C': 'Three', 'D': 'Four'},
+            'correct': 'A', 'explanation': 'Because.',
+            'category': 'Legal Reasoning', 'difficulty': 'easy'
+        } for i in range(1, 11)]}
+        return SimpleNamespace(content=[SimpleNamespace(text=json.dumps(data))],
+                               usage=SimpleNamespace(input_tokens=10, output_tokens=10))
+
+
+def test_duplicate_passage_is_regenerated(app):
+    """Test a near-duplicate passage is rejected and regenerated, and the
+    saved passage is indexed straight away"""
+    from app.services.quiz_generator import QuizGeneratorService
+
+    old = _add_quiz(300, BASIC_STRUCTURE)
+    client = SequenceClient([BASIC_STRUCTURE_REWORDED, POLLUTER_PAYS])
+    quiz = QuizGeneratorService(client=client).generate_daily_quiz()
+
+    assert quiz.passage == POLLUTER_PAYS
+    assert len(client.prompts) == 2
+    assert 'Rejected Topic' in client.prompts[1] and get_topic_index().topic(old.id) in client.prompts[1]
+    assert get_topic_index().find_duplicate(POLLUTER_PAYS) == (quiz.id, 1.0)
+    assert GenerationTelemetry.query.one().retries == 1
+
+
+def test_duplicate_kept_after_retries_run_out(app):
+    """Test generation still produces a quiz when every attempt repeats a topic"""
+    from app.services.quiz_generator import QuizGeneratorService
+
+    _add_quiz(300, BASIC_STRUCTURE)
+    app.config['TOPIC_DUPLICATE_RETRIES'] = 1
+    client = SequenceClient([BASIC_STRUCTURE, BASIC_STRUCTURE_REWORDED])
+    quiz = QuizGeneratorService(client=client).generate_daily_quiz()
+
+    assert quiz.passage == BASIC_STRUCTURE_REWORDED
+    assert len(client.prompts) == 2
+
+
+class ConcurrentSequenceClient(SequenceClient):
+    """SequenceClient safe to call from several worker threads"""
+
+    def __init__(self, passages):
+        super().__init__(passages)
+        self.lock = threading.Lock()
+
+    def create(self, **kwargs):
+        with self.lock:
+            return super().create(**kwargs)
+
+
+def test_pregenerated_batch_checked_against_itself(app):
+    """Test dates generated concurrently with the same topic are caught
+    before saving, and the later one regenerated"""
+    from app.services.pregeneration import PregenerationService
+    from app.services.quiz_generator import QuizGeneratorService
+
+    client = ConcurrentSequenceClient([BASIC_STRUCTURE, BASIC_STRUCTURE_REWORDED, POLLUTER_PAYS])
+    results = PregenerationService(max_workers=2, generator=QuizGeneratorService(client=client)).pregenerate(days=2)
+
+    assert all(r.ok for r in results)
+    passages = [db.session.get(Quiz, r.quiz_id).passage for r in results]
+    assert passages[1] == POLLUTER_PAYS and passages[0] != POLLUTER_PAYS
+    assert 'Rejected Topic' in client.prompts[2]
+    assert sorted(row.retries for row in GenerationTelemetry.query) == [0, 1]
+
+
+def test_personal_quiz_checked_against_visible_history(app):
+    """Test a personal passage repeating a quiz the user saw is regenerated,
+    while other users' personal quizzes do not count"""
+    from app.models import User
+    from app.services.claude_client import TokenBucket
+    from app.services.personal_quizzes import PersonalQuizService
+    from app.services.quiz_generator import QuizGeneratorService
+
+    users = [User(google_id=f'g{i}', email=f'u{i}@example.com', name=f'U{i}') for i in (1, 2)]
+    db.session.add_all(users)
+    db.session.commit()
+    _add_quiz(300, BASIC_STRUCTURE)
+    db.session.add(Quiz(quiz_date=date.today() - timedelta(days=3), passage=POLLUTER_PAYS, user_id=users[1].id))
+    db.session.commit()
+
+    client = SequenceClient([BASIC_STRUCTURE_REWORDED, POLLUTER_PAYS])
+    results = PersonalQuizService(max_workers=1, generator=QuizGeneratorService(client=client),
+                                  limiter=TokenBucket(rate=1000, capacity=1000)).generate(user_ids=[users[0].id])
+
+    assert db.session.get(Quiz, results[0].quiz_id).passage == POLLUTER_PAYS
+    assert len(client.prompts) == 2 and 'Rejected Topic' in client.prompts[1]